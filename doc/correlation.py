@@ -13,18 +13,10 @@ y = np.column_stack((x[:, 0] * 2, x[:, 1] + x[:, 0] / 2., x[:, 4]))
 X = sdb.from_array(x)
 Y = sdb.from_array(y)
 
-# Subtract the column means from X using broadcasting:
-XC = X - X.mean(0)
-# Similarly subtract the column means from Y:
-YC = Y - Y.mean(0)
+# Each column is a variable, and each row an observation.
+# The sums and cross products are computed in one pass, without
+# transposing or centering X and Y.
+COV = sdb.cov(X, Y, rowvar=False)
 
-COV = sdb.dot(XC.T, YC) / (X.shape[0] - 1)
-
-# Column vector with column standard deviations of X matrix:
-xsd = X.std(0).reshape((5, 1))
-# Row vector with column standard deviations of Y matrix:
-ysd = Y.std(0).reshape((1, 3))
-# Their outer product:
-outersd = sdb.dot(xsd, ysd)
-COR = COV / outersd
+COR = sdb.corrcoef(X, Y, rowvar=False)
 print(COR.toarray())
@@ -196,7 +196,7 @@ for f in functions:
 
 # add in some missing operators from other libraries
 # TODO add these to afldb.py
-for op in ['gemm', 'gesvd']:
+for op in ['gemm', 'gesvd', 'spgemm']:
     operators.append(dict(name=op, signature=[], doc=''))
 
 
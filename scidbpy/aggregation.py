@@ -8,13 +8,19 @@ import numpy as np
 
 from . import SciDBArray
 from .interface import _new_attribute_label
-from .scidbarray import NP_SDB_TYPE_MAP, INTEGER_TYPES
+from .scidbarray import INTEGER_TYPES
 from ._py3k_compat import string_type
 from . import schema_utils as su
 from .robust import join
-from .utils import as_list
+from .utils import as_list, _disambiguate
 
-__all__ = ['histogram', 'GroupBy']
+__all__ = ['histogram', 'histogram2d', 'quantile', 'GroupBy']
+
+# bins per refinement pass when computing quantiles
+QUANTILE_BINS = 1000
+
+# largest slice of values downloaded for each exact quantile
+EXACT_SLICE = 100000
 
 
 def histogram(X, bins=10, att=None, range=None, plot=False, **kwargs):
@@ -25,14 +31,21 @@ def histogram(X, bins=10, att=None, range=None, plot=False, **kwargs):
     ----------
     X : SciDBArray
        The array to compute a histogram for
-    att : str (optional)
-       The attribute of the array to consider. Defaults to the first attribute.
-    bins : int (optional)
-       The number of bins
+    att : str or list of strs (optional)
+       The attribute(s) of the array to consider. Defaults to the first
+       attribute. A list computes one histogram per attribute, in a
+       single query.
+    bins : int or sequence of scalars (optional)
+       The number of bins, or a monotonically increasing sequence of
+       bin edges (the last bin includes its right edge, as in numpy).
+       When computing several histograms, this can also be a list
+       with one entry per attribute.
     range : [min, max] (optional)
-       The lower and upper limits of the histogram. Defaults to data limits.
+       The lower and upper limits of the histogram. Defaults to data
+       limits. Ignored if the bin edges are given. When computing
+       several histograms, this can also be a list of pairs.
     plot : bool
-       If True, plot the results with matplotlib
+       If True, plot the results with matplotlib (single attributes only)
     histtype : 'bar' | 'step' (default='bar')
        If plotting, the kind of hisogram to draw. See matplotlib.hist
        for more details.
@@ -46,55 +59,415 @@ def histogram(X, bins=10, att=None, range=None, plot=False, **kwargs):
         * edges is a NumPy array of edge locations (length=bins+1)
         * counts is the number of data betwen [edges[i], edges[i+1]] (length=bins)
         * artists is a list of the matplotlib artists created if *plot=True*
+
+        If att is a list, counts and edges are lists with
+        one entry per attribute.
+
+    Notes
+    -----
+    The data limits come from :meth:`~scidbpy.SciDBArray.agg`, so
+    they are reused if they have already been computed. The cells are
+    then binned and counted by a single query, which stores no
+    intermediate arrays.
+
+    See Also
+    --------
+    histogram2d
     """
     if not isinstance(X, SciDBArray):
         raise TypeError("Input must be a SciDBArray: %s" % type(X))
-    if not isinstance(bins, int):
-        raise NotImplementedError("Only integer bin arguments "
-                                  "currently supported")
-    f = X.afl
-    binid = _new_attribute_label('bin', X)
-    a = X.att(0) if att is None else att
-    dtype = X.dtype if att is None else X.dtype[att]
-    t = NP_SDB_TYPE_MAP[dtype.descr[0][1]]
-
-    # store bounds
-    if range is None:
-        M = f.aggregate(X, 'min({a}) as min, max({a}) as max'.format(a=a))
-        M = M.eval()
+
+    multi = isinstance(att, (list, tuple))
+    if multi and plot:
+        raise ValueError("Can only plot the histogram of a single attribute")
+    atts = list(att) if multi else [X.att_names[0] if att is None else att]
+    bins = _per_attribute(bins, len(atts), multi, 'bins')
+    range = _per_attribute(range, len(atts), multi, 'range')
+
+    edges = _bin_edges(X, atts, bins, range)
+    exprs = [_bin_expression(a, e) for a, e in zip(atts, edges)]
+    sizes = [e.size - 1 for e in edges]
+
+    if multi:
+        counts = _bin_counts(X, [_layered(exprs)], [max(sizes)], len(atts))
+        counts = [c[:n] for c, n in zip(counts, sizes)]
+        return counts, edges
+
+    counts = _bin_counts(X, exprs, sizes)
+    if plot:
+        result = {'counts': np.append(counts, 0), 'bins': edges[0]}
+        return counts, edges[0], _plot_hist(result, **kwargs)
+    return counts, edges[0]
+
+
+def histogram2d(X, atts=None, bins=10, range=None):
+    """
+    Build a 2D histogram of two attributes of a SciDBArray.
+
+    Parameters
+    ----------
+    X : SciDBArray
+       The array to compute a histogram for
+    atts : pair of strs (optional)
+       The attributes to consider, binned along the first and second
+       axes of the result. Defaults to the first two attributes.
+    bins : int, sequence of scalars, or pair of these (optional)
+       The number of bins, or the bin edges, for both attributes
+       or for each attribute (as in :func:`numpy.histogram2d`)
+    range : [[xmin, xmax], [ymin, ymax]] (optional)
+       The limits of the histogram along each axis.
+       Defaults to data limits.
+
+    Returns
+    -------
+    (counts, xedges, yedges)
+
+        * counts is a 2D NumPy array of the number of cells in each bin
+        * xedges and yedges are the bin edges along each axis
+
+    Notes
+    -----
+    Like :func:`histogram`, the bins are counted by a single query.
+    Cells where either attribute is null, or outside its range,
+    are ignored.
+    """
+    if not isinstance(X, SciDBArray):
+        raise TypeError("Input must be a SciDBArray: %s" % type(X))
+
+    atts = X.att_names[:2] if atts is None else list(atts)
+    if len(atts) != 2:
+        raise ValueError("histogram2d needs two attributes, got %s" % atts)
+
+    bins = _per_attribute(bins, 2, True, 'bins')
+    range = _per_attribute(range, 2, True, 'range')
+
+    edges = _bin_edges(X, atts, bins, range)
+    exprs = [_bin_expression(a, e) for a, e in zip(atts, edges)]
+    counts = _bin_counts(X, exprs, [e.size - 1 for e in edges])
+    return counts, edges[0], edges[1]
+
+
+def _per_attribute(value, n, multi, name):
+    """
+    Broadcast a histogram argument to one entry per attribute
+
+    As in :func:`numpy.histogram2d`, a sequence with one entry per
+    attribute is split up; anything else applies to every attribute.
+    """
+    if not multi or not hasattr(value, '__len__'):
+        return [value] * n
+    if len(value) != n or name == 'range' and \
+            not hasattr(value[0], '__len__'):
+        return [value] * n
+    return list(value)
+
+
+def _bin_edges(X, atts, bins, ranges):
+    """
+    Compute the bin edges for each attribute
+
+    Data limits are only fetched for attributes binned into a number
+    of bins without an explicit range, using :meth:`SciDBArray.agg`
+    (which caches them).
+    """
+    missing = [a for a, b, r in zip(atts, bins, ranges)
+               if r is None and isinstance(b, (int, np.integer))]
+    if missing:
+        stats = X.agg(['min', 'max'], atts=missing)
+
+    result = []
+    for a, b, r in zip(atts, bins, ranges):
+        if not isinstance(b, (int, np.integer)):
+            edges = np.asarray(b, dtype=float)
+            if edges.ndim != 1 or edges.size < 2:
+                raise ValueError("bins must be an integer or a 1D "
+                                 "sequence of at least 2 edges")
+            if np.any(np.diff(edges) < 0):
+                raise ValueError("bin edges must increase monotonically")
+            result.append(edges)
+            continue
+
+        if b < 1:
+            raise ValueError("bins must be positive: %s" % b)
+        if r is None:
+            lo, hi = stats['%s_min' % a], stats['%s_max' % a]
+        else:
+            lo, hi = min(r), max(r)
+        lo, hi = float(lo), float(hi)
+        if not (np.isfinite(lo) and np.isfinite(hi)):
+            raise ValueError("range of %s is not finite: [%s, %s]" % (a, lo, hi))
+        if lo == hi:
+            lo, hi = lo - 0.5, hi + 0.5
+        result.append(np.linspace(lo, hi, b + 1))
+    return result
+
+
+def _bin_expression(att, edges):
+    """
+    An AFL expression for the (0-based) bin of each value of an attribute.
+
+    Values outside the edges, or null, are assigned to bin -1.
+    """
+    n = edges.size - 1
+    lo, hi = repr(float(edges[0])), repr(float(edges[-1]))
+    v = 'double(%s)' % att
+
+    if np.allclose(np.diff(edges), (edges[-1] - edges[0]) / n):
+        # uniform bins: compute the bin directly, as numpy does
+        norm = repr(n / float(edges[-1] - edges[0]))
+        index = 'int64(floor(({v} - {lo}) * {norm}))'.format(v=v, lo=lo,
+                                                             norm=norm)
+        index = 'iif({i} >= {n}, {last}, {i})'.format(i=index, n=n,
+                                                      last=n - 1)
     else:
-        lo = f.build('<min:%s NULL DEFAULT null>[i=0:0,1,0]' % t, min(range))
-        hi = f.build('<max:%s NULL DEFAULT null>[j=0:0,1,0]' % t, max(range))
-        M = f.cross_join(lo, hi, 'i', 'j').eval()
-
-    val2bin = 'floor({bins} * ({a}-min)/(.0000001+max-min))'.format(bins=bins,
-                                                                    a=a)
-    bin2val = '{binid}*(0.0000001+max-min)/{bins} + min'.format(binid=binid,
-                                                                bins=bins)
-
-    schema = '<counts: uint64 null>[{0}=0:{1},1000000,0]'.format(binid, bins)
-    s2 = ('<counts:uint64 null, min:{t} null, max:{t} null>'
-          '[{binid}=0:{bins},1000000,0]'.format(binid=binid, t=t, bins=bins))
-
-    # 0, min, max for each bin
-    fill = f.slice(f.cross_join(f.build(schema, 0), M), 'i', 0).eval()
-    fill2 = f.build('<v:int64>[i=0:0,1,0]', 0)  # single 0
-
-    q = f.cross_join(X, M)  # val, min, max (Ndata)
-    q = f.apply(q, binid, val2bin)  # val, min, max, binid
-    q = f.substitute(q, fill2, binid)  # nulls to bin 0
-    q = f.redimension(q, s2, 'count(%s) as counts' % binid)  # group bins
-    q = f.merge(q, fill)  # replace nulls with 0
-    q = f.apply(q, 'bins', bin2val)    # compute bin edges
-    q = f.project(q, 'bins', 'counts')  # drop min, max
+        # count the inner edges below each value
+        index = ' + '.join('iif({v} >= {e}, 1, 0)'.format(v=v, e=repr(float(e)))
+                           for e in edges[1:-1]) or '0'
+        index = 'int64(%s)' % index
 
+    return ('iif({a} is null, -1, iif({v} >= {lo} and {v} <= {hi}, '
+            '{index}, -1))'.format(a=att, v=v, lo=lo, hi=hi, index=index))
+
+
+def _layered(exprs):
+    """
+    Select the bin expression for each layer of a multi-attribute histogram
+    """
+    result = '-1'
+    for k, expr in reversed(list(enumerate(exprs))):
+        result = 'iif({layer} = {k}, {expr}, {rest})'.format(layer='{layer}', k=k,
+                                                             expr=expr, rest=result)
+    return result
+
+
+def _bin_counts(X, exprs, sizes, layers=None, limits=None):
+    """
+    Count the cells of X in each bin, in a single query.
+
+    Parameters
+    ----------
+    X : SciDBArray
+        The input array
+    exprs : list of strings
+        One bin expression (see :func:`_bin_expression`) per
+        dimension of the output
+    sizes : list of ints
+        The number of bins along each dimension
+    layers : int (optional)
+        If given, each cell of X is counted once in each of this many
+        independent histograms. The expressions can refer to the
+        histogram number as ``{layer}``.
+    limits : str (optional)
+        If given, also find the smallest and largest value
+        of this attribute in each bin
+
+    Returns
+    -------
+    counts : ndarray
+        The counts, of shape `sizes` (preceded by `layers`, if given)
+    lo, hi : ndarrays
+        The smallest and largest values in each bin (0 for empty bins),
+        as doubles. Only returned if `limits` is given.
+    """
+    f = X.afl
+    taken = X.att_names + X.dim_names
+    labels = []
+    for i in range(len(exprs)):
+        labels.append(_disambiguate('bin', taken + labels))
+
+    q = X
+    dims = ['{0}=0:{1},{2},0'.format(b, n - 1, n)
+            for b, n in zip(labels, sizes)]
+    if layers is not None:
+        layer = _disambiguate('layer', taken + labels)
+        flag = _disambiguate('flag', taken + labels + [layer])
+        q = f.cross_join(q, f.build('<{0}:bool>[{1}=0:{2},{3},0]'.format(
+            flag, layer, layers - 1, layers), 'true'))
+        exprs = [e.format(layer=layer) for e in exprs]
+        dims.insert(0, '{0}=0:{1},{2},0'.format(layer, layers - 1, layers))
+        taken = taken + [layer, flag]
+
+    args = [x for pair in zip(labels, exprs) for x in pair]
+    counts = _disambiguate('counts', taken + labels)
+    atts = ['%s:uint64 null' % counts]
+    aggs = ['count(%s) as %s' % (labels[0], counts)]
+    if limits is not None:
+        val, lo, hi = [_disambiguate(n, taken + labels + [counts])
+                       for n in ('val', 'lo', 'hi')]
+        args += [val, 'double(%s)' % limits]
+        atts += ['%s:double null' % lo, '%s:double null' % hi]
+        aggs += ['min(%s) as %s' % (val, lo), 'max(%s) as %s' % (val, hi)]
+
+    q = f.apply(q, *args)
+    q = f.filter(q, ' and '.join('%s >= 0' % b for b in labels))
+    schema = '<%s>[%s]' % (', '.join(atts), ','.join(dims))
+    q = f.redimension(q, schema, *aggs)
     result = q.toarray()
 
-    assert result['counts'][-1] == 0
-    ct, bin = result['counts'][:-1], result['bins']
-    if plot:
-        return ct, bin, _plot_hist(result, **kwargs)
-    return ct, bin
+    if limits is None:
+        return np.asarray(result, dtype=np.int64)
+    return (np.asarray(result[counts], dtype=np.int64),
+            np.asarray(result[lo], dtype=float),
+            np.asarray(result[hi], dtype=float))
+
+
+def quantile(X, q, att=None, error=None):
+    """
+    Compute quantiles of an attribute of a SciDBArray.
+
+    Parameters
+    ----------
+    X : SciDBArray
+       The array to compute quantiles for
+    q : float in the range [0, 1] or a sequence of floats
+       The quantiles to compute
+    att : str (optional)
+       The attribute of the array to consider. Defaults to the first attribute.
+    error : float in the range (0, 1) (optional)
+       If given, compute approximate quantiles, whose rank in the data
+       is within ``error * count`` of the exact quantile's. By default,
+       the quantiles are exact.
+
+    Returns
+    -------
+    qs : ndarray
+       The value of each quantile, linearly interpolated between data
+       values as in :func:`numpy.percentile`.
+
+    Notes
+    -----
+    Quantiles are found by repeatedly histogramming the data in the
+    bins that contain them, with :data:`QUANTILE_BINS` bins per pass.
+    Each pass is a single scan of the array, which narrows the range
+    of each quantile by a factor of about :data:`QUANTILE_BINS`.
+
+    Approximate quantiles stop once each range holds at most
+    ``error * count`` values, and interpolate within it. Exact quantiles
+    stop once each range holds at most :data:`EXACT_SLICE` values; the
+    values in these ranges are then downloaded and sorted locally.
+    Null values are ignored.
+    """
+    if not isinstance(X, SciDBArray):
+        raise TypeError("Input must be a SciDBArray: %s" % type(X))
+    att = att or X.att_names[0]
+
+    q = np.atleast_1d(np.asarray(q, dtype=float))
+    if q.min() < 0 or q.max() > 1:
+        raise ValueError("Quantiles must be in the range [0, 1]")
+    if error is not None and not 0 < error < 1:
+        raise ValueError("error must be in the range (0, 1): %s" % error)
+
+    stats = X.agg(['count', 'min', 'max'], atts=att)
+    n = int(stats['%s_count' % att])
+    if n == 0:
+        raise ValueError("Attribute %s has no non-null values" % att)
+    ranks = q * (n - 1)
+    window = (float(stats['%s_min' % att]), float(stats['%s_max' % att]), 0, n)
+
+    if error is not None:
+        windows = _narrow_quantiles(X, att, ranks, window, max(error * n, 1))
+        result = np.empty(q.shape)
+        for i, (rank, (lo, hi, below, count)) in enumerate(zip(ranks, windows)):
+            frac = np.clip((rank - below + 0.5) / count, 0, 1)
+            result[i] = lo + frac * (hi - lo)
+        return result
+
+    # the data values on either side of each quantile
+    lo = np.floor(ranks).astype(np.int64)
+    hi = np.minimum(lo + 1, n - 1)
+    targets = np.unique(np.hstack([lo, hi]))
+    windows = _narrow_quantiles(X, att, targets, window, EXACT_SLICE)
+    values = dict(zip(targets, _window_values(X, att, targets, windows)))
+
+    w = ranks - lo
+    return np.array([values[l] * (1 - f) + values[h] * f
+                     for l, h, f in zip(lo, hi, w)])
+
+
+def _narrow_quantiles(X, att, ranks, window, size):
+    """
+    Find a value range containing each rank of the data.
+
+    Parameters
+    ----------
+    X : SciDBArray
+       The input array
+    att : str
+       The attribute to consider
+    ranks : array of floats
+       The (0-based) ranks to locate
+    window : tuple of (lo, hi, below, count)
+       The smallest and largest values in a range, the number of values
+       below the range, and the number in it (for the whole attribute,
+       its limits, 0, and its count)
+    size : int
+       Ranges are narrowed until they hold at most this many values,
+       or a single distinct value
+
+    Returns
+    -------
+    windows : list of tuples
+       One (lo, hi, below, count) tuple per rank
+    """
+    windows = [window] * len(ranks)
+
+    def done(window):
+        lo, hi, below, count = window
+        # stop at the resolution of doubles, too
+        resolution = max(np.spacing(max(abs(lo), abs(hi))), 1e-300)
+        return count <= size or hi - lo <= QUANTILE_BINS * resolution
+
+    while True:
+        active = [i for i, w in enumerate(windows) if not done(w)]
+        if not active:
+            return windows
+
+        # one histogram per distinct range, all in the same query
+        ranges = sorted(set(windows[i][:2] for i in active))
+        edges = [np.linspace(lo, hi, QUANTILE_BINS + 1) for lo, hi in ranges]
+        exprs = [_bin_expression(att, e) for e in edges]
+        if len(ranges) == 1:
+            counts, lo, hi = _bin_counts(X, exprs, [QUANTILE_BINS],
+                                         limits=att)
+            counts, lo, hi = [counts], [lo], [hi]
+        else:
+            counts, lo, hi = _bin_counts(X, [_layered(exprs)],
+                                         [QUANTILE_BINS], len(ranges),
+                                         limits=att)
+
+        # shrink each window to the bin holding its rank
+        for i in active:
+            below = windows[i][2]
+            k = ranges.index(windows[i][:2])
+            cumulative = below + np.cumsum(counts[k])
+            b = int(np.searchsorted(cumulative, ranks[i], side='right'))
+            b = min(b, QUANTILE_BINS - 1)
+            windows[i] = (lo[k][b], hi[k][b],
+                          cumulative[b] - counts[k][b], counts[k][b])
+
+
+def _window_values(X, att, ranks, windows):
+    """
+    Look up the data value at each rank, in a single query.
+
+    Downloads the values within each window holding more than one
+    distinct value, and sorts them locally.
+    """
+    v = 'double(%s)' % att
+    ranges = sorted(set((lo, hi) for lo, hi, _, _ in windows if hi > lo))
+    if ranges:
+        cond = ' or '.join('({v} >= {lo} and {v} <= {hi})'.format(
+            v=v, lo=repr(float(lo)), hi=repr(float(hi))) for lo, hi in ranges)
+        data = X.afl.filter(X.project(att), cond).tosparse()[att]
+
+    result = []
+    for rank, (lo, hi, below, count) in zip(ranks, windows):
+        if hi == lo:
+            result.append(lo)
+            continue
+        values = np.sort(data[(data >= lo) & (data <= hi)])
+        result.append(values[int(np.clip(rank - below, 0, values.size - 1))])
+    return result
 
 
 def _plot_hist(result, **kwargs):
@@ -103,7 +476,7 @@ def _plot_hist(result, **kwargs):
     if histtype not in ['bar', 'step', 'stepfilled']:
         raise ValueError("histtype must be bar, step, or stepfilled")
 
-    width = result['bins'][1] - result['bins'][0]
+    width = np.diff(result['bins'])
 
     if histtype == 'bar':
         x = result['bins'][:-1]
@@ -134,6 +507,44 @@ def _expression_attributes(expr):
     return result
 
 
+def _combined_key(keys):
+    """
+    An AFL expression combining several string attributes into one.
+
+    Every key but the last is prefixed with its length, so that
+    different combinations of values never give the same key. Sorting
+    the combined keys orders them by (len(key1), key1, len(key2), ...),
+    not lexicographically.
+    """
+    parts = ["string(strlen({0})) + ':' + {0}".format(k) for k in keys[:-1]]
+    return ' + '.join(parts + [keys[-1]])
+
+
+def _categories(array, keys):
+    """
+    The sorted unique values of one or more attributes of an array
+
+    Several (string) attributes are combined with :func:`_combined_key`.
+    The result is stored, and cached by the interface's
+    :class:`~scidbpy.cache.CategoryCache`.
+
+    Returns
+    -------
+    cats : SciDBArray
+        A stored, 1D array of unique values, for use with index_lookup
+    """
+    def build():
+        f = array.afl
+        if len(keys) == 1:
+            values = array[keys[0]]
+        else:
+            key = _new_attribute_label('key', array)
+            values = f.papply(array, key, _combined_key(keys))
+        return f.sort(values).uniq().eval()
+
+    return array.interface.category_cache.get(array, keys, build)
+
+
 class GroupBy(object):
 
     """
@@ -227,12 +638,12 @@ class GroupBy(object):
         array, mappings = self._validate_mappings(mappings)
 
         promote = []
+        categorical = []
         by = list(self.by)
         dt = dict((l, t) for l, t, _ in array.sdbtype.full_rep)
-        f = array.afl
 
         # Every by item must be a dimension. Make it so
-        for i, b in enumerate(by):
+        for b in by:
             # already a dimension
             if b in array.dim_names:
                 continue
@@ -244,16 +655,32 @@ class GroupBy(object):
                 promote.append(b)
             else:
                 # a float, string, char, datetime, etc
-                # create a categorical index dimension for it
-                cats = f.sort(self.array[b]).uniq().eval()
-                lbl = _new_attribute_label('%s_cat' % b, self.array)
-                array = array.index_lookup(cats, b, lbl)
+                categorical.append(b)
+
+        # create a categorical index dimension for each float, char,
+        # datetime, etc, and a single one for all the strings
+        strings = [b for b in categorical if dt[b] == 'string']
+        keysets = [[b] for b in categorical if b not in strings]
+        if strings:
+            keysets.append(strings)
+
+        for keys in keysets:
+            cats = _categories(self.array, keys)
+            key = keys[0]
+            if len(keys) > 1:
+                key = _new_attribute_label('key', array)
+                array = array.apply(key, _combined_key(keys))
+
+            lbl = _new_attribute_label('%s_cat' % '_'.join(keys), array)
+            array = array.index_lookup(cats, key, lbl)
 
-                by[i] = lbl  # aggregate over index, not attribute
+            # aggregate over index, not attributes
+            by[by.index(keys[0])] = lbl
+            by = [b for b in by if b not in keys[1:]]
 
-                # make sure we pull out the category label
-                mappings.append('max({0}) as {0}'.format(b))
-                promote.append(lbl)
+            # make sure we pull out the category labels
+            mappings.extend('max({0}) as {0}'.format(b) for b in keys)
+            promote.append(lbl)
 
         array = su.to_dimensions(array, *promote)
         args = mappings + by
@@ -264,6 +691,55 @@ class GroupBy(object):
 
         return result
 
+    def agg(self, funcs, unpack=True):
+        """
+        Compute several aggregates over each group, in a single query
+
+        Parameters
+        ----------
+        funcs : string, list of strings, or dict
+           The aggregates to compute: any of the names accepted by
+           :meth:`SciDBArray.agg <scidbpy.SciDBArray.agg>` (e.g., 'sum',
+           'mean', 'std'). A string or list applies to every numeric
+           attribute that isn't grouped on. A dict maps column names to
+           an aggregate or a list of aggregates.
+
+        unpack : bool (optional)
+           See :meth:`aggregate`
+
+        Returns
+        -------
+        agg : SciDBArray
+            The grouped aggregates, with one attribute per column and
+            aggregate, named ``<column>_<aggregate>``
+
+        Examples
+        --------
+        >>> grp = z.groupby('a')
+        >>> grp.agg({'b': ['sum', 'max']}).todataframe()
+           a  b_sum  b_max
+        0  0    645     29
+        1  1    715     29
+        """
+        from .scidbarray import AGGREGATES, INTEGER_TYPES
+
+        if not isinstance(funcs, dict):
+            numeric = INTEGER_TYPES + ('float', 'double')
+            dt = dict((l, t) for l, t, _ in self.array.sdbtype.full_rep)
+            funcs = dict((col, funcs) for col in self.columns
+                         if dt.get(col) in numeric and col not in self.by)
+        mappings = []
+        for col in funcs:
+            if col not in self.columns:
+                raise KeyError("Unrecognized attribute: %s" % col)
+            for f in as_list(funcs[col]):
+                if f not in AGGREGATES:
+                    raise ValueError("Unknown aggregate %s. Must be one of %s" %
+                                     (f, sorted(AGGREGATES)))
+                mappings.append('%s(%s) as %s_%s' % (AGGREGATES[f], col, col, f))
+
+        return self.aggregate(','.join(mappings), unpack=unpack)
+
     def _validate_mappings(self, mappings):
 
         if isinstance(mappings, string_type):
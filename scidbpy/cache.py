@@ -0,0 +1,517 @@
+# License: Simplified BSD, 2014
+# See LICENSE.txt for more information
+
+"""
+Caches of derived data.
+
+:class:`ResultCache` is a local, on-disk cache of downloaded arrays.
+Arrays are stored as NumPy .npy files, and re-opened as memory maps.
+Every entry records the version and array ID of the SciDB array(s) it
+was downloaded from, and is only returned if those are still current --
+so updating an array, or removing and re-creating it under the same name,
+invalidates its entries.
+
+:class:`CategoryCache` keeps the category arrays (sorted unique values)
+used to group and join on attributes stored in the database, so that
+they are only computed once per array version.
+"""
+from __future__ import absolute_import, print_function, division, unicode_literals
+
+import os
+import re
+import json
+import uuid
+import hashlib
+import tempfile
+from time import time
+from contextlib import contextmanager
+from collections import OrderedDict
+
+import numpy as np
+
+from .utils import _is_query
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+__all__ = ['ResultCache', 'CategoryCache']
+
+# os.replace is atomic on all platforms, but Python 3 only
+_replace = getattr(os, 'replace', os.rename)
+
+
+class ResultCache(object):
+
+    """
+    A size-bounded cache of downloaded arrays, with LRU eviction
+
+    Parameters
+    ----------
+    path : str
+        The directory to store cached arrays in. Created if needed.
+        The same directory can be shared by several sessions.
+    max_bytes : int (optional, default 1GB)
+        The maximum total size of the cached files. When this is
+        exceeded, the least-recently used entries are deleted.
+
+    Notes
+    -----
+    Every change to the index re-reads it from disk and merges it,
+    while holding a lock on the cache directory, so sessions sharing
+    the directory don't overwrite each other's entries. Locking needs
+    ``fcntl``, and is skipped on platforms (like Windows) without it.
+
+    Cache hits don't rewrite the index. Their access times are
+    written with the next change, or at most every
+    ``ATIME_INTERVAL`` seconds.
+    """
+    INDEX = 'index.json'
+    LOCK = 'index.lock'
+    ATIME_INTERVAL = 60
+
+    def __init__(self, path, max_bytes=2 ** 30):
+        self.path = os.path.abspath(path)
+        self.max_bytes = int(max_bytes)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self._index = self._read_index()
+        self._atimes = {}  # access times not yet written
+        self._written = time()
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.path, self.INDEX)) as infile:
+                return json.load(infile)
+        except (IOError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        # write a temporary file and rename it over the index, so that
+        # other sessions sharing the directory never read a partial index
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as outfile:
+                json.dump(index, outfile)
+            _replace(tmp, os.path.join(self.path, self.INDEX))
+        except:
+            os.remove(tmp)
+            raise
+
+    @contextmanager
+    def _update(self):
+        """
+        Lock the directory, and yield the current index to modify.
+
+        Pending access times are merged in, and the modified
+        index is written (and kept) when the block exits.
+        """
+        with open(os.path.join(self.path, self.LOCK), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                for key, atime in self._atimes.items():
+                    if key in index:
+                        index[key]['atime'] = max(index[key]['atime'], atime)
+                yield index
+                self._write_index(index)
+                self._index = index
+                self._atimes = {}
+                self._written = time()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _filename(self, key):
+        # unique per entry, so that sessions replacing the same key
+        # never delete or overwrite each other's files
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, '%s-%s.npy' % (digest, uuid.uuid4().hex))
+
+    @staticmethod
+    def _remove(entry):
+        try:
+            os.remove(entry['file'])
+        except OSError:
+            pass
+
+    @property
+    def nbytes(self):
+        """
+        The total size of all cached files
+        """
+        return sum(entry['nbytes'] for entry in self._index.values())
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, version):
+        """
+        Lookup an entry in the cache
+
+        Parameters
+        ----------
+        key : str
+            The cache key
+        version : str
+            The current version of the data. Entries stored with
+            a different version are stale, and are discarded.
+
+        Returns
+        -------
+        array : numpy.memmap or None
+            A copy-on-write memory map of the cached array,
+            or None if no valid entry exists.
+        """
+        entry = self._index.get(key)
+        if entry is None or entry['version'] != version:
+            # another session may have stored it since
+            self._index = self._read_index()
+            entry = self._index.get(key)
+        if entry is None:
+            return None
+
+        if entry['version'] != version or not os.path.exists(entry['file']):
+            self._discard(key, entry['file'])
+            return None
+
+        try:
+            result = np.load(entry['file'], mmap_mode='c')
+        except IOError:  # evicted by another session
+            self._discard(key, entry['file'])
+            return None
+
+        self._atimes[key] = time()
+        if time() - self._written > self.ATIME_INTERVAL:
+            self.flush()
+        return result
+
+    def put(self, key, version, array):
+        """
+        Add an array to the cache
+
+        Parameters
+        ----------
+        key : str
+            The cache key
+        version : str
+            The version of the data
+        array : ndarray
+            The array to store. Arrays holding python objects
+            (e.g., strings) cannot be memory mapped, and are not cached.
+
+        Returns
+        -------
+        stored : bool
+            Whether the array was added to the cache
+        """
+        array = np.asanyarray(array)
+        if array.dtype.hasobject or array.nbytes > self.max_bytes:
+            return False
+
+        filename = self._filename(key)
+        np.save(filename, array)
+        entry = dict(version=version, file=filename,
+                     nbytes=os.path.getsize(filename), atime=time())
+
+        with self._update() as index:
+            old = index.get(key)
+            if old is not None:
+                self._remove(old)
+            index[key] = entry
+            self._evict(index)
+        return True
+
+    def _discard(self, key, filename=None):
+        # remove an entry, unless another session has replaced it
+        with self._update() as index:
+            entry = index.get(key)
+            if entry is None:
+                return
+            if filename is not None and entry['file'] != filename:
+                return
+            self._remove(index.pop(key))
+
+    def discard(self, key):
+        """
+        Remove an entry from the cache, if present
+        """
+        self._discard(key)
+
+    def clear(self):
+        """
+        Remove all entries from the cache
+        """
+        with self._update() as index:
+            for entry in index.values():
+                self._remove(entry)
+            index.clear()
+
+    def flush(self):
+        """
+        Write the access times of recent cache hits to the index
+        """
+        if self._atimes:
+            with self._update():
+                pass
+
+    def _evict(self, index):
+        # drop least-recently used entries until we fit
+        by_age = sorted(index, key=lambda k: index[k]['atime'])
+        total = sum(entry['nbytes'] for entry in index.values())
+        for key in by_age:
+            if total <= self.max_bytes:
+                break
+            total -= index[key]['nbytes']
+            self._remove(index.pop(key))
+
+
+class CategoryCache(object):
+
+    """
+    A session cache of stored category arrays, with LRU eviction
+
+    Grouping or joining on attributes first computes the sorted unique
+    values of the attributes (``sort(...).uniq()``), to index them as
+    dimensions. This cache keeps these arrays in the database for the
+    rest of the session, keyed by (array name, array ID and version,
+    attributes), so later groupbys and merges on the same keys skip the
+    sort. Updating an array, or removing and re-creating it under the
+    same name, makes its categories stale.
+
+    Parameters
+    ----------
+    interface : SciDBInterface
+        The interface the category arrays belong to
+    max_entries : int (optional, default 64)
+        The maximum number of category arrays to keep. When this is
+        exceeded, the least-recently used arrays are removed from the
+        database. 0 disables the cache.
+
+    Notes
+    -----
+    Only stored, versioned arrays are cached here. Category arrays of
+    queries and TEMP arrays are cached on the SciDBArray object itself,
+    until it is modified or the arrays are reaped.
+
+    Arrays created by this session (and not yet reaped) are not
+    validated against their version, which would take two queries per
+    lookup. Instead, their categories are discarded when a query that
+    stores into, inserts into, deletes from, removes or renames them
+    is executed, including raw queries run with
+    :meth:`~SciDBInterface.query`.
+    """
+
+    def __init__(self, interface, max_entries=64):
+        self.interface = interface
+        self.max_entries = int(max_entries)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, array, keys, build):
+        """
+        Lookup (or build) the category array for some attributes
+
+        Parameters
+        ----------
+        array : SciDBArray
+            The array whose attributes are categorized
+        keys : list of strings
+            The attribute(s) the categories are built from
+        build : callable
+            Called without arguments to compute the categories if they
+            are not cached. Must return a stored SciDBArray.
+
+        Returns
+        -------
+        cats : SciDBArray
+            The stored category array
+        """
+        if array.name in self.interface._created:
+            # arrays this session created are assumed to change only
+            # through it, which drops their categories (see forget),
+            # so they skip the version lookup
+            key, version = _array_key(self.interface, array.name), None
+        else:
+            key, version = cache_key(array)
+        if key is None or self.max_entries <= 0:
+            # these categories aren't persistent, so reap() may have
+            # removed them since they were cached
+            local = (('categories', tuple(keys)), array.name)
+            cats = array._cache.get(local)
+            if cats is None or cats.name not in self.interface._created:
+                cats = array._cache[local] = build()
+            return cats
+
+        entry = (key, version, tuple(keys))
+        cats = self._entries.pop(entry, None)
+        if cats is None:
+            # categories of older versions are stale
+            for old in [e for e in self._entries
+                        if e[0] == key and e[2] == entry[2]]:
+                self.discard(old)
+            cats = build()
+            cats.persistent = True
+
+        self._entries[entry] = cats
+        while len(self._entries) > self.max_entries:
+            self.discard(next(iter(self._entries)))
+        return cats
+
+    def discard(self, entry):
+        """
+        Remove an entry from the cache, and its array from the database
+        """
+        cats = self._entries.pop(entry, None)
+        if cats is None:
+            return
+        cats.persistent = False
+        self.interface.remove(cats)
+
+    def forget(self, name):
+        """
+        Discard the categories of an array that is being removed
+        or modified
+
+        Parameters
+        ----------
+        name : str
+            The name of the removed array
+        """
+        key = _array_key(self.interface, name)
+        for entry in [e for e in self._entries if e[0] == key]:
+            self.discard(entry)
+
+    def forget_written(self, query):
+        """
+        Discard the categories of session arrays that a query modifies
+
+        Categories of arrays created by this session aren't validated
+        against the array version, so queries that store into, insert
+        into, delete from, remove or rename them must drop them.
+
+        Parameters
+        ----------
+        query : str
+            The AFL query about to be executed
+        """
+        if not self._entries:
+            return
+        session = set(self.interface._created)
+        for name in _written_arrays(query):
+            if name in session:
+                self.forget(name)
+
+    def clear(self):
+        """
+        Remove all entries from the cache, and their arrays from the database
+        """
+        for entry in list(self._entries):
+            self.discard(entry)
+
+
+# operators that modify arrays, and the positions
+# of the arguments naming the modified arrays
+_WRITES = {'store': [-1], 'insert': [-1], 'redimension_store': [-1],
+           'delete': [0], 'remove': [0], 'remove_versions': [0],
+           'rename': [0, 1]}
+
+_CALL = re.compile(r'\b(%s)\s*\(' % '|'.join(_WRITES), re.IGNORECASE)
+
+
+def _arguments(query, start):
+    # the top-level arguments of the call whose '(' is at start
+    args, depth, quoted = [], 0, False
+    begin = start + 1
+    for i in range(start, len(query)):
+        c = query[i]
+        if c == "'":
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                args.append(query[begin:i].strip())
+                break
+        elif c == ',' and depth == 1:
+            args.append(query[begin:i].strip())
+            begin = i + 1
+    return args
+
+
+def _written_arrays(query):
+    """
+    Return the names of the arrays a query modifies
+    """
+    result = []
+    for match in _CALL.finditer(query):
+        args = _arguments(query, match.end() - 1)
+        for i in _WRITES[match.group(1).lower()]:
+            if -len(args) <= i < len(args):
+                result.append(args[i])
+    return result
+
+
+def _array_key(interface, name):
+    # arrays on different servers can share a name, ID and version
+    return '%s/array:%s' % (getattr(interface, 'hostname', ''), name)
+
+
+def cache_key(array, include_queries=False):
+    """
+    Compute the cache key and version for a SciDBArray
+
+    Parameters
+    ----------
+    array : SciDBArray
+        The array to download
+    include_queries : bool (optional, default False)
+        If True, unevaluated queries are cached by their query text.
+        Otherwise, only stored arrays are cached.
+
+    Returns
+    -------
+    key, version : strings, or (None, None)
+        The key includes the interface's hostname, so that caches
+        shared between sessions don't mix up arrays on different
+        servers. (None, None) is returned if the array should not be
+        cached, or if no version information can be found to validate it.
+
+    Notes
+    -----
+    Looking up the version of a stored array takes two queries
+    (``versions`` and ``list('arrays')``). Queries also list the
+    stored arrays, and look up the version of each array they reference.
+    """
+    interface = array.interface
+
+    if not _is_query(array.name):
+        version = interface._array_version(array.name)
+        if version is None:
+            return None, None
+        return _array_key(interface, array.name), '%s@%s' % (array.name, version)
+
+    if not include_queries:
+        return None, None
+
+    # a query is validated by the versions of every stored
+    # array that it references
+    names = interface._referenced_arrays(array.name)
+    versions = []
+    for name in names:
+        v = interface._array_version(name)
+        if v is None:
+            return None, None
+        versions.append('%s@%s' % (name, v))
+    host = getattr(interface, 'hostname', '')
+    return '%s/query:%s' % (host, array.name), ','.join(versions)
@@ -0,0 +1,122 @@
+"""
+Chunk size planning.
+
+SciDB performs best when each chunk holds roughly a million non-empty
+cells (a few megabytes per attribute). Much smaller chunks spend most
+of their time on per-chunk metadata; much larger chunks exhaust memory.
+Some operators also have their own requirements (square chunks between
+32 and 1024 for gemm, 32 for gesvd).
+
+:func:`plan_chunks` picks chunk intervals from an array's shape,
+cell width, expected density, and the operator it is destined for.
+"""
+
+# License: Simplified BSD, 2014
+# See LICENSE.txt for more information
+from __future__ import absolute_import, print_function, division, unicode_literals
+
+import numpy as np
+
+__all__ = ['plan_chunks', 'cell_bytes']
+
+# the chunk size used by SciDB-Py when none is planned
+DEFAULT_CHUNK = 1000
+
+# aim for this many bytes of data per chunk...
+TARGET_BYTES = 8 * 10 ** 6
+
+# ...within these many non-empty cells per chunk
+MIN_CELLS = 10 ** 6
+MAX_CELLS = 10 ** 7
+
+# assumed size of variable-length (string) attributes
+STRING_BYTES = 32
+
+OPERATORS = (None, 'join', 'gemm', 'gesvd')
+
+
+def cell_bytes(dtype):
+    """
+    Estimate the size of one cell of an array, in bytes
+
+    Parameters
+    ----------
+    dtype : numpy dtype, SciDB schema string, or sdbtype
+        The cell datatype
+
+    Returns
+    -------
+    nbytes : int
+    """
+    from .scidbarray import sdbtype
+
+    dtype = sdbtype(dtype).dtype
+    fields = [dtype[n] for n in dtype.names] if dtype.names else [dtype]
+    return sum(STRING_BYTES if f.hasobject else max(f.itemsize, 1)
+               for f in fields)
+
+
+def plan_chunks(shape, dtype='double', density=1.0, operator=None):
+    """
+    Choose chunk intervals for an array
+
+    Parameters
+    ----------
+    shape : tuple of ints
+        The array shape. Unbounded dimensions can be given as None.
+    dtype : numpy dtype or SciDB schema (optional, default 'double')
+        The cell datatype, used to estimate the bytes per cell
+    density : float (optional, default 1)
+        The expected fraction of non-empty cells. Sparse arrays get
+        chunks spanning proportionally more (mostly empty) cells.
+    operator : None, 'join', 'gemm', or 'gesvd' (optional)
+        The operator the array is destined for. 'gemm' requires square
+        chunks between 32 and 1024; 'gesvd' requires 32. Other arrays
+        (including join inputs) get chunks of about the target size.
+
+    Returns
+    -------
+    chunk_size : list of ints
+        One chunk interval per dimension
+
+    Notes
+    -----
+    Dimensions that fit entirely within one chunk use the default
+    chunk interval of 1000 (or their length, if longer). This keeps
+    small arrays conformable with each other, so they can be joined
+    without rechunking.
+    """
+    if operator not in OPERATORS:
+        raise ValueError("operator must be one of %s" % (OPERATORS,))
+
+    try:
+        shape = tuple(shape)
+    except TypeError:
+        shape = (shape,)
+    ndim = len(shape)
+
+    cells = TARGET_BYTES // cell_bytes(dtype)
+    cells = min(max(cells, MIN_CELLS), MAX_CELLS)
+
+    if operator == 'gesvd':
+        return [32] * ndim
+
+    if operator == 'gemm':
+        return [min(max(int(np.sqrt(cells)), 32), 1024)] * ndim
+
+    # spread the cell budget evenly over the dimensions, giving
+    # any excess from short dimensions to the longer ones
+    budget = float(cells) / min(max(density, 1e-9), 1.0)
+    result = [None] * ndim
+    order = sorted(range(ndim),
+                   key=lambda i: np.inf if shape[i] is None else shape[i])
+    for n, i in enumerate(order):
+        edge = budget ** (1. / (ndim - n))
+        size = shape[i]
+        if size is not None and size <= edge:
+            result[i] = max(size, DEFAULT_CHUNK)
+            budget /= max(size, 1)
+        else:
+            result[i] = max(int(round(edge)), 1)
+            budget /= result[i]
+    return result
@@ -0,0 +1,427 @@
+"""
+Fused elementwise expressions.
+
+Arithmetic on SciDBArrays builds one join (and, usually, one stored
+intermediate array) per operator. The classes in this module instead
+collect a whole elementwise expression tree, and compile it into a
+single query: one join of the distinct input arrays, followed by one
+apply of the combined expression.
+
+Example
+-------
+>>> a, b, c, d = sdb.elementwise(A, B, C, D)
+>>> result = ((a * b + c) / d).compile()
+
+or, equivalently,
+
+>>> result = sdb.evaluate('(a * b + c) / d', a=A, b=B, c=C, d=D)
+"""
+
+# License: Simplified BSD, 2014
+# See LICENSE.txt for more information
+from __future__ import absolute_import, print_function, division, unicode_literals
+
+import abc
+import ast
+from functools import reduce
+from numbers import Integral, Real
+
+import numpy as np
+
+from .scidbarray import SciDBArray
+from .utils import _new_attribute_label
+from .schema_utils import match_chunks
+
+__all__ = ['Expression', 'elementwise', 'evaluate']
+
+# Python operators allowed in expression strings, and their AFL tokens
+_OPERATORS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+              ast.Mod: '%', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>',
+              ast.GtE: '>=', ast.Eq: '=', ast.NotEq: '<>'}
+
+_CONSTANT = getattr(ast, 'Constant', None) or ast.Num
+
+
+def _format_constant(value):
+    if isinstance(value, (bool, np.bool_)):
+        return 'true' if value else 'false'
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, Integral):
+        return str(value)
+    if isinstance(value, Real):
+        return repr(float(value))
+    raise TypeError("Cannot use %r in an elementwise expression" % (value,))
+
+
+def as_expression(value):
+    """
+    Wrap a SciDBArray, number, or Expression as an Expression
+    """
+    if isinstance(value, Expression):
+        return value
+    if isinstance(value, SciDBArray):
+        return _Leaf(value)
+    return _Constant(value)
+
+
+class Expression(object):
+
+    """
+    An unevaluated elementwise expression over SciDBArrays
+
+    Expressions are built from arrays with :func:`elementwise`, and
+    combined with arithmetic operators, comparisons, numbers, other
+    SciDBArrays, and scalar functions (e.g. ``sdb.sin(expr)``).
+    Nothing is sent to the database until :meth:`compile` is called.
+
+    All arrays in an expression must have the same shape and origin,
+    and a single attribute. Like SciDB's join, the result only contains
+    cells that are non-empty in every input array.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def _leaves(self):
+        """Return the distinct arrays in the expression, in order"""
+        pass
+
+    @abc.abstractmethod
+    def _render(self, labels):
+        """
+        Render the expression as an AFL scalar expression
+
+        Parameters
+        ----------
+        labels : dict
+            Maps each leaf array name to its attribute name in the joined array
+        """
+        pass
+
+    def __repr__(self):
+        labels = dict((a.name, a.name) for a in self._leaves())
+        return '<Expression: %s>' % self._render(labels)
+
+    @classmethod
+    def _binary(cls, op, left, right):
+        return _Call(op, [as_expression(left), as_expression(right)], infix=True)
+
+    def __add__(self, other):
+        return self._binary('+', self, other)
+
+    def __radd__(self, other):
+        return self._binary('+', other, self)
+
+    def __sub__(self, other):
+        return self._binary('-', self, other)
+
+    def __rsub__(self, other):
+        return self._binary('-', other, self)
+
+    def __mul__(self, other):
+        return self._binary('*', self, other)
+
+    def __rmul__(self, other):
+        return self._binary('*', other, self)
+
+    def __div__(self, other):
+        return self._binary('/', self, other)
+
+    def __rdiv__(self, other):
+        return self._binary('/', other, self)
+
+    __truediv__ = __div__
+    __rtruediv__ = __rdiv__
+
+    def __mod__(self, other):
+        return self._binary('%', self, other)
+
+    def __rmod__(self, other):
+        return self._binary('%', other, self)
+
+    def __pow__(self, other):
+        return _Call('pow', [self, as_expression(other)])
+
+    def __rpow__(self, other):
+        return _Call('pow', [as_expression(other), self])
+
+    def __lt__(self, other):
+        return self._binary('<', self, other)
+
+    def __le__(self, other):
+        return self._binary('<=', self, other)
+
+    def __gt__(self, other):
+        return self._binary('>', self, other)
+
+    def __ge__(self, other):
+        return self._binary('>=', self, other)
+
+    def __neg__(self):
+        return self._binary('-', 0, self)
+
+    def __abs__(self):
+        return _Call('abs', [self])
+
+    def compile(self):
+        """
+        Build the lazy SciDBArray that computes this expression
+
+        Returns
+        -------
+        result : SciDBArray
+            An unevaluated, single-attribute array: one join
+            of the input arrays, plus one apply.
+
+        Raises
+        ------
+        ValueError
+            If the expression contains no arrays, or arrays with
+            mismatched shapes, origins, or multiple attributes.
+        """
+        leaves = self._leaves()
+        if not leaves:
+            raise ValueError("Expression must contain at least one SciDBArray")
+
+        for a in leaves:
+            if a.natt != 1:
+                raise ValueError("Array must have a single attribute")
+            if a.shape != leaves[0].shape:
+                raise ValueError("Fused expressions require arrays of the same "
+                                 "shape: %s vs %s. Use arithmetic operators "
+                                 "to broadcast." % (leaves[0].shape, a.shape))
+            if a.datashape.dim_low != leaves[0].datashape.dim_low:
+                raise ValueError("Fused expressions require arrays with the "
+                                 "same origin: %s vs %s" %
+                                 (leaves[0].datashape.dim_low, a.datashape.dim_low))
+
+        afl = leaves[0].afl
+        if len(leaves) == 1:
+            joined = leaves[0]
+            labels = {joined.name: joined.att_names[0]}
+        else:
+            # give each input a unique attribute name, then join them all
+            labels = dict((a.name, _new_attribute_label('e%i' % i, *leaves))
+                          for i, a in enumerate(leaves))
+            renamed = [afl.attribute_rename(m, a.att_names[0], labels[a.name])
+                       for a, m in zip(leaves, match_chunks(*leaves))]
+            joined = reduce(afl.join, renamed)
+
+        attr = _new_attribute_label('x', *leaves)
+        return afl.papply(joined, attr, self._render(labels))
+
+    def eval(self, **kwargs):
+        """
+        Compile and store the expression
+
+        Returns
+        -------
+        result : SciDBArray
+        """
+        return self.compile().eval(**kwargs)
+
+    def toarray(self, **kwargs):
+        """
+        Compile the expression and download the result into a NumPy array
+        """
+        return self.compile().toarray(**kwargs)
+
+
+class _Leaf(Expression):
+
+    def __init__(self, array):
+        self.array = array
+
+    def _leaves(self):
+        return [self.array]
+
+    def _render(self, labels):
+        return labels[self.array.name]
+
+
+class _Constant(Expression):
+
+    def __init__(self, value):
+        self.value = _format_constant(value)
+
+    def _leaves(self):
+        return []
+
+    def _render(self, labels):
+        return self.value
+
+
+class _Call(Expression):
+
+    def __init__(self, op, args, infix=False):
+        self.op = op
+        self.args = args
+        self.infix = infix
+
+    @classmethod
+    def from_afl(cls, op, args):
+        """
+        Build a node from an AFL infix or scalar function (e.g. ``afl.add``)
+        """
+        from .afl import infix_functions
+        args = [as_expression(a) for a in args]
+        tokens = dict(infix_functions)
+        if op.__name__ in tokens:
+            return cls(tokens[op.__name__], args, infix=True)
+        return cls(op.__name__, args)
+
+    def _leaves(self):
+        result = []
+        seen = set()
+        for arg in self.args:
+            for a in arg._leaves():
+                if a.name not in seen:
+                    seen.add(a.name)
+                    result.append(a)
+        return result
+
+    def _render(self, labels):
+        args = [arg._render(labels) for arg in self.args]
+        if self.infix:
+            return '(%s %s %s)' % (args[0], self.op, args[1])
+        return '%s(%s)' % (self.op, ', '.join(args))
+
+
+def elementwise(*arrays):
+    """
+    Wrap one or more SciDBArrays as fused elementwise expressions
+
+    Parameters
+    ----------
+    *arrays : SciDBArrays
+
+    Returns
+    -------
+    expressions : Expression, or tuple of Expressions
+        One expression per input array
+
+    See Also
+    --------
+    evaluate()
+    """
+    result = tuple(_Leaf(a) for a in arrays)
+    if len(result) == 1:
+        return result[0]
+    return result
+
+
+def _parse(node, names, functions):
+    """
+    Build an Expression from a node of a parsed expression string
+
+    Only arithmetic, comparisons, numbers, the given names, and
+    calls to SciDB scalar functions are allowed.
+
+    Parameters
+    ----------
+    node : ast.AST
+        The node to convert
+    names : dict
+        Maps each name in the expression to its Expression
+    functions : dict
+        Maps each callable name to its SciDB scalar function
+
+    Returns
+    -------
+    expression : Expression
+
+    Raises
+    ------
+    ValueError
+        If the node uses syntax or names that aren't allowed
+    """
+    def parse(child):
+        return _parse(child, names, functions)
+
+    if isinstance(node, ast.Expression):
+        return parse(node.body)
+
+    if isinstance(node, ast.BinOp):
+        left, right = parse(node.left), parse(node.right)
+        if isinstance(node.op, ast.Pow):
+            return _Call('pow', [left, right])
+        if type(node.op) in _OPERATORS:
+            return Expression._binary(_OPERATORS[type(node.op)], left, right)
+
+    if isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, ast.USub):
+            return -parse(node.operand)
+        if isinstance(node.op, ast.UAdd):
+            return parse(node.operand)
+
+    if (isinstance(node, ast.Compare) and len(node.ops) == 1 and
+            type(node.ops[0]) in _OPERATORS):
+        return Expression._binary(_OPERATORS[type(node.ops[0])],
+                                  parse(node.left), parse(node.comparators[0]))
+
+    if isinstance(node, ast.Call):
+        extra = (node.keywords or getattr(node, 'starargs', None) or
+                 getattr(node, 'kwargs', None))
+        if not isinstance(node.func, ast.Name) or extra:
+            raise ValueError("Only positional calls to SciDB functions "
+                             "are allowed in expressions")
+        if node.func.id not in functions:
+            raise ValueError("Unknown function in expression: %s" % node.func.id)
+        return _Call(functions[node.func.id], [parse(a) for a in node.args])
+
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise ValueError("Unknown name in expression: %s" % node.id)
+        return names[node.id]
+
+    if isinstance(node, _CONSTANT):
+        value = getattr(node, 'value', getattr(node, 'n', None))
+        if isinstance(value, (Integral, Real)):
+            return _Constant(value)
+
+    raise ValueError("Unsupported syntax in expression: %s" %
+                     type(node).__name__)
+
+
+def evaluate(expression, **arrays):
+    """
+    Compile an elementwise expression string into a single query
+
+    The string is parsed, not executed: only arithmetic, comparisons,
+    numbers, the given names, and SciDB scalar functions are allowed.
+
+    Parameters
+    ----------
+    expression : str
+        A Python arithmetic expression. It can use the operators
+        ``+ - * / % **``, comparisons, and SciDB scalar functions
+        such as ``sin``, ``sqrt``, or ``iif``.
+    **arrays : SciDBArrays or numbers
+        The value of each name used in the expression
+
+    Returns
+    -------
+    result : SciDBArray
+        An unevaluated array computing the expression
+
+    Raises
+    ------
+    ValueError
+        If the expression uses unsupported syntax, or unknown
+        names or functions
+
+    Examples
+    --------
+    >>> evaluate('(a * b + c) / d', a=A, b=B, c=C, d=D)
+    """
+    from .afl import functions
+
+    scalar_functions = dict((f, f) for f in functions)
+    scalar_functions['isnan'] = 'is_nan'
+    names = dict((k, as_expression(v)) for k, v in arrays.items())
+
+    try:
+        tree = ast.parse(expression.strip(), '<expression>', 'eval')
+    except SyntaxError as e:
+        raise ValueError("Invalid expression %r: %s" % (expression, e))
+    return _parse(tree, names, scalar_functions).compile()
@@ -0,0 +1,691 @@
+"""
+Batched point lookups and fancy indexing.
+
+Reading individual cells one at a time costs a full query (and download)
+per cell. The functions in this module instead upload a whole table of
+coordinates at once, and fetch all the requested cells with a single
+query.
+
+NumPy-style integer array indexing (:func:`fancy_index`) follows the same
+idea: the index arrays are uploaded as one coordinate table, which is
+cross-joined with the array along the indexed axes and redimensioned
+into the result, without any intermediate stored arrays.
+
+Boolean masks (:func:`mask_index`) are handled similarly: sparse NumPy
+masks are uploaded as the coordinates of their true cells, and masks
+computed by comparing an array to a scalar are folded into a single
+filter of that array.
+
+Row/column subsets (:func:`orthogonal_select`) build one coordinate
+remapping per masked axis, and apply all of them with a single redimension.
+"""
+
+# License: Simplified BSD, 2014
+# See LICENSE.txt for more information
+from __future__ import absolute_import, print_function, division, unicode_literals
+
+import numpy as np
+
+from .utils import (_new_attribute_label, new_alias_label, interleave,
+                    _disambiguate)
+from .schema_utils import disambiguate
+from .robust import join
+from .chunking import plan_chunks
+from ._py3k_compat import dtype as _dtype
+
+__all__ = ['lookup', 'take', 'fancy_index', 'mask_index', 'orthogonal_select']
+
+# largest chunk used for uploaded coordinate tables
+MAX_POINT_CHUNK = 1000000
+
+
+def _as_coordinates(coords, ndim):
+    """
+    Convert coordinates to an (npoints, ndim) int64 array
+
+    Parameters
+    ----------
+    coords : array-like
+        A list of coordinate tuples, an (npoints, ndim) array,
+        or (for 1D arrays) a flat list of coordinates
+    ndim : int
+        The dimensionality of the array being indexed
+    """
+    coords = np.asarray(coords, dtype=np.int64)
+    if coords.ndim == 1:
+        if ndim == 1:
+            coords = coords[:, np.newaxis]
+        elif coords.size == ndim:  # a single coordinate tuple
+            coords = coords[np.newaxis, :]
+    if coords.ndim != 2 or coords.shape[1] != ndim:
+        raise ValueError("Coordinates must have shape (npoints, %i), "
+                         "not %s" % (ndim, coords.shape))
+    return coords
+
+
+def _check_bounds(array, coords):
+    ds = array.datashape
+    for i, (lo, hi) in enumerate(zip(ds.dim_low, ds.dim_high)):
+        c = coords[:, i]
+        if (lo is not None and (c < lo).any()) or \
+                (hi is not None and (c > hi).any()):
+            raise IndexError("Coordinate out of bounds for "
+                             "dimension %s" % ds.dim_names[i])
+
+
+def _upload_points(array, coords):
+    """
+    Upload a coordinate table, as a 1D array with one int64
+    attribute per dimension of ``array`` (named after the dimensions)
+    """
+    table = np.empty(len(coords),
+                     dtype=_dtype([(d, 'int64') for d in array.dim_names]))
+    for i, d in enumerate(array.dim_names):
+        table[d] = coords[:, i]
+    chunk = max(min(len(coords), MAX_POINT_CHUNK), 1)
+    return array.interface.from_array(table, chunk_size=chunk)
+
+
+def _gather_points(array, coords):
+    """
+    Fetch the cells at a set of distinct coordinates, in one query
+
+    Returns
+    -------
+    values : ndarray
+        One value (or record) per coordinate. Empty cells are
+        filled in the same way as by SciDBArray.toarray()
+    """
+    points = _upload_points(array, coords)
+    try:
+        # SciDB's lookup operator reads one cell per coordinate record,
+        # and keeps the layout of the coordinate table
+        return array.afl.lookup(points, array).toarray()
+    finally:
+        points.reap()
+
+
+def lookup(array, coords):
+    """
+    Fetch the values at many cells of an array, with a single query
+
+    Parameters
+    ----------
+    array : SciDBArray
+        The array to read from
+    coords : array-like
+        The (absolute) coordinates of each cell to read: a list of
+        tuples, or an (npoints, ndim) integer array. For 1D arrays,
+        a flat list of coordinates is also accepted.
+
+    Returns
+    -------
+    values : ndarray
+        A 1D array of length npoints. Arrays with multiple attributes
+        return record arrays. Empty cells are filled in the same
+        way as by :meth:`SciDBArray.toarray`.
+
+    Raises
+    ------
+    IndexError
+        If any coordinate lies outside the array bounds
+    """
+    coords = _as_coordinates(coords, array.ndim)
+    if len(coords) == 0:
+        return np.zeros(0, dtype=array.dtype)
+
+    _check_bounds(array, coords)
+
+    # duplicate coordinates are fetched once
+    unique, inverse = np.unique(coords, axis=0, return_inverse=True)
+    values = _gather_points(array, unique)
+    return values[inverse.ravel()]
+
+
+def take(array, indices, axis=None):
+    """
+    Take elements from an array, like numpy.take
+
+    Parameters
+    ----------
+    array : SciDBArray
+        The (bounded) array to read from
+    indices : array-like of ints
+        Positions to take. Negative indices count from the end.
+    axis : int (optional)
+        The axis to take positions along. By default,
+        positions refer to the flattened array.
+
+    Returns
+    -------
+    values : ndarray or SciDBArray
+        With ``axis=None``, the downloaded values, with the shape of
+        ``indices``. Otherwise, an unevaluated SciDBArray.
+    """
+    if axis is not None:
+        if axis < 0:
+            axis += array.ndim
+        if not 0 <= axis < array.ndim:
+            raise ValueError("Invalid axis for %i-dimensional array: %i"
+                             % (array.ndim, axis))
+        idx = [slice(None)] * array.ndim
+        idx[axis] = np.asarray(indices)
+        return fancy_index(array, idx)
+
+    shape = array.shape
+    if shape is None:
+        raise ValueError("take requires an array with bounded dimensions")
+
+    indices = np.asarray(indices, dtype=np.int64)
+    size = int(np.prod(shape))
+    if ((indices < -size) | (indices >= size)).any():
+        raise IndexError("index out of bounds for array of size %i" % size)
+
+    flat = indices.ravel() % max(size, 1)
+    coords = np.column_stack(np.unravel_index(flat, shape)).reshape(-1, len(shape))
+    coords += np.asarray(array.datashape.dim_low, dtype=np.int64)
+    return lookup(array, coords).reshape(indices.shape)
+
+
+def is_index_array(idx):
+    """
+    Is idx an integer index array (a list, ndarray, or
+    single-attribute integer SciDBArray)?
+    """
+    from .scidbarray import SciDBArray
+
+    if isinstance(idx, SciDBArray):
+        rep = idx.sdbtype.full_rep
+        return len(rep) == 1 and rep[0][1].startswith(('int', 'uint'))
+    if isinstance(idx, list):
+        idx = np.asarray(idx)
+    return isinstance(idx, np.ndarray) and idx.dtype.kind in 'iu'
+
+
+def _dim_spec(name, lo, hi, chunk, overlap):
+    return '%s=%s:%s,%i,%i' % (name, lo, '*' if hi is None else hi,
+                               chunk, overlap)
+
+
+def _array_dim_specs(array):
+    ds = array.datashape
+    return [_dim_spec(*s) for s in zip(ds.dim_names, ds.dim_low, ds.dim_high,
+                                       ds.chunk_size, ds.chunk_overlap)]
+
+
+def _index_chunks(shape, volume):
+    """
+    Chunk sizes for the index dimensions of a gather result
+
+    Chosen so that each output chunk (including the ``volume``
+    cells of the non-indexed dimensions) holds about
+    MAX_POINT_CHUNK cells.
+    """
+    budget = max(MAX_POINT_CHUNK // max(volume, 1), 1)
+    result = []
+    for s in reversed(shape):
+        c = max(min(s, budget), 1)
+        budget = max(budget // c, 1)
+        result.append(c)
+    return result[::-1]
+
+
+def _axis_lengths(array):
+    """The length of each dimension, or None for unbounded dimensions"""
+    ds = array.datashape
+    return [None if hi is None else hi - lo + 1
+            for lo, hi in zip(ds.dim_low, ds.dim_high)]
+
+
+def _wrap_positions(idx, n):
+    """Check positions along an axis of length n, and wrap negative values"""
+    if n is None:
+        if (idx < 0).any():
+            raise IndexError("Negative indices require a bounded dimension")
+        return idx
+    if ((idx < -n) | (idx >= n)).any():
+        raise IndexError("index out of bounds for axis with size %i" % n)
+    return idx % max(n, 1)
+
+
+def _numpy_index_table(array, axes, arrays, volume):
+    """
+    Upload broadcasted NumPy index arrays as one coordinate table
+
+    Returns
+    -------
+    table : SciDBArray
+        An array with the broadcast shape of the index arrays, and one
+        int64 attribute per indexed dimension, holding absolute coordinates
+    index_dims : list of str
+        The dimension schema of each dimension of the table
+    """
+    ds = array.datashape
+    shape = _axis_lengths(array)
+    arrays = np.broadcast_arrays(*arrays)
+    bshape = arrays[0].shape
+
+    fields = [ds.dim_names[a] for a in axes]
+    table = np.empty(bshape, dtype=_dtype([(f, 'int64') for f in fields]))
+    for f, a, idx in zip(fields, axes, arrays):
+        table[f] = _wrap_positions(idx.astype(np.int64), shape[a]) + ds.dim_low[a]
+
+    dim_names = [_new_attribute_label('idx_%i' % i, array)
+                 for i in range(len(bshape))]
+    table = array.interface.from_array(table,
+                                       chunk_size=_index_chunks(bshape, volume),
+                                       dim_names=dim_names)
+    return table, _array_dim_specs(table)
+
+
+def _scidb_index_table(array, axis, idx):
+    """
+    Convert an integer SciDBArray into a coordinate table for one axis
+
+    Returns
+    -------
+    table : SciDBArray
+        The index array, with an int64 attribute holding absolute
+        coordinates along the dimension ``axis`` of ``array``
+    index_dims : list of str
+        The dimension schema of each dimension of the table
+    """
+    ds = array.datashape
+    dim = ds.dim_names[axis]
+
+    # relabel the index dimensions and attribute, to avoid
+    # clashes with the array
+    ids = idx.datashape
+    names = [_new_attribute_label('idx_%i' % i, array)
+             for i in range(idx.ndim)]
+    index_dims = [_dim_spec(*spec) for spec in zip(
+        names, ids.dim_low, ids.dim_high, ids.chunk_size, ids.chunk_overlap)]
+    att = _new_attribute_label('index', array, idx)
+    _, typ, nullable = idx.sdbtype.full_rep[0]
+    idx = array.afl.cast(idx, '<%s:%s%s> [%s]' % (att, typ,
+                                                  ' NULL' if nullable else '',
+                                                  ','.join(index_dims)))
+
+    # SciDBArray index values are coordinates, not positions
+    return array.afl.apply(idx, dim, 'int64(%s)' % att), index_dims
+
+
+def fancy_index(array, indices):
+    """
+    NumPy-style indexing with integer arrays
+
+    Parameters
+    ----------
+    array : SciDBArray
+        The array to index
+    indices : tuple
+        One entry per dimension: a slice, an integer, or an integer
+        index array (list, ndarray, or SciDBArray). Lists and ndarrays
+        hold positions, relative to the start of each dimension
+        (negative positions count from the end). SciDBArrays hold
+        coordinates along the dimension, as they always have.
+
+    Returns
+    -------
+    result : SciDBArray
+        An unevaluated array. As in NumPy, the index arrays are
+        broadcast together, and their shape replaces the indexed
+        dimensions: in place if the indexed dimensions are adjacent,
+        otherwise at the front.
+
+    Notes
+    -----
+    The result is computed with a single query: the index arrays are
+    uploaded as one coordinate table, redimensioned onto the indexed
+    dimensions, cross-joined with the array, and redimensioned into
+    the result. Several SciDBArray index arrays can't be combined;
+    use NumPy index arrays instead.
+    """
+    from .scidbarray import SciDBArray
+
+    indices = list(indices)
+    if len(indices) > array.ndim:
+        raise ValueError("too many indices")
+    indices += [slice(None)] * (array.ndim - len(indices))
+
+    # basic slices are applied first, with subarray/thin
+    if any(isinstance(i, slice) and i != slice(None) for i in indices):
+        array = array[tuple(i if isinstance(i, slice) else slice(None)
+                            for i in indices)]
+        indices = [slice(None) if isinstance(i, slice) else i
+                   for i in indices]
+
+    axes = [k for k, i in enumerate(indices) if not isinstance(i, slice)]
+    rest = [k for k in range(array.ndim) if k not in axes]
+    ds = array.datashape
+
+    scidb_indices = [indices[k] for k in axes
+                     if isinstance(indices[k], SciDBArray)]
+    if scidb_indices:
+        if len(axes) != 1:
+            raise NotImplementedError("Only one SciDBArray index array "
+                                      "is supported. Use NumPy arrays to "
+                                      "index several dimensions at once")
+        idx = scidb_indices[0]
+        if idx.natt != 1:
+            raise ValueError("Can only index with single-attribute arrays")
+        table, index_dims = _scidb_index_table(array, axes[0], idx)
+    else:
+        arrays = [np.asarray(indices[k]) for k in axes]
+        for idx in arrays:
+            if idx.dtype.kind not in 'iu':
+                raise IndexError("arrays used as indices must be "
+                                 "of integer type")
+        volume = int(np.prod([ds.chunk_size[k] for k in rest]))
+        table, index_dims = _numpy_index_table(array, axes, arrays, volume)
+
+    # move the coordinates of every index entry into dimensions,
+    # next to the index dimensions. A dummy attribute keeps the
+    # schema valid
+    dummy = _new_attribute_label('__dummy', array)
+    dim_specs = _array_dim_specs(array)
+    table = array.afl.apply(table, dummy, 0)
+    table = array.afl.redimension(table, '<%s:int64> [%s]' % (
+        dummy, ','.join([dim_specs[k] for k in axes] + index_dims)))
+
+    # the table was built with the array's chunking, so they can be
+    # cross joined directly
+    l = new_alias_label('L', array, table)
+    r = new_alias_label('R', array, table)
+    joined = [ds.dim_names[k] for k in axes]
+    result = array.afl.cross_join(array.as_(l), table.as_(r),
+                                  *interleave(['%s.%s' % (l, d) for d in joined],
+                                              ['%s.%s' % (r, d) for d in joined]))
+
+    # numpy puts the index dimensions in place of adjacent
+    # indexed dimensions, and at the front otherwise
+    if axes == list(range(axes[0], axes[-1] + 1)):
+        out = ([dim_specs[k] for k in rest if k < axes[0]] + index_dims +
+               [dim_specs[k] for k in rest if k > axes[0]])
+    else:
+        out = index_dims + [dim_specs[k] for k in rest]
+
+    return array.afl.redimension(result, '%s [%s]' % (array.sdbtype,
+                                                     ','.join(out)))
+
+
+def _flatten(array):
+    """
+    Collapse the non-empty cells of an array into 1D, in C order
+    """
+    flat = array.unpack(_new_attribute_label('__idx', array))
+
+    # unpack emits cells chunk by chunk. This matches C order unless
+    # a trailing dimension spans several chunks
+    ds = array.datashape
+    if any(hi is None or c < hi - lo + 1
+           for lo, hi, c in list(zip(ds.dim_low, ds.dim_high,
+                                     ds.chunk_size))[1:]):
+        flat = array.afl.sort(flat, *ds.dim_names)
+
+    return flat.project(*array.att_names)
+
+
+def _numpy_mask(array, mask, flatten):
+    """
+    Select cells with a NumPy boolean mask
+
+    The mask (or coordinate table) is uploaded, so the result is
+    stored and the upload is removed.
+    """
+    afl = array.afl
+    coords = np.argwhere(mask) + np.asarray(array.datashape.dim_low,
+                                            dtype=np.int64)
+
+    # upload whichever is smaller: the mask itself, or the
+    # coordinates of its true cells
+    whole = not flatten and coords.size * 8 >= mask.size
+    if whole:
+        upload = array.interface.from_array(mask)
+    else:
+        upload = _upload_points(array, coords)
+
+    try:
+        if flatten:
+            # the coordinates of true cells are in C order already
+            result = afl.lookup(upload, array)
+        elif whole:
+            result = _filter_join(array, upload)
+        else:
+            dummy = _new_attribute_label('__dummy', array)
+            points = afl.apply(upload, dummy, 0)
+            points = afl.redimension(points, '<%s:int64> %s' %
+                                     (dummy, array.datashape.dim_schema))
+            result = afl.project(afl.join(array, points), *array.att_names)
+        return result.eval()
+    finally:
+        upload.reap()
+
+
+def _filter_join(array, mask):
+    """
+    Select cells with a boolean SciDBArray mask, via a join
+    """
+    f = array.afl
+    array, mask = disambiguate(array, mask)
+    joined = join(array, mask)
+    expr = '%s=TRUE' % mask.att_names[0]
+    return f.project(f.filter(joined, expr), *array.att_names)
+
+
+def mask_index(array, mask, flatten=False):
+    """
+    Select the cells of an array where a boolean mask is true
+
+    Parameters
+    ----------
+    array : SciDBArray
+        The array to select from
+    mask : SciDBArray or ndarray
+        A single-attribute boolean array with the same shape as ``array``
+    flatten : bool (optional, default False)
+        If False, the result has the same shape as ``array``, and
+        cells where the mask is false are empty. If True, the selected
+        cells are returned as a dense 1D array in C order, like
+        ``ndarray[mask]``.
+
+    Returns
+    -------
+    result : SciDBArray
+        An unevaluated array, unless ``mask`` is a NumPy array: it is
+        uploaded, so the result is stored and the upload is removed.
+
+    Notes
+    -----
+    - NumPy masks are uploaded as the coordinates of their true cells
+      when that is smaller than the mask itself.
+    - Masks built by comparing ``array`` itself to a scalar
+      (e.g. ``x[x > 3]``) are applied with a single filter, without a join.
+    """
+    from .scidbarray import SciDBArray
+
+    if mask.shape and array.shape and tuple(mask.shape) != array.shape:
+        raise ValueError("Shape of mask does not match array: %s vs %s" %
+                         (tuple(mask.shape), array.shape))
+
+    if isinstance(mask, np.ndarray):
+        if mask.dtype.kind != 'b':
+            raise TypeError("Boolean mask must have a boolean dtype")
+        return _numpy_mask(array, mask, flatten)
+
+    if not isinstance(mask, SciDBArray) or mask.natt != 1:
+        raise TypeError("Boolean mask must have a single attribute")
+
+    condition = mask._condition
+    if condition is not None and condition[0] == array.name:
+        result = array.afl.filter(array, condition[1])
+    else:
+        result = _filter_join(array, mask)
+
+    if flatten:
+        result = _flatten(result)
+    return result
+
+
+def _numpy_axis_remap(array, axis, mask, names):
+    """
+    Build the remapping table for a NumPy mask along one axis
+
+    Returns
+    -------
+    remap : SciDBArray
+        A 1D array along the dimension ``axis`` of ``array``, whose
+        attribute ``names[1]`` gives the new position of each retained
+        cell.
+    count : int
+        The number of retained positions
+    """
+    ds = array.datashape
+    n = _axis_lengths(array)[axis]
+    mask = np.asarray(mask)
+    if mask.dtype.kind != 'b' or mask.ndim != 1:
+        raise TypeError("Axis masks must be 1D boolean arrays")
+    if n is not None and len(mask) != n:
+        raise ValueError("Mask length does not match axis %i: %i vs %i" %
+                         (axis, len(mask), n))
+
+    keep = np.flatnonzero(mask)
+    table = np.empty(len(keep), dtype=_dtype([(names[0], 'int64'),
+                                              (names[1], 'int64')]))
+    table[names[0]] = keep + ds.dim_low[axis]
+    table[names[1]] = np.arange(len(keep))
+    chunk = max(min(len(keep), MAX_POINT_CHUNK), 1)
+    remap = array.interface.from_array(table, chunk_size=chunk)
+    return remap, len(keep)
+
+
+def _scidb_axis_remap(array, axis, mask, names):
+    """
+    Build the remapping table for a 1D SciDBArray mask along one axis
+
+    Non-empty cells of the mask (or, for boolean masks, true cells)
+    are retained. The new positions are computed lazily by sorting
+    the retained coordinates. The retained cells are counted (one
+    count query, cached on mask), so that the result stays bounded.
+    """
+    f = array.afl
+    if mask.ndim != 1:
+        raise ValueError("Axis masks must be 1-dimensional")
+    if mask.shape and array.shape and mask.shape[0] != array.shape[axis]:
+        raise ValueError("Mask length does not match axis %i: %i vs %i" %
+                         (axis, mask.shape[0], array.shape[axis]))
+
+    dim = mask.dim_names[0]
+    if mask.sdbtype.full_rep[0][1] == 'bool':
+        mask = f.filter(mask, "%s=TRUE" % mask.att_names[0])
+    count = int(mask.nonempty())
+    chunk = plan_chunks((max(count, 1),), dtype='int64')[0]
+
+    # the sorted coordinates of the retained cells. Their position
+    # in the sorted array is their new position
+    q = f.papply(mask, names[0], dim)
+    q = f.sort(q, '%s asc' % names[0], chunk)
+    q = f.cast(q, '<%s:int64>[%s=0:*,%i,0]' % (names + (chunk,)))
+    return q, count
+
+
+def orthogonal_select(array, masks):
+    """
+    Select a subset of positions along several axes at once
+
+    This is the analog of ``ndarray[np.ix_(*masks)]``, and is used by
+    :meth:`SciDBArray.compress` and :meth:`SciDBArray.subset`.
+
+    Parameters
+    ----------
+    array : SciDBArray
+        The array to select from
+    masks : sequence
+        One entry per leading axis of ``array``. Each entry is either
+        None (keep the whole axis), a 1D boolean NumPy array, or a 1D
+        SciDBArray. For SciDBArrays, true (for boolean masks) or
+        non-empty (otherwise) cells are retained.
+
+    Returns
+    -------
+    result : SciDBArray
+        An array with the same dimension names as ``array``. The result
+        is unevaluated, unless NumPy masks are given: their remapping
+        tables are uploaded, so the result is stored and the tables
+        are removed.
+
+    Notes
+    -----
+    A remapping from old to new coordinates is computed for every
+    masked axis. The remappings are cross-joined onto the array, and
+    applied by a single redimension. The cells retained by SciDBArray
+    masks are counted, so every dimension of the result is bounded.
+    """
+    from .scidbarray import SciDBArray
+
+    masks = list(masks)
+    if len(masks) > array.ndim:
+        raise ValueError("too many masks")
+    masks += [None] * (array.ndim - len(masks))
+    if all(m is None for m in masks):
+        return array
+
+    f = array.afl
+    ds = array.datashape
+    taken = ds.dim_names + ds.sdbtype.names
+    for m in masks:
+        if isinstance(m, SciDBArray):
+            taken = taken + m.dim_names + m.att_names
+
+    result = array
+    uploads = []
+    new_dims = list(zip(ds.dim_names, ds.dim_low, ds.dim_high,
+                        ds.chunk_size, ds.chunk_overlap))
+
+    for axis, mask in enumerate(masks):
+        if mask is None:
+            continue
+
+        dim = ds.dim_names[axis]
+        coord = _disambiguate(dim, taken)
+        position = _disambiguate(coord + '_0', taken + [coord])
+        taken = taken + [coord, position]
+
+        if isinstance(mask, SciDBArray):
+            remap, count = _scidb_axis_remap(array, axis, mask,
+                                             (coord, position))
+        else:
+            remap, count = _numpy_axis_remap(array, axis, mask,
+                                             (coord, position))
+            uploads.append(remap)
+        if count == 0:
+            for remap in uploads:
+                remap.reap()
+            raise ValueError("Cannot discard all elements of array")
+
+        # index the remapping by the old coordinate, chunked like the array
+        remap = f.redimension(remap, '<%s:int64>[%s]' % (
+            position, _dim_spec(coord, *new_dims[axis][1:])))
+
+        l = new_alias_label('L', result, remap)
+        r = new_alias_label('R', result, remap)
+        result = f.cross_join(result.as_(l), remap.as_(r),
+                              '%s.%s' % (l, dim), '%s.%s' % (r, coord))
+        new_dims[axis] = (position, 0, count - 1,
+                          ds.chunk_size[axis], ds.chunk_overlap[axis])
+
+    # move every new position into place at once, then
+    # restore the original dimension names
+    result = f.redimension(result, '%s [%s]' % (
+        array.sdbtype, ','.join(_dim_spec(*d) for d in new_dims)))
+    result = f.cast(result, '%s [%s]' % (
+        array.sdbtype, ','.join(_dim_spec(name, *d[1:])
+                                for name, d in zip(ds.dim_names, new_dims))))
+
+    if uploads:
+        try:
+            result = result.eval()
+        finally:
+            for remap in uploads:
+                remap.reap()
+    return result
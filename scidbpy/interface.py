@@ -32,7 +32,7 @@ from ._py3k_compat import (quote,
 import re
 import numpy as np
 from .scidbarray import SciDBArray, SciDBDataShape, ArrayAlias, SDB_IND_TYPE
-from .errors import SHIM_ERROR_DICT, SciDBQueryError, SciDBInvalidSession
+from .errors import SHIM_ERROR_DICT, SciDBError, SciDBQueryError, SciDBInvalidSession
 from .utils import broadcastable, _is_query, iter_record, _new_attribute_label, as_list
 from .schema_utils import (disambiguate, as_row_vector, as_column_vector,
                            zero_indexed, match_dimensions,
@@ -44,6 +44,9 @@ from .robust import (join, merge, gemm, uniq, gesvd)
 
 from . import arithmetic, relational
 from .parse import _scidb_serialize
+from .cache import ResultCache, CategoryCache
+from .chunking import plan_chunks
+from .expression import Expression, _Call, elementwise, evaluate
 
 __all__ = ['SciDBInterface', 'SciDBShimInterface', 'connect']
 
@@ -103,7 +106,14 @@ class SciDBInterface(object):
         self._created = []
         self._persistent = set()
         self.default_compression = None
+        self.density_hint = 'auto'
+        self.result_cache = None
+        self.category_cache = CategoryCache(self)
+        self._transfer_stats = {}
+        self._transfer_count = 0
+        self._libraries = set()
         atexit.register(self.reap)
+        atexit.register(self.category_cache.clear)
 
     """SciDBInterface Abstract Base Class.
 
@@ -120,11 +130,23 @@ class SciDBInterface(object):
     """
     __metaclass__ = abc.ABCMeta
 
+    #: Estimated payloads below this size (in bytes)
+    #: are never compressed by the adaptive policy
+    adaptive_min_bytes = 2 ** 20
+
+    #: The compression levels considered by the adaptive policy
+    adaptive_levels = (None, 1, 6)
+
+    #: How many transfers to wait before re-measuring an unused level
+    adaptive_probe_interval = 20
+
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
         self.reap()
+        if self.result_cache is not None:
+            self.result_cache.flush()
 
     @abc.abstractmethod
     def _execute_query(self, query, response=False, n=0, fmt='auto'):
@@ -168,6 +190,7 @@ class SciDBInterface(object):
         if not hasattr(self, '_query_log'):
             self._query_log = []
         self._query_log.append(query)
+        self.category_cache.forget_written(query)
 
     @property
     def default_compression(self):
@@ -178,10 +201,180 @@ class SciDBInterface(object):
 
     @default_compression.setter
     def default_compression(self, value):
-        if value not in [None, 1, 2, 3, 4, 5, 6, 7, 8, 9]:
-            raise ValueError("default_compression must be None or 1-9")
+        if value not in [None, 1, 2, 3, 4, 5, 6, 7, 8, 9, 'adaptive']:
+            raise ValueError("default_compression must be None, 1-9, "
+                             "or 'adaptive'")
         self._default_compression = value
 
+    @property
+    def density_hint(self):
+        """
+        How arithmetic should treat the sparsity of its operands.
+
+        'auto' (the default) treats unbounded arrays as sparse, uses
+        cached density information when available, and otherwise
+        counts the non-empty cells of each operand once. 'dense' and
+        'sparse' skip these checks, and assume every operand is
+        dense or sparse.
+        """
+        return self._density_hint
+
+    @density_hint.setter
+    def density_hint(self, value):
+        if value not in ['auto', 'dense', 'sparse']:
+            raise ValueError("density_hint must be 'auto', 'dense', or 'sparse'")
+        self._density_hint = value
+
+    def _is_sparse(self, array):
+        """
+        Decide whether to treat an operand as sparse, following density_hint
+        """
+        if self.density_hint != 'auto':
+            return self.density_hint == 'sparse'
+        if array.shape is None:
+            return True
+        return array.issparse()
+
+    def _resolve_compression(self, compression='auto', nbytes=None):
+        """
+        Choose the compression level for a transfer
+
+        Parameters
+        ----------
+        compression : None, 1-9, 'auto', or 'adaptive'
+            The requested compression. 'auto' uses ``default_compression``.
+        nbytes : int or None
+            The estimated size of the uncompressed payload, or
+            None if unknown.
+
+        Returns
+        -------
+        level : None or 1-9
+        """
+        if compression == 'auto':
+            compression = self.default_compression
+        if compression != 'adaptive':
+            return compression
+
+        if nbytes is not None and nbytes < self.adaptive_min_bytes:
+            return None
+
+        # pick the level with the best measured throughput, but
+        # periodically re-measure levels that haven't been used recently
+        stats = self._transfer_stats
+        stale = [level for level in self.adaptive_levels
+                 if level not in stats or
+                 self._transfer_count - stats[level][1] > self.adaptive_probe_interval]
+        if stale:
+            return stale[0]
+        return max(self.adaptive_levels, key=lambda level: stats[level][0])
+
+    def _record_transfer(self, compression, nbytes, seconds):
+        """
+        Update the throughput estimate for a compression level
+
+        Parameters
+        ----------
+        compression : None or 1-9
+            The compression level of the transfer
+        nbytes : int
+            The size of the (decompressed) payload
+        seconds : float
+            The time taken to download and decompress the payload
+        """
+        # every transfer counts toward adaptive_probe_interval, but
+        # small transfers are dominated by latency, and don't say
+        # anything about throughput
+        self._transfer_count += 1
+        if nbytes < 2 ** 16 or seconds <= 0:
+            return
+
+        rate = nbytes / seconds
+        if compression in self._transfer_stats:
+            old = self._transfer_stats[compression][0]
+            rate = old + 0.3 * (rate - old)
+        self._transfer_stats[compression] = (rate, self._transfer_count)
+
+    def enable_cache(self, path, max_bytes=2 ** 30):
+        """
+        Cache downloaded arrays in a local directory.
+
+        Once enabled, :meth:`SciDBArray.toarray` stores the result of
+        downloading a stored array as a memory-mappable file, and
+        re-uses it on subsequent downloads of the same array. Each
+        entry is validated against the array's current version in the
+        database, so stale data is never returned.
+
+        Parameters
+        ----------
+        path : str
+            The cache directory. It can be shared between sessions.
+        max_bytes : int (optional, default 1GB)
+            The maximum size of the cache. Least-recently used
+            entries are evicted to stay within this bound.
+
+        Returns
+        -------
+        cache : :class:`scidbpy.cache.ResultCache`
+            The new cache. It is also available as the
+            ``result_cache`` attribute. Set ``result_cache`` to None
+            to disable caching.
+        """
+        self.result_cache = ResultCache(path, max_bytes=max_bytes)
+        return self.result_cache
+
+    def _array_identity(self, name):
+        """
+        Return the unique array ID (UAID) of a stored array, or None
+        if it is missing. Unlike the name, the ID changes when an
+        array is removed and re-created.
+        """
+        query = self.afl.filter(self.afl.list("'arrays'"),
+                                "name = '%s'" % name)
+        try:
+            result = query.toarray(cache=False)
+        except SciDBError:
+            return None
+
+        # older SciDB releases call the attribute 'id'
+        for field in ('uaid', 'id'):
+            if field in (result.dtype.names or ()) and result.size:
+                return int(result[field][0])
+        return None
+
+    def _array_version(self, name):
+        """
+        Return a version string for a stored array, or None
+        if the array is unversioned (e.g., a TEMP array) or missing
+
+        The string combines the array ID and its latest version ID,
+        so it changes when the array is updated, and also when it
+        is removed and re-created under the same name.
+        """
+        query = "aggregate(versions({0}), max(version_id))".format(name)
+        try:
+            response = self._execute_query(query, response=True,
+                                           fmt='(int64 null)')
+        except SciDBError:
+            return None
+
+        version = np.frombuffer(response, dtype=[(str('mask'), '<u1'),
+                                                 (str('data'), '<i8')])
+        if version.size == 0 or version['mask'][0] != 255:
+            return None
+
+        identity = self._array_identity(name)
+        if identity is None:
+            return None
+        return '%d.%d' % (identity, version['data'][0])
+
+    def _referenced_arrays(self, query):
+        """
+        Return the sorted names of all stored arrays referenced in a query
+        """
+        tokens = set(re.findall(r'\w+', query))
+        return sorted(tokens & set(self.list_arrays()))
+
     @abc.abstractmethod
     def _upload_bytes(self, data):
         """Upload binary data to the SciDB engine
@@ -224,6 +417,7 @@ class SciDBInterface(object):
         for array in list(self._created):
             if array in self._persistent:
                 continue
+            self.category_cache.forget(array)
             try:
                 self.query("remove({0})", array)
             except SciDBQueryError:  # array does not exist
@@ -231,6 +425,18 @@ class SciDBInterface(object):
 
         self._created = []
 
+    def _load_library(self, library):
+        """
+        Load a SciDB plugin library, if this interface hasn't already
+
+        Operators like spgemm and gesvd are provided by plugins, which
+        may not be loaded on a freshly started server.
+        """
+        if library in self._libraries:
+            return
+        self._execute_query("load_library('%s')" % library)
+        self._libraries.add(library)
+
     def _db_array_name(self):
         """Return a unique array name for a new array on the database"""
         arr_key = 'py'
@@ -307,7 +513,7 @@ class SciDBInterface(object):
         return SciDBArray(datashape, self, scidbname, persistent=persistent)
 
     def new_array(self, shape=None, dtype='double', persistent=False,
-                  name=None, **kwargs):
+                  name=None, temp=False, **kwargs):
         """
         Create a new array, either instantiating it in SciDB or simply
         reserving the name for use in a later query.
@@ -330,9 +536,16 @@ class SciDBInterface(object):
         name : str (optional)
             The name to give the array in the databse. If present,
             persistent will be set to True.
+        temp : boolean (optional)
+            If True, create a TEMP array. TEMP arrays are not versioned,
+            which makes them cheaper to write, but they do not survive
+            a database restart. Default is False.
         **kwargs : (optional)
             If `shape` is specified, additional keyword arguments are passed
             to SciDBDataShape.  Otherwise, these will not be referenced.
+            If `chunk_size` isn't given, it is chosen by
+            :func:`~scidbpy.chunking.plan_chunks`.
+
         Returns
         -------
         arr : SciDBArray
@@ -344,14 +557,24 @@ class SciDBInterface(object):
         name = name or self._db_array_name()
 
         if shape is not None or ('dim_low' in kwargs and 'dim_high' in kwargs):
-            datashape = SciDBDataShape(shape, dtype, **kwargs)
-            query = "CREATE ARRAY {0} {1}".format(name, datashape.schema)
+            datashape = self._datashape(shape, dtype, **kwargs)
+            query = "CREATE {0}ARRAY {1} {2}".format('TEMP ' if temp else '',
+                                                     name, datashape.schema)
             self._execute_query(query)
         else:
             datashape = None
         result = SciDBArray(datashape, self, name, persistent=persistent)
         return result
 
+    def _datashape(self, shape, dtype='double', **kwargs):
+        """
+        Build a SciDBDataShape, choosing the chunk size with
+        :func:`~scidbpy.chunking.plan_chunks` unless it is given.
+        """
+        if shape is not None and 'chunk_size' not in kwargs:
+            kwargs['chunk_size'] = plan_chunks(shape, dtype)
+        return SciDBDataShape(shape, dtype, **kwargs)
+
     def _format_query_string(self, query, *args, **kwargs):
         """Format query string.
 
@@ -474,6 +697,7 @@ class SciDBInterface(object):
         --------
         reap(), SciDBArray.reap()
         """
+        self.category_cache.forget(getattr(array, 'name', array))
         try:
             self.query("remove({0})", array)
         except SciDBQueryError:  # array does not exist
@@ -498,7 +722,7 @@ class SciDBInterface(object):
         """
         arr = self.new_array(shape, dtype, **kwargs)
         self.afl.build(arr, 1).eval(out=arr)
-        return arr
+        return arr._mark_dense()
 
     def zeros(self, shape, dtype='double', **kwargs):
         """Return an array of zeros
@@ -517,8 +741,8 @@ class SciDBInterface(object):
         arr: SciDBArray
             A SciDBArray consisting of all zeros.
         """
-        schema = SciDBDataShape(shape, dtype, **kwargs).schema
-        return self.afl.build(schema, 0).eval()
+        schema = self._datashape(shape, dtype, **kwargs).schema
+        return self.afl.build(schema, 0).eval()._mark_dense()
 
     def random(self, shape, dtype='double', lower=0, upper=1, persistent=False,
                **kwargs):
@@ -548,10 +772,10 @@ class SciDBInterface(object):
         # TODO: can be done more efficiently
         #       if lower is 0 or upper - lower is 1
         array = self.new_array(persistent=persistent)
-        schema = SciDBDataShape(shape, dtype, **kwargs).schema
+        schema = self._datashape(shape, dtype, **kwargs).schema
         rng = (upper - lower) / float(SCIDB_RAND_MAX)
         fill_value = 'random()*{0}+{1}'.format(rng, lower)
-        return self.afl.build(schema, fill_value).eval(out=array)
+        return self.afl.build(schema, fill_value).eval(out=array)._mark_dense()
 
     def randint(self, shape, dtype='uint32', lower=0, upper=SCIDB_RAND_MAX,
                 persistent=False, **kwargs):
@@ -579,9 +803,9 @@ class SciDBInterface(object):
             between `lower` and `upper`.
         """
         array = self.new_array(persistent=persistent)
-        schema = SciDBDataShape(shape, dtype, **kwargs).schema
+        schema = self._datashape(shape, dtype, **kwargs).schema
         fill_value = 'random() % {0} + {1}'.format(upper - lower, lower)
-        return self.afl.build(schema, fill_value).eval(out=array)
+        return self.afl.build(schema, fill_value).eval(out=array)._mark_dense()
 
     def arange(self, start, stop=None, step=1, dtype=None, **kwargs):
         """arange([start,] stop[, step,], dtype=None, **kwargs)
@@ -642,7 +866,7 @@ class SciDBInterface(object):
         fill_value = '{0} + {1} * {2}'.format(start, step,
                                               arr.dim_names[0])
         self.afl.build(arr, fill_value).eval(out=arr)
-        return arr
+        return arr._mark_dense()
 
     def linspace(self, start, stop, num=50,
                  endpoint=True, retstep=False, **kwargs):
@@ -693,6 +917,7 @@ class SciDBInterface(object):
         arr = self.new_array(num, **kwargs)
         fill_value = '{0} + {1} * {2}'.format(start, step, arr.dim_names[0])
         self.afl.build(arr, fill_value).eval(out=arr)
+        arr._mark_dense()
 
         if retstep:
             return arr, step
@@ -722,81 +947,50 @@ class SciDBInterface(object):
             raise NotImplementedError("Identity matrices must have 1 attribute")
         dtype = as_list(dtype)[0]
 
-        query = self.afl.build('<x:%s>[i0=0:%i,1000,0,i1=0:%i,1000,0]' % (dtype, n - 1, n - 1),
+        chunk = plan_chunks((n, n), dtype)
+        query = self.afl.build('<x:%s>[i0=0:%i,%i,0,i1=0:%i,%i,0]' %
+                               (dtype, n - 1, chunk[0], n - 1, chunk[1]),
                                'iif(i0=i1,1,0)')
 
         if sparse:
             # redimension converts NULL to empty
+            chunk = plan_chunks((n, n), dtype, density=1. / max(n, 1))
             query = query.apply('i', 'iif(x=1, i0, NULL)', 'j', 'iif(x=1, i1, NULL)')
-            query = query.redimension('<x:%s>[i=0:%i,1000,0,j=0:%i,1000,0]' % (dtype, n - 1, n - 1))
+            query = query.redimension('<x:%s>[i=0:%i,%i,0,j=0:%i,%i,0]' %
+                                      (dtype, n - 1, chunk[0], n - 1, chunk[1]))
+        else:
+            query._mark_dense()
         return query.eval()
 
-    def dot(self, A, B):
+    def dot(self, A, B, method=None):
         """Compute the matrix product of A and B
 
         Parameters
         ----------
         A : SciDBArray
-            A must be a two-dimensional matrix of shape (n, p)
+            A must be a two-dimensional matrix of shape (n, p),
+            or a vector of length p
         B : SciDBArray
-            B must be a two-dimensional matrix of shape (p, m)
+            B must be a two-dimensional matrix of shape (p, m),
+            or a vector of length p
+        method : None, 'join', 'spgemm', or 'gemm' (optional)
+            How to compute the product. Matrix-vector and
+            vector-vector products default to a single join and
+            aggregate query; matrix-matrix products use spgemm if
+            either input is known to be sparse, and gemm otherwise.
+            See :func:`scidbpy.linalg.dot`.
 
         Returns
         -------
         C : SciDBArray
             The wrapper of the SciDB Array, of shape (n, m), consisting of the
-            matrix product of A and B
-        """
-
-        # TODO: make matrix-vector and vector-vector cases more efficient.
-        #       Currently they involve creating copies of the arrays, but this
-        #       is just a place-holder for a more efficient implementation.
-        if A.ndim not in (1, 2) or B.ndim not in (1, 2):
-            raise ValueError("dot requires 1 or 2-dimensional arrays")
-
-        A = boundify(A)
-        B = boundify(B)
-
-        # TODO: the following four transformations should be done by building
-        #       a single query rather than executing separate queries.
-        #       The following should be considered a place-holder for right
-        #       now.
-        if A.ndim == 1:
-            A = as_row_vector(A)
-
-        if B.ndim == 1:
-            B = as_column_vector(B)
-
-        A = zero_indexed(A)
-        B = zero_indexed(B)
-
-        A, B = match_dimensions(A, B, ((1, 0),))
-
-        if A.sdbtype.nullable[0]:
-            A = A.substitute(0)
-
-        if B.sdbtype.nullable[0]:
-            B = B.substitute(0)
-
-        # TODO: is there a more efficient way to do this than instantiating
-        #       an array of zeros?
-        # TODO: use spgemm() when the matrices are sparse
-        kwargs = {'dtype': 'double'}
-        if A.dim_names[0] != B.dim_names[1]:
-            kwargs['dim_names'] = [A.dim_names[0], B.dim_names[1]]
-        C = self.zeros((A.shape[0], B.shape[-1]), **kwargs)
-        C = gemm(A, B, C).eval()
-
-        if C.size == 1:
-            return C[0, 0]
-        if C.shape[0] == 1:
-            return C[0, :]
-        elif C.shape[1] == 1:
-            return C[:, 0]
-        else:
-            return C
+            matrix product of A and B. Vector-vector products return a scalar.
+        """
+        from .linalg import dot
+        return dot(A, B, method=method)
 
-    def svd(self, A, return_U=True, return_S=True, return_VT=True):
+    def svd(self, A, return_U=True, return_S=True, return_VT=True,
+            k=None, **kwargs):
         """Compute the Singular Value Decomposition of the array A:
 
         A = U.S.V^T
@@ -805,31 +999,83 @@ class SciDBInterface(object):
         ----------
         A : SciDBArray
             The array for which the SVD will be computed.  It should be a
-            2-dimensional array with a single value per cell.  Currently, the
-            svd routine requires non-overlapping chunks of size 32.
+            2-dimensional array with a single value per cell.  It is
+            rechunked (once) to the 32x32 chunks that gesvd requires.
         return_U, return_S, return_VT : boolean
             if any is True, then return the associated array.  All are True
             by default
+        k : int (optional)
+            If given, compute only the k leading singular values and
+            vectors, with a randomized algorithm suited to tall-skinny
+            matrices. Additional keyword arguments are passed to
+            :func:`scidbpy.linalg.svd`.
 
         Returns
         -------
         [U], [S], [VT] : SciDBArrays
             Arrays storing the singular values and vectors of A.
         """
-        if (A.ndim != 2):
-            raise ValueError("svd requires 2-dimensional arrays")
-        self.afl.load_library("'dense_linear_algebra'")
+        from .linalg import svd
+        return svd(A, return_U=return_U, return_S=return_S,
+                   return_VT=return_VT, k=k, **kwargs)
 
-        out_dict = dict(U=return_U, S=return_S, VT=return_VT)
+    def qr(self, A):
+        """Compute the QR decomposition of a tall-skinny matrix A = Q.R
 
-        # TODO: check that data type is double and chunk size is 32
-        ret = []
-        for output in ['U', 'S', 'VT']:
-            if out_dict[output]:
-                ret.append(gesvd(A, "'%s'" % output))
-        return tuple(ret)
+        See :func:`scidbpy.linalg.qr`
+        """
+        from .linalg import qr
+        return qr(A)
+
+    def cholesky(self, A):
+        """Compute the Cholesky decomposition A = L.L^T
+
+        See :func:`scidbpy.linalg.cholesky`
+        """
+        from .linalg import cholesky
+        return cholesky(A)
+
+    def solve(self, A, b):
+        """Solve the square linear system A.x = b
+
+        See :func:`scidbpy.linalg.solve`
+        """
+        from .linalg import solve
+        return solve(A, b)
+
+    def lstsq(self, A, b):
+        """Compute the least-squares solution to A.x = b
+
+        See :func:`scidbpy.linalg.lstsq`
+        """
+        from .linalg import lstsq
+        return lstsq(A, b)
 
-    def from_array(self, A, instance_id=0, chunk_size=1000, **kwargs):
+    def gram(self, X, Y=None, **kwargs):
+        """Compute the inner products between columns, X^T.Y
+
+        See :func:`scidbpy.linalg.gram`
+        """
+        from .linalg import gram
+        return gram(X, Y, **kwargs)
+
+    def cov(self, X, Y=None, **kwargs):
+        """Estimate the covariance between variables
+
+        See :func:`scidbpy.linalg.cov`
+        """
+        from .linalg import cov
+        return cov(X, Y, **kwargs)
+
+    def corrcoef(self, X, Y=None, **kwargs):
+        """Compute Pearson correlation coefficients between variables
+
+        See :func:`scidbpy.linalg.corrcoef`
+        """
+        from .linalg import corrcoef
+        return corrcoef(X, Y, **kwargs)
+
+    def from_array(self, A, instance_id=0, chunk_size=None, **kwargs):
         """Initialize a scidb array from a numpy array
 
         Parameters
@@ -840,7 +1086,9 @@ class SciDBInterface(object):
             the instance ID used in loading
             (default=0; see SciDB documentation)
         chunk_size : integer or list of integers
-            The chunk size of the uploaded SciDBArray. Default=1000
+            The chunk size of the uploaded SciDBArray. By default, it is
+            chosen from the array's shape and dtype by
+            :func:`~scidbpy.chunking.plan_chunks`.
         **kwargs :
             Additional keyword arguments are passed to new_array()
 
@@ -855,6 +1103,8 @@ class SciDBInterface(object):
         q = self.afl.quote
         A = np.asarray(A)
         instance_id = int(instance_id)
+        if chunk_size is None:
+            chunk_size = plan_chunks(A.shape, A.dtype)
 
         filename, session_id = self._upload_bytes(_to_bytes(A, chunk_size=chunk_size))
         filename = q(filename)
@@ -864,7 +1114,7 @@ class SciDBInterface(object):
                       q(arr.sdbtype.bytes_fmt)).eval(store=False)
         self._release_session(session_id)
 
-        return arr
+        return arr._mark_dense()
 
     def from_dataframe(self, A, instance_id=0, **kwargs):
         """Initialize a scidb array from a pandas dataframe
@@ -955,9 +1205,16 @@ class SciDBInterface(object):
         M['f0'] = A.data
         arr_flat = self.from_array(M)
 
+        if 'chunk_size' not in kwargs:
+            density = A.nnz / max(np.prod(A.shape), 1)
+            kwargs['chunk_size'] = plan_chunks(A.shape, A.dtype, density)
+
         # redimension the flat array to a sparse array
         arr = self.new_array(A.shape, A.dtype, **kwargs)
         self.afl.redimension_store(arr_flat, arr).eval(store=False)
+
+        # each nonzero is one non-empty cell
+        arr._cache[('nonempty', arr.name)] = A.nnz
         return arr
 
     def toarray(self, A, transfer_bytes=True):
@@ -972,6 +1229,10 @@ class SciDBInterface(object):
         """Convert a SciDB array to a pandas dataframe"""
         return A.todataframe(transfer_bytes=transfer_bytes)
 
+    def toarrow(self, A, **kwargs):
+        """Convert a SciDB array to a pyarrow Table"""
+        return A.toarrow(**kwargs)
+
     def _from_file(self, filename, **kwargs):
         # TODO: allow creation of arrays from uploaded files
         # TODO: allow creation of arrays from pre-existing files within the
@@ -1000,10 +1261,68 @@ class SciDBInterface(object):
     def _apply_func(self, A, func):
         # TODO: new value name could conflict.  How to generate a unique one?
         # TODO: add optional ``out`` argument as in numpy
+        if isinstance(A, Expression):
+            return _Call(func, [A])
+
         att = A.att(0)
         newatt = "{0}_{1}".format(func, att)
         expr = "{0}({1})".format(func, att)
-        return self.afl.papply(A, newatt, expr)
+        result = self.afl.papply(A, newatt, expr)
+        if A._stats().get('dense'):
+            result._mark_dense()
+        return result
+
+    def elementwise(self, *arrays):
+        """
+        Wrap arrays as fused elementwise expressions.
+
+        Arithmetic on the results is collected into a single expression,
+        which is computed with one join and one apply when compiled.
+
+        Parameters
+        ----------
+        *arrays : SciDBArrays
+            Single-attribute arrays with the same shape
+
+        Returns
+        -------
+        expressions : Expression, or tuple of Expressions
+
+        Examples
+        --------
+        >>> a, b, c, d = sdb.elementwise(A, B, C, D)
+        >>> result = ((a * b + c) / sdb.sqrt(d)).compile()
+
+        See Also
+        --------
+        evaluate()
+        """
+        return elementwise(*arrays)
+
+    def evaluate(self, expression, **arrays):
+        """
+        Compute an elementwise expression string in a single query.
+
+        Parameters
+        ----------
+        expression : str
+            A Python arithmetic expression, which can use
+            ``+ - * / % **``, comparisons, and SciDB scalar
+            functions like ``sqrt`` or ``iif``.
+        **arrays : SciDBArrays or numbers
+            The value of each name in the expression. Arrays must
+            have a single attribute and the same shape.
+
+        Returns
+        -------
+        result : SciDBArray
+            An unevaluated array: one join of the inputs, plus one apply
+
+        Examples
+        --------
+        >>> sdb.evaluate('(a * b + c) / d', a=A, b=B, c=C, d=D)
+        """
+        return evaluate(expression, **arrays)
 
     def sin(self, A):
         """Element-wise trigonometric sine"""
@@ -1062,42 +1381,42 @@ class SciDBInterface(object):
         Array or axis minimum.
 
         see :meth:`SciDBArray.min` """
-        return A.min(index, scidb_syntax)
+        return A.min(axis, scidb_syntax)
 
     def max(self, A, axis=None, scidb_syntax=False):
         """
         Array or axis maximum.
 
         see :meth:`SciDBArray.max` """
-        return A.max(index, scidb_syntax)
+        return A.max(axis, scidb_syntax)
 
     def sum(self, A, axis=None, scidb_syntax=False):
         """
         Array or axis sum.
 
         see :meth:`SciDBArray.sum` """
-        return A.sum(index, scidb_syntax)
+        return A.sum(axis, scidb_syntax)
 
     def var(self, A, axis=None, scidb_syntax=False):
         """
         Array or axis variance.
 
         see :meth:`SciDBArray.var` """
-        return A.var(index, scidb_syntax)
+        return A.var(axis, scidb_syntax)
 
-    def std(self, A, axis=None, scidb_syntax=False):
+    def stdev(self, A, axis=None, scidb_syntax=False):
         """
         Array or axis standard deviation.
 
         see :meth:`SciDBArray.stdev` """
-        return A.stdev(index, scidb_syntax)
+        return A.stdev(axis, scidb_syntax)
 
     def std(self, A, axis=None, scidb_syntax=False):
         """
         Array or axis standard deviation.
 
         see :meth:`SciDBArray.std` """
-        return A.std(index, scidb_syntax)
+        return A.std(axis, scidb_syntax)
 
     def average(self, A, axis=None, scidb_syntax=False):
         """
@@ -1107,21 +1426,21 @@ class SciDBInterface(object):
 
         TBD: support the weights parameter as in nump
         """
-        return A.avg(index, scidb_syntax)
+        return A.avg(axis, scidb_syntax)
 
     def mean(self, A, axis=None, scidb_syntax=False):
         """
         Array or axis mean.
 
         see :meth:`SciDBArray.mean` """
-        return A.mean(index, scidb_syntax)
+        return A.mean(axis, scidb_syntax)
 
     def count(self, A, axis=None, scidb_syntax=False):
         """
         Array or axis count.
 
         see :meth:`SciDBArray.count` """
-        return A.count(index, scidb_syntax)
+        return A.count(axis, scidb_syntax)
 
     def approxdc(self, A, axis=None, scidb_syntax=False):
         """
@@ -1133,7 +1452,21 @@ class SciDBInterface(object):
 
         """
 
-        return A.approxdc(index, scidb_syntax)
+        return A.approxdc(axis, scidb_syntax)
+
+    def agg(self, A, funcs, axis=None, scidb_syntax=False, atts=None):
+        """
+        Several array or axis aggregates, computed in one query.
+
+        see :meth:`SciDBArray.agg` """
+        return A.agg(funcs, axis, scidb_syntax, atts)
+
+    def describe(self, A, axis=None, scidb_syntax=False):
+        """
+        Array or axis count, mean, standard deviation, minimum and maximum.
+
+        see :meth:`SciDBArray.describe` """
+        return A.describe(axis, scidb_syntax)
 
     def substitute(self, A, value):
         """
@@ -1180,44 +1513,48 @@ class SciDBInterface(object):
         """Perform a join operation across arrays or values.
 
         See e.g. SciDBArray.__add__ for an example usage.
+
+        Operands are not evaluated, and their sparsity is decided
+        from the schema, cached statistics, or ``density_hint``
+        (see :meth:`_is_sparse`), so that the operation usually
+        builds a single query.
         """
+        if isinstance(left, Expression) or isinstance(right, Expression):
+            return _Call.from_afl(op, [left, right])
 
         f = self.afl
-        left, right = disambiguate(left, right)
+        new_left, new_right = disambiguate(left, right)
+
+        # renaming doesn't change which cells are non-empty
+        for old, new in ((left, new_left), (right, new_right)):
+            if isinstance(new, SciDBArray) and new is not old:
+                new._rename_stats(old._stats(), new.name)
+        left, right = new_left, new_right
 
         if isinstance(left, SciDBArray):
             assert_single_attribute(left)
-            left = left.eval()
             left_name = left.name
-            left_fmt = _af(left, 0)
+            left_fmt = left.att_names[0]
             left_is_sdb = True
-            left_is_sparse = left.issparse()
         else:
             left_name = None
             left_fmt = left
             left_is_sdb = False
-            left_is_sparse = False
 
         if isinstance(right, SciDBArray):
             assert_single_attribute(right)
-            right = right.eval()
             right_name = right.name
-            right_fmt = _af(right, 0)
+            right_fmt = right.att_names[0]
             right_is_sdb = True
-            right_is_sparse = right.issparse()
         else:
             right_name = None
             right_fmt = right
             right_is_sdb = False
-            right_is_sparse = False
 
         # some common names needed below
         _op = op
         op = op(left_fmt, right_fmt)
 
-        aL = aR = None
-        permutation = None
-
         # Neither entry is a SciDBArray
         if not (left_is_sdb or right_is_sdb):
             raise ValueError("One of left/right needs to be a SciDBArray")
@@ -1229,112 +1566,20 @@ class SciDBInterface(object):
                 attr = _new_attribute_label('x', left, right)
                 if left_name == right_name:
                     # same array: we can do this without a join
-                    return f.papply(left, attr, op)
+                    result = f.papply(left, attr, _op(left_fmt, left_fmt))
+                    if left._stats().get('dense'):
+                        result._mark_dense()
+                    return result
                 else:
-                    if left_is_sparse or right_is_sparse:
+                    if self._is_sparse(left) or self._is_sparse(right):
                         return arithmetic.sparse_join(left, right, _op)
                     result = join(left, right)
-                    return result.papply(attr, _op(result.att_names[0], result.att_names[1]))
+                    result = result.papply(attr, op)
+                    return result._mark_dense()
 
             # array shapes are broadcastable: use a cross_join
             elif broadcastable(left.shape, right.shape):
-                join_indices = []
-                left_slices = []
-                right_slices = []
-
-                # cross join requires matched chunks
-                left, right = match_chunks(left, right)
-                left_fmt = _af(left.eval(), 0)
-                right_fmt = _af(right.eval(), 0)
-                op = _op(left_fmt, right_fmt)
-
-                for tup in zip(reversed(list(enumerate(left.shape))),
-                               reversed(list(enumerate(right.shape)))):
-                    (i1, s1), (i2, s2) = tup
-                    if (s1 == s2):
-                        join_indices.append((i1, i2))
-                        if (left.chunk_size[i1] != right.chunk_size[i2] or
-                                left.chunk_overlap[i1] != right.chunk_overlap[i2]):
-                            raise ValueError("join operations require chunk_"
-                                             "size/chunk_overlap to match.")
-                    elif s1 == 1:
-                        left_slices.append(i1)
-                    elif s2 == 1:
-                        right_slices.append(i2)
-                    else:
-                        # should never get here, but just in case...
-                        raise ValueError("shapes cannot be broadcast")
-
-                # build the left slice query if needed
-                if left_slices:
-                    aL = ArrayAlias(left, "alias_left")
-                    dims = [item for sl in left_slices
-                            for item in [left.dim_names[sl], 0]]
-                    left_query = f.as_(f.slice(left, *dims), aL)
-                else:
-                    left_query = left
-                    aL = left
-
-                # build the right slice query if needed
-                if right_slices:
-                    aR = ArrayAlias(right, "alias_right")
-                    dims = [item for sl in right_slices
-                            for item in [right.dim_names[sl], 0]]
-                    right_query = f.as_(f.slice(right, *dims), aR)
-                else:
-                    right_query = right
-                    aR = right
-
-                # build the cross_join query
-                dims = [_df(arr, ind)
-                        for inds in join_indices
-                        for arr, ind in zip([aL, aR], inds)]
-
-                attr = _new_attribute_label('x', left, right)
-                query = f.papply(f.cross_join(
-                                 left_query, right_query, *dims),
-                                 attr, op)
-                result = query
-
-                # determine the dimension permutation
-                # Here's the problem: cross_join puts all the left array dims
-                # first, and the right array dims second.  This is different
-                # than numpy's broadcast behavior.  It's also difficult to do
-                # in a single operation because conflicting dimension names
-                # have a rename scheme that might be difficult to duplicate.
-                # So we compromise, and perform a dimension permutation on
-                # the result if needed.
-                left_shape = list(left.shape)
-                right_shape = list(right.shape)
-                i_left = 0
-                i_right = len(join_indices) + len(right_slices)
-                permutation = [-1] * max(left.ndim, right.ndim)
-
-                # first pad the shapes so they're the same length
-                if left.ndim > right.ndim:
-                    i_right += left.ndim - right.ndim
-                    right_shape = [-1] * (left.ndim - right.ndim) + right_shape
-                else:
-                    left_shape = [-1] * (right.ndim - left.ndim) + left_shape
-
-                # now loop through dimensions and build permutation
-                for i, (L, R) in enumerate(zip(left_shape, right_shape)):
-                    if L == R or R == -1 or (R == 1 and L >= 0):
-                        permutation[i] = i_left
-                        i_left += 1
-                    elif L == -1 or (L == 1 and R >= 0):
-                        permutation[i] = i_right
-                        i_right += 1
-                    else:
-                        # This should never happen, but just to be sure...
-                        raise ValueError("shapes are not compatible")
-
-                if permutation == range(len(permutation)):
-                    permutation = None
-
-                if permutation is not None:
-                    result = result.transpose(permutation)
-                return result
+                return self._broadcast_operation(left, right, _op)
 
             else:
                 raise ValueError("Array of shape {0} can not be "
@@ -1347,11 +1592,11 @@ class SciDBInterface(object):
                 float(right)
             except:
                 raise ValueError("rhs must be a scalar or SciDBArray")
-            if left_is_sparse:
+            if self._is_sparse(left):
                 return arithmetic.sparse_scalar_join(left, right, _op)
 
             attr = _new_attribute_label('x', left)
-            return f.papply(left, attr, op)
+            return f.papply(left, attr, op)._mark_dense()
 
         # only right entry is a SciDBArray
         elif right_is_sdb:
@@ -1359,16 +1604,119 @@ class SciDBInterface(object):
                 float(left)
             except:
                 raise ValueError("lhs must be a scalar or SciDBArray")
-            if right_is_sparse:
+            if self._is_sparse(right):
                 return arithmetic.scalar_sparse_join(left, right, _op)
 
             attr = _new_attribute_label('x', right)
-            return f.papply(right, attr, op)
+            return f.papply(right, attr, op)._mark_dense()
 
-        # reorder the dimensions if needed (for cross_join)
-        if permutation is not None:
-            arr = arr.transpose(permutation)
-        return arr
+    def _broadcast_operation(self, left, right, op):
+        """
+        Perform an arithmetic operation on arrays with different,
+        broadcastable shapes.
+
+        The arrays are cross-joined along their matching dimensions.
+        cross_join outputs the dimensions of its first input, followed by
+        the unmatched dimensions of its second input, so the operands are
+        ordered to produce NumPy's broadcast dimension order directly.
+        Only when neither order works is the result permuted, via a
+        (lazy) redimension.
+
+        Parameters
+        ----------
+        left, right : SciDBArray
+            Single-attribute arrays with no clashing names
+            (see :func:`~scidbpy.schema_utils.disambiguate`)
+        op : AFL infix operator (e.g., afl.add)
+
+        Returns
+        -------
+        result : SciDBArray
+        """
+        f = self.afl
+
+        # a dense operand with a single cell is a scalar:
+        # downloading it is cheaper than a cross_join
+        for scalar, other in [(left, right), (right, left)]:
+            if (scalar.size == 1 and scalar.ndim <= other.ndim and
+                    scalar.dtype.kind in 'iuf' and
+                    not scalar.sdbtype.nullable[0] and
+                    not self._is_sparse(scalar)):
+                value = scalar.toarray().ravel()[0].item()
+                if scalar is left:
+                    return self._join_operation(value, right, op)
+                return self._join_operation(left, value, op)
+
+        # assign each output axis to the operand(s) that provide it
+        nd = max(left.ndim, right.ndim)
+        lpad = nd - left.ndim
+        rpad = nd - right.ndim
+        owners = []
+        joins = []  # (left dim, right dim) pairs
+        left_slices = []
+        right_slices = []
+        for k in range(nd):
+            L = left.shape[k - lpad] if k >= lpad else None
+            R = right.shape[k - rpad] if k >= rpad else None
+            if L is None:
+                # only the right operand has this axis
+                owners.append('right')
+            elif L == R:
+                owners.append('both')
+                joins.append((k - lpad, k - rpad))
+            elif R is None or R == 1:
+                owners.append('left')
+                if R == 1:
+                    right_slices.append(k - rpad)
+            else:
+                owners.append('right')
+                if L == 1:
+                    left_slices.append(k - lpad)
+
+        def order(first, second):
+            # output axis of each cross_join(first, second) dimension
+            return ([k for k, o in enumerate(owners) if o in (first, 'both')] +
+                    [k for k, o in enumerate(owners) if o == second])
+
+        swap = order('left', 'right') != list(range(nd))
+        if swap and order('right', 'left') != list(range(nd)):
+            swap = False
+        axes = order(*(('right', 'left') if swap else ('left', 'right')))
+
+        # collect schema details before chunks are matched
+        left_names, right_names = left.dim_names, right.dim_names
+        left_low, right_low = left.datashape.dim_low, right.datashape.dim_low
+        expression = op(left.att_names[0], right.att_names[0])
+        attr = _new_attribute_label('x', left, right)
+        dense = left._stats().get('dense') and right._stats().get('dense')
+
+        right, left = match_chunk_permuted(right, left, joins)
+
+        # drop the size-1 dimensions that are broadcast
+        def drop(array, names, low, slices):
+            if not slices:
+                return array
+            args = [item for i in slices for item in (names[i], low[i])]
+            return f.slice(array, *args)
+
+        lq = drop(left, left_names, left_low, left_slices)
+        rq = drop(right, right_names, right_low, right_slices)
+
+        if swap:
+            lq, rq = rq, lq
+            dims = [item for i, j in joins
+                    for item in (right_names[j], left_names[i])]
+        else:
+            dims = [item for i, j in joins
+                    for item in (left_names[i], right_names[j])]
+
+        result = f.papply(f.cross_join(lq, rq, *dims), attr, expression)
+
+        if axes != list(range(nd)):
+            result = result.transpose([axes.index(k) for k in range(nd)])
+        if dense:
+            result._mark_dense()
+        return result
 
     def concatenate(self, arrays, axis=0):
         """
@@ -1516,7 +1864,7 @@ class SciDBInterface(object):
         """
         return self.concatenate(arrays, axis=2)
 
-    def percentile(self, a, q, att=None):
+    def percentile(self, a, q, att=None, error=None):
         """
         Compute the qth percentile of the data along the specified axis
 
@@ -1529,33 +1877,28 @@ class SciDBInterface(object):
         att : str, optional
            The array attribute to compute percentiles for. Defaults to the first
            attribute
+        error : float in the range (0, 1), optional
+           If given, compute approximate percentiles, whose rank in the data
+           is within this fraction of the number of values of the exact ones.
+           By default, the percentiles are exact.
 
         Returns
         -------
-        qs : SciDBArray
+        qs : ndarray
            An array with as many elements as q, listing the data value
            at each percentile
+
+        Notes
+        -----
+        This does not sort the data. See :func:`scidbpy.aggregation.quantile`
         """
-        att = att or a.att_names[0]
+        from .aggregation import quantile
 
         q = np.atleast_1d(q)
         if q.min() < 0 or q.max() > 100:
             raise ValueError("Percentiles must be in the range [0, 100]")
 
-        f = self.afl
-        sorted = f.sort(a.project(att))
-        sz = sorted.count()[0].astype(np.int)
-
-        # use linear interpolation
-        inds = (q * (sz - 1) / 100.)
-        lo = np.clip(inds.astype(np.int), 0, (sz - 1))
-        hi = np.clip(lo + 1, 0, (sz - 1))
-        lohi = np.hstack((lo, hi))
-        w = 1 - (inds - lo)
-        result = sorted._integer_index(lohi).toarray()
-
-        result = (result[:q.size] * w + result[q.size:] * (1 - w))
-        return result
+        return quantile(a, q / 100., att=att, error=error)
 
 
 class SciDBShimInterface(SciDBInterface):
@@ -1651,13 +1994,12 @@ class SciDBShimInterface(SciDBInterface):
         # log the query
         SciDBInterface._execute_query(self, query, response, n, fmt)
 
-        # parse compression
-        comp = kwargs.pop('compression', 'auto')
-        if comp == 'auto':
-            comp = self.default_compression
+        # parse compression. Without a size estimate, the adaptive
+        # policy assumes small (e.g. metadata) queries
+        comp = self._resolve_compression(kwargs.pop('compression', 'auto'),
+                                         kwargs.pop('nbytes', 0))
         if comp is not None:
             kwargs['compression'] = comp
-        compressed = comp is not None
 
         session_id = self._shim_new_session()
         if response:
@@ -1666,10 +2008,10 @@ class SciDBShimInterface(SciDBInterface):
 
             if fmt.startswith('(') and fmt.endswith(')'):
                 # binary format
-                result = self._shim_read_bytes(session_id, n, compressed)
+                result = self._shim_read_bytes(session_id, n, comp)
             else:
                 # text format
-                result = self._shim_read_lines(session_id, n, compressed)
+                result = self._shim_read_lines(session_id, n, comp)
             self._shim_release_session(session_id, ignore_invalid=True)
         else:
             self._shim_execute_query(session_id, query, release=True)
@@ -1756,18 +2098,30 @@ class SciDBShimInterface(SciDBInterface):
         url = self._shim_url('cancel', id=session_id)
         self._shim_urlopen(url)
 
-    def _shim_read_lines(self, session_id, n, compressed=False):
-        url = self._shim_url('read_lines', id=session_id, n=n)
+    def _shim_read(self, url, compression=None):
+        """
+        Download a (possibly compressed) payload, and record its throughput
+
+        Compressed payloads are unzipped once fully downloaded, since
+        streamed requests have been unreliable (see _shim_urlopen).
+        """
         t0 = time()
-        result = self._shim_urlopen(url)
-        text_result = result.read()
+        result = self._shim_urlopen(url).read()
+        nbytes = len(result)
+        if compression:
+            result = unzip(result)
+
         dt = time() - t0
-        pl = len(text_result) / 1048576
+        pl = nbytes / 1048576
         logging.getLogger(__name__).debug("Transfer time: %0.1f sec", dt)
         logging.getLogger(__name__).debug("Payload:       %0.2f MB", pl)
+        self._record_transfer(compression, len(result), dt)
 
-        if compressed:
-            text_result = unzip(text_result)
+        return result
+
+    def _shim_read_lines(self, session_id, n, compression=None):
+        url = self._shim_url('read_lines', id=session_id, n=n)
+        text_result = self._shim_read(url, compression)
 
         # the following check is for Py3K compatibility
         if not isinstance(text_result, string_type):
@@ -1775,20 +2129,9 @@ class SciDBShimInterface(SciDBInterface):
 
         return text_result
 
-    def _shim_read_bytes(self, session_id, n, compressed=False):
+    def _shim_read_bytes(self, session_id, n, compression=None):
         url = self._shim_url('read_bytes', id=session_id, n=n)
-        t0 = time()
-        bytes_result = self._shim_urlopen(url).read()
-
-        dt = time() - t0
-        pl = len(bytes_result) / 1048576
-        logging.getLogger(__name__).debug("Transfer time: %0.1f sec", dt)
-        logging.getLogger(__name__).debug("Payload:       %0.2f MB", pl)
-
-        if compressed:
-            bytes_result = unzip(bytes_result)
-
-        return bytes_result
+        return self._shim_read(url, compression)
 
     def _shim_upload_file(self, session_id, data):
         # TODO: can this be implemented in urllib to remove dependency?
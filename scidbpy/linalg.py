@@ -0,0 +1,853 @@
+"""
+Matrix products and decompositions.
+
+:func:`dot` plans how each product is computed:
+
+- ``'join'`` : a single query, cross-joining the inputs along the
+  inner dimension and summing the products with aggregate(). This is
+  used for matrix-vector, vector-matrix and vector-vector products.
+  It needs no temporary arrays and no rechunking to gemm's square chunks.
+- ``'spgemm'`` : SciDB's sparse matrix multiply, for matrix-matrix
+  products where either input is estimated to be sparse. Only
+  non-empty cells are visited, and the result is sparse.
+- ``'gemm'`` : SciDB's dense matrix multiply, for other matrix-matrix
+  products.
+
+:func:`svd` computes singular value decompositions with gesvd, or
+a randomized truncated decomposition built from matrix products.
+
+:func:`qr` and :func:`lstsq` factor tall-skinny matrices (many rows,
+at most a few thousand columns) without downloading them: every pass
+over the tall matrix is a gemm, and only p x p results are factored
+locally. :func:`cholesky` factors square matrices block by block, with
+gemm updates, and :func:`solve` uses the SVD from gesvd, so neither
+downloads the matrix.
+
+:func:`gram`, :func:`cov` and :func:`corrcoef` compute cross products
+between columns without transposing (copying) their input.
+"""
+
+# License: Simplified BSD, 2014
+# See LICENSE.txt for more information
+from __future__ import absolute_import, print_function, division, unicode_literals
+
+import numpy as np
+
+from .utils import _disambiguate, _is_query
+from .robust import gemm, spgemm, gesvd, merge
+from .chunking import plan_chunks
+from . import schema_utils as su
+
+__all__ = ['dot', 'plan_product', 'density', 'svd',
+           'qr', 'cholesky', 'solve', 'lstsq', 'gram', 'cov', 'corrcoef']
+
+METHODS = ('join', 'gemm', 'spgemm')
+
+# below this fraction of non-empty cells, inputs are treated as sparse
+SPARSE_DENSITY = 0.01
+
+# gram() and friends use a join (instead of gemm) for at most
+# this many pairs of variables
+JOIN_MAX_PAIRS = 100
+
+
+def density(array):
+    """
+    Estimate the fraction of non-empty cells in an array, without a query
+
+    Parameters
+    ----------
+    array : SciDBArray
+
+    Returns
+    -------
+    density : float or None
+        1 for arrays known to be dense, the cached non-empty count
+        divided by the size if one is known, and None otherwise.
+    """
+    stats = array._stats()
+    if stats.get('dense'):
+        return 1.0
+    if 'nonempty' not in stats or array.shape is None:
+        return None
+    return float(stats['nonempty']) / max(array.size, 1)
+
+
+def plan_product(A, B):
+    """
+    Choose how to compute the matrix product of A and B
+
+    Parameters
+    ----------
+    A, B : SciDBArray
+        1 or 2-dimensional arrays
+
+    Returns
+    -------
+    method : 'join', 'spgemm', or 'gemm'
+        'join' for products involving a vector (or a matrix with
+        a single row or column). 'spgemm' if either input's estimated
+        density (see :func:`density`) is below ``SPARSE_DENSITY``, or
+        if no density is known and the interface's ``density_hint``
+        is 'sparse'. Otherwise 'gemm'.
+    """
+    if A.ndim == 1 or B.ndim == 1:
+        return 'join'
+    if A.shape is not None and A.shape[0] == 1:
+        return 'join'
+    if B.shape is not None and B.shape[1] == 1:
+        return 'join'
+
+    densities = [d for d in (density(A), density(B)) if d is not None]
+    if densities and min(densities) < SPARSE_DENSITY:
+        return 'spgemm'
+    if not densities and A.interface.density_hint == 'sparse':
+        return 'spgemm'
+    return 'gemm'
+
+
+def _cross_join_axis(A, B, a_axis, b_axis):
+    # cross join A and B, matching cells by position (as gemm does)
+    # along one axis of each. Returns the joined array, the names of A's
+    # and B's first attributes in it, its remaining dimensions, their
+    # names in A and B, and all the labels used in the joined array
+    others = lambda X, axis: [d for i, d in enumerate(X.dim_names) if i != axis]
+    names = others(A, a_axis) + others(B, b_axis)
+
+    A = su.zero_indexed(su.boundify(A))
+    B = su.zero_indexed(su.boundify(B))
+    A, B = su.disambiguate(A, B)
+    lows_match = A.datashape.dim_low[a_axis] == B.datashape.dim_low[b_axis]
+    B, A = su.match_chunk_permuted(B, A, [(a_axis, b_axis)],
+                                   match_bounds=not lows_match)
+
+    joined = A.afl.cross_join(A, B, A.dim_names[a_axis], B.dim_names[b_axis])
+    groups = others(A, a_axis) + others(B, b_axis)
+    taken = list(A.dim_names) + list(B.dim_names) + \
+        list(A.att_names) + list(B.att_names)
+    return joined, A.att_names[0], B.att_names[0], groups, names, taken
+
+
+def _restore_names(result, groups, names):
+    # rename the dimensions of an aggregate result to their input
+    # names, if they don't collide
+    renames = [item for new, old in zip(groups, names) if new != old
+               for item in (new, old)]
+    if renames and len(set(names)) == len(names):
+        result = su.dimension_rename(result, *renames)
+    return result
+
+
+def _join_product(A, B, a_axis=-1, b_axis=0):
+    # sum of A[..., k] * B[k, ...] over k, in one query
+    a_axis = a_axis % A.ndim
+    joined, a, b, groups, names, taken = _cross_join_axis(A, B, a_axis, b_axis)
+
+    x = _disambiguate('x', taken)
+    joined = A.afl.papply(joined, x, '%s * %s' % (a, b))
+    result = A.afl.aggregate(joined, 'sum(%s)' % x, *groups)
+    if not groups:
+        return result.toarray()[0]
+
+    return _restore_names(result, groups, names)
+
+
+def _join_dot(A, B):
+    # the join product, with the same output dimensions as _as_result:
+    # single-row and single-column matrices are treated as vectors
+    if A.ndim == 2 and A.shape is not None and A.shape[0] == 1:
+        A = su.zero_indexed(A)[0, :]
+    if B.ndim == 2 and B.shape is not None and B.shape[1] == 1:
+        B = su.zero_indexed(B)[:, 0]
+    return _join_product(A, B)
+
+
+def _as_matrices(A, B):
+    # bounded, zero-indexed, non-nullable 2D versions of A and B
+    A = su.boundify(A)
+    B = su.boundify(B)
+
+    if A.ndim == 1:
+        A = su.as_row_vector(A)
+
+    if B.ndim == 1:
+        B = su.as_column_vector(B)
+
+    A = su.zero_indexed(A)
+    B = su.zero_indexed(B)
+
+    A, B = su.match_dimensions(A, B, ((1, 0),))
+
+    if A.sdbtype.nullable[0]:
+        A = A.substitute(0)
+
+    if B.sdbtype.nullable[0]:
+        B = B.substitute(0)
+
+    return A, B
+
+
+def _as_result(C):
+    # drop the dimensions added to vectors by _as_matrices
+    if C.size == 1:
+        return C[0, 0]
+    if C.shape[0] == 1:
+        return C[0, :]
+    elif C.shape[1] == 1:
+        return C[:, 0]
+    else:
+        return C
+
+
+def _gemm(A, B):
+    # the (evaluated, 2D) product of A and B, with gemm
+    interface = A.interface
+    A, B = _as_matrices(A, B)
+
+    kwargs = {'dtype': 'double'}
+    if A.dim_names[0] != B.dim_names[1]:
+        kwargs['dim_names'] = [A.dim_names[0], B.dim_names[1]]
+    C = interface.zeros((A.shape[0], B.shape[-1]), **kwargs)
+    return gemm(A, B, C).eval()
+
+
+def _gemm_product(A, B):
+    return _as_result(_gemm(A, B))
+
+
+def _spgemm_product(A, B):
+    vector = A.ndim == 1 or B.ndim == 1
+    A, B = _as_matrices(A, B)
+    C = spgemm(A, B)
+    return _as_result(C) if vector else C
+
+
+def dot(A, B, method=None):
+    """
+    Compute the matrix product of A and B
+
+    Parameters
+    ----------
+    A : SciDBArray
+        A one or two-dimensional array
+    B : SciDBArray
+        A one or two-dimensional array
+    method : None, 'join', 'spgemm', or 'gemm' (optional)
+        How to compute the product. By default,
+        :func:`plan_product` chooses.
+
+    Returns
+    -------
+    C : SciDBArray or scalar
+        The matrix product. Vector-vector products return a scalar.
+
+    Raises
+    ------
+    ValueError
+        If the inner dimensions of A and B have different lengths
+
+    Notes
+    -----
+    Cells are matched by position along the inner dimension, and the
+    output dimensions start at 0. Matrices with a single row (in A) or
+    column (in B) are treated like vectors, so the result has the same
+    shape for every method. The 'join' and 'spgemm' methods return
+    unevaluated arrays, where output cells with no non-empty products
+    are empty.
+    """
+    if A.ndim not in (1, 2) or B.ndim not in (1, 2):
+        raise ValueError("dot requires 1 or 2-dimensional arrays")
+
+    a_shape, b_shape = su.coerced_shape(A), su.coerced_shape(B)
+    if a_shape[-1] != b_shape[0]:
+        raise ValueError("shapes %s and %s not aligned: %i (dim %i) != %i (dim 0)"
+                         % (a_shape, b_shape, a_shape[-1], A.ndim - 1, b_shape[0]))
+
+    method = method or plan_product(A, B)
+    if method not in METHODS:
+        raise ValueError("method must be one of %s" % (METHODS,))
+
+    if method == 'join':
+        return _join_dot(A, B)
+    if method == 'spgemm':
+        return _spgemm_product(A, B)
+    return _gemm_product(A, B)
+
+
+def _prepare(A, operator):
+    # A, bounded and rechunked for an operator, and stored once so
+    # that repeated uses don't repeat the rechunk (or the query that
+    # produced A)
+    A = su.boundify(A)
+    ds = A.datashape.copy()
+    chunk_size = A.datashape.chunk_size
+    if operator == 'gesvd' or len(set(chunk_size)) != 1 or \
+            not 32 <= chunk_size[0] <= 1024:
+        ds.chunk_size = plan_chunks(A.shape, operator=operator)
+    ds.chunk_overlap = [0] * A.ndim
+
+    prepared = su.rechunk(A, chunk_size=ds.chunk_size,
+                          chunk_overlap=ds.chunk_overlap)
+    if not _is_query(prepared.name):
+        return prepared
+
+    out = A.interface.new_array(None, ds.sdbtype, temp=True,
+                                dim_names=ds.dim_names,
+                                chunk_size=ds.chunk_size,
+                                chunk_overlap=ds.chunk_overlap,
+                                dim_low=ds.dim_low, dim_high=ds.dim_high)
+    return prepared.eval(out=out)
+
+
+def _orthonormalize(Y):
+    # an orthonormal basis for the columns of a tall-skinny Y,
+    # from the eigendecomposition of its (small) Gram matrix.
+    # Repeated once, to recover the accuracy lost in squaring Y
+    for _ in range(2):
+        w, V = np.linalg.eigh(gram(Y).toarray())
+        keep = w > w.max() * 1e-12
+        W = np.ascontiguousarray(V[:, keep] / np.sqrt(w[keep]))
+        Y = _gemm(Y, Y.interface.from_array(W))
+    return Y
+
+
+def _randomized_svd(A, k, oversample, n_iter, seed):
+    interface = A.interface
+    A = _prepare(A, 'gemm')
+    n = A.shape[1]
+    l = min(k + oversample, n)
+
+    rng = np.random.RandomState(seed)
+    omega = interface.from_array(rng.standard_normal((n, l)))
+
+    # orthonormal basis Q for the range of A, sharpened by power iterations
+    Q = _orthonormalize(_gemm(A, omega))
+    for _ in range(n_iter):
+        Z = _gemm(Q.T, A)
+        Q = _orthonormalize(_gemm(A, Z.T))
+
+    # A ~= Q B, and B is small enough to decompose locally
+    B = _gemm(Q.T, A).toarray()
+    Ub, S, VT = np.linalg.svd(B, full_matrices=False)
+
+    U = _gemm(Q, interface.from_array(np.ascontiguousarray(Ub[:, :k])))
+    return U, interface.from_array(S[:k]), interface.from_array(VT[:k])
+
+
+def svd(A, return_U=True, return_S=True, return_VT=True, k=None,
+        oversample=10, n_iter=2, seed=None):
+    """
+    Compute the Singular Value Decomposition of A = U.S.V^T
+
+    Parameters
+    ----------
+    A : SciDBArray
+        A 2-dimensional array. The first attribute must be a double.
+    return_U, return_S, return_VT : boolean (optional)
+        Which factors to compute and return. All are True by default.
+    k : int (optional)
+        If given, compute only the k leading singular values and vectors,
+        with a randomized algorithm (see Notes). By default,
+        compute the full decomposition with SciDB's gesvd.
+    oversample : int (optional, default 10)
+        For the randomized algorithm, the number of extra
+        dimensions sampled beyond k
+    n_iter : int (optional, default 2)
+        For the randomized algorithm, the number of power iterations
+        used to sharpen the sample. More iterations are more accurate when
+        the singular values decay slowly.
+    seed : int (optional)
+        Seed for the randomized algorithm's random projection
+
+    Returns
+    -------
+    [U], [S], [VT] : SciDBArrays
+        The requested factors, in this order.
+
+    Notes
+    -----
+    The full decomposition rechunks A to gesvd's 32x32 chunks once,
+    storing the result in a TEMP array that is shared by the gesvd
+    query for each requested factor.
+
+    The randomized decomposition (Halko, Martinsson & Tropp, 2011)
+    multiplies A by ``k + oversample`` random vectors with gemm, finds an
+    orthonormal basis Q for the result, and decomposes the small matrix
+    ``Q.T A`` locally. It is much cheaper than gesvd for tall-skinny
+    matrices, where the number of columns is modest. U, S and VT are
+    evaluated arrays.
+    """
+    if A.ndim != 2:
+        raise ValueError("svd requires 2-dimensional arrays")
+
+    wanted = [return_U, return_S, return_VT]
+    if k is not None:
+        if k < 1:
+            raise ValueError("k must be positive")
+        factors = _randomized_svd(A, k, oversample, n_iter, seed)
+        return tuple(f for f, w in zip(factors, wanted) if w)
+
+    A = _prepare(A, 'gesvd')
+    return tuple(gesvd(A, "'%s'" % f).eval()
+                 for f, w in zip(['U', 'S', 'VT'], wanted) if w)
+
+
+def _check_square(A):
+    # the size of a square matrix
+    if A.ndim != 2:
+        raise ValueError("Expected a square, 2-dimensional matrix")
+    m, n = su.coerced_shape(A)
+    if m != n:
+        raise ValueError("Expected a square matrix, got shape %s" % ((m, n),))
+    return n
+
+
+def _place(X, row, col, n, chunk_size, names, att):
+    # X moved to start at (row, col) in an (otherwise empty) n x n
+    # matrix, with dimensions named like names and one attribute att
+    if X.att_names[0] != att:
+        X = X.afl.attribute_rename(X, X.att_names[0], att)
+    taken = list(X.dim_names) + list(X.att_names)
+    r, c = [_disambiguate(d, taken) for d in names]
+    i, j = X.dim_names
+    moved = X.afl.apply(X, r, '%s + %i' % (i, row), c, '%s + %i' % (j, col))
+    schema = '<%s:double>[%s=0:%i,%i,0,%s=0:%i,%i,0]' % (
+        att, r, n - 1, chunk_size, c, n - 1, chunk_size)
+    return moved.redimension(schema)
+
+
+def qr(A):
+    """
+    Compute the reduced QR decomposition of a tall-skinny matrix
+
+    Parameters
+    ----------
+    A : SciDBArray
+        A 2-dimensional array of shape (m, n), with m >= n.
+        The first attribute must be a double.
+
+    Returns
+    -------
+    Q : SciDBArray
+        A (m, n) matrix with orthonormal columns
+    R : SciDBArray
+        A (n, n) upper-triangular matrix, with ``A = Q.R``
+
+    Raises
+    ------
+    ValueError
+        If A has fewer rows than columns
+    numpy.linalg.LinAlgError
+        If A is rank deficient
+
+    Notes
+    -----
+    This uses the CholeskyQR2 algorithm: R is the Cholesky factor of
+    the Gram matrix ``A.T A`` (see :func:`gram`), and Q is ``A R^-1``,
+    repeated once on Q to restore orthogonality. Each repetition makes
+    two passes over the tall matrix, and factors an n x n matrix locally. A is rechunked
+    for gemm (once) if needed.
+    """
+    if A.ndim != 2:
+        raise ValueError("qr requires 2-dimensional arrays")
+    m, n = su.coerced_shape(A)
+    if m < n:
+        raise ValueError("qr requires a tall matrix (m >= n), got shape %s"
+                         % ((m, n),))
+
+    interface = A.interface
+    Q = _prepare(A, 'gemm')
+    R = np.identity(n)
+    for _ in range(2):
+        Ri = np.linalg.cholesky(gram(Q).toarray()).T
+        Q = _gemm(Q, interface.from_array(np.linalg.inv(Ri)))
+        R = np.dot(Ri, R)
+    return Q, interface.from_array(R)
+
+
+def cholesky(A):
+    """
+    Compute the Cholesky decomposition of a symmetric positive-definite matrix
+
+    Parameters
+    ----------
+    A : SciDBArray
+        A square, 2-dimensional array. The first attribute must be a double.
+
+    Returns
+    -------
+    L : SciDBArray
+        The lower-triangular factor, with ``A = L.L^T``
+
+    Raises
+    ------
+    ValueError
+        If A is not square
+    numpy.linalg.LinAlgError
+        If A is not positive definite
+
+    Notes
+    -----
+    This is a blocked, right-looking factorization, with gemm's square
+    chunks as blocks. Each diagonal block is downloaded and factored
+    locally; the panel below it and the update of the trailing matrix
+    are gemm products in the database. Only one block is ever held in
+    memory, and A is rechunked for gemm (once) if needed.
+    """
+    n = _check_square(A)
+    interface = A.interface
+    names = A.dim_names
+
+    S = _prepare(su.zero_indexed(A), 'gemm')
+    chunk_size = S.datashape.chunk_size[0]
+
+    L = interface.zeros((n, n), chunk_size=chunk_size)
+    att = L.att_names[0]
+    place = lambda X, row, col: _place(X, row, col, n, chunk_size, names, att)
+    k = 0
+    while k < n:
+        b = min(chunk_size, n - k)
+        Lkk = np.linalg.cholesky(S[:b, :b].toarray())
+        L = merge(place(interface.from_array(Lkk), k, k), L)
+
+        if k + b < n:
+            # the panel below the diagonal block, and the trailing update
+            Lkk_inv = interface.from_array(np.ascontiguousarray(np.linalg.inv(Lkk).T))
+            L21 = _gemm(S[b:, :b], Lkk_inv)
+            L = merge(place(L21, k + b, k), L)
+            S = gemm(L21 * -1, L21.T, S[b:, b:]).eval()
+
+        L = L.eval()
+        k += b
+
+    return _restore_names(L, L.dim_names, names)
+
+
+def solve(A, b):
+    """
+    Solve the linear system A.x = b
+
+    Parameters
+    ----------
+    A : SciDBArray
+        A square, 2-dimensional array of shape (n, n).
+        The first attribute must be a double.
+    b : SciDBArray
+        An array of shape (n,) or (n, k)
+
+    Returns
+    -------
+    x : SciDBArray
+        The solution, with the same shape as b
+
+    Raises
+    ------
+    ValueError
+        If A is not square, or b doesn't have n rows
+    numpy.linalg.LinAlgError
+        If A is singular
+
+    Notes
+    -----
+    This uses the SVD of A from SciDB's gesvd (see :func:`svd`):
+    ``x = V S^-1 U^T b``. Every product is a gemm in the database, and
+    only the n singular values are downloaded. For overdetermined (tall)
+    systems, use :func:`lstsq`.
+    """
+    n = _check_square(A)
+    if b.ndim not in (1, 2):
+        raise ValueError("b must be 1 or 2-dimensional")
+    if su.coerced_shape(b)[0] != n:
+        raise ValueError("b must have %i rows, got shape %s"
+                         % (n, su.coerced_shape(b)))
+
+    U, S, VT = svd(A)
+    s = S.toarray()
+    if s.min() <= s.max() * n * np.finfo(np.double).eps:
+        raise np.linalg.LinAlgError("Singular matrix")
+
+    c = _gemm(U.T, b)
+    c = c * A.interface.from_array((1. / s)[:, np.newaxis])
+    x = _gemm(VT.T, c)
+    return x[:, 0] if b.ndim == 1 else x
+
+
+def lstsq(A, b):
+    """
+    Compute the least-squares solution to A.x = b
+
+    Parameters
+    ----------
+    A : SciDBArray
+        A tall matrix of shape (m, n), with m >= n
+    b : SciDBArray
+        An array of shape (m,) or (m, k)
+
+    Returns
+    -------
+    x : SciDBArray
+        The solution of shape (n,) or (n, k), minimizing ``|b - A.x|``
+
+    Notes
+    -----
+    This uses :func:`qr`: ``x = R^-1 Q^T b``. Only n x n and n x k
+    results are downloaded, so A can be far too large to fit in memory.
+    Unlike numpy.linalg.lstsq, residuals, rank and singular values
+    are not returned, and A must have full column rank.
+    """
+    if b.ndim not in (1, 2):
+        raise ValueError("b must be 1 or 2-dimensional")
+
+    Q, R = qr(A)
+    c = _gemm(Q.T, b).toarray()
+    if b.ndim == 1:
+        c = c[:, 0]
+    x = np.linalg.solve(R.toarray(), c)
+    return A.interface.from_array(x)
+
+
+def _plan_gram(X, Y, axis):
+    # 'join' for few pairs of variables, or sparse inputs. Else 'gemm'
+    pairs = 1
+    for A in (X, Y):
+        n = A.shape[1 - axis] if A.shape is not None else None
+        pairs = None if n is None or pairs is None else pairs * n
+    if pairs is not None and pairs <= JOIN_MAX_PAIRS:
+        return 'join'
+    densities = [d for d in (density(X), density(Y)) if d is not None]
+    if densities and min(densities) < SPARSE_DENSITY:
+        return 'join'
+    return 'gemm'
+
+
+def _check_gram_args(X, Y, method):
+    if X.ndim != 2 or (Y is not None and Y.ndim != 2):
+        raise ValueError("Expected 2-dimensional arrays")
+    if method not in (None, 'join', 'gemm'):
+        raise ValueError("method must be None, 'join', or 'gemm'")
+    return X if Y is None else Y
+
+
+def gram(X, Y=None, method=None):
+    """
+    Compute the matrix of inner products between columns, X^T.Y
+
+    Parameters
+    ----------
+    X : SciDBArray
+        A 2-dimensional array of shape (m, p)
+    Y : SciDBArray (optional)
+        A 2-dimensional array of shape (m, q). Defaults to X.
+    method : None, 'join' or 'gemm' (optional)
+        'join' computes the result with a single cross_join and
+        aggregate query. 'gemm' uses gemm on the (lazily) transposed X.
+        By default, 'join' is used for at most ``JOIN_MAX_PAIRS``
+        pairs of columns, or sparse inputs.
+
+    Returns
+    -------
+    G : SciDBArray
+        The (p, q) matrix of column inner products.
+        Rows are matched by coordinate.
+    """
+    Y = _check_gram_args(X, Y, method)
+    method = method or _plan_gram(X, Y, 0)
+    if method == 'gemm':
+        return _gemm(X.T, Y)
+    return _join_product(X, Y, 0, 0)
+
+
+def _moments(X, Y, axis):
+    # one aggregate query, computing the sums needed for the
+    # covariance and correlation of each pair of variables. Sums and
+    # counts only include observations where both values are non-null
+    nullable = X.sdbtype.nullable[0] or Y.sdbtype.nullable[0]
+    joined, x, y, groups, dims, taken = _cross_join_axis(X, Y, axis, axis)
+    labels = {}
+    for k in ['x', 'y', 'xy', 'xx', 'yy']:
+        labels[k] = _disambiguate('_' + k, taken)
+        taken = taken + [labels[k]]
+
+    if nullable:
+        px = 'iif(%s is null, null, double(%s))' % (y, x)
+        py = 'iif(%s is null, null, double(%s))' % (x, y)
+    else:
+        px, py = 'double(%s)' % x, 'double(%s)' % y
+    joined = X.afl.apply(joined, labels['x'], px, labels['y'], py)
+
+    x, y = labels['x'], labels['y']
+    joined = X.afl.apply(joined, labels['xy'], '%s * %s' % (x, y),
+                         labels['xx'], '%s * %s' % (x, x),
+                         labels['yy'], '%s * %s' % (y, y))
+
+    sums = {'n': '%s_count' % x}
+    aggs = ['count(%s)' % x]
+    for k in ['x', 'y', 'xy', 'xx', 'yy']:
+        sums[k] = '%s_sum' % labels[k]
+        aggs.append('sum(%s)' % labels[k])
+    moments = X.afl.aggregate(joined, *(aggs + groups))
+
+    # double-precision expressions for each sum
+    terms = dict((k, 'double(%s)' % v) for k, v in sums.items())
+    return moments, terms, groups, dims
+
+
+def _column_sums(X, axis, squares=True):
+    # the sum (and sum of squares) of each variable, in one aggregate
+    taken = list(X.dim_names) + list(X.att_names)
+    v = _disambiguate('_v', taken)
+    q = X.afl.apply(X, v, 'double(%s)' % X.att_names[0])
+    labels = [v]
+    if squares:
+        vv = _disambiguate('_vv', taken + [v])
+        q = X.afl.apply(q, vv, '%s * %s' % (v, v))
+        labels.append(vv)
+
+    aggs = ['sum({0}) as {0}'.format(l) for l in labels]
+    sums = X.afl.aggregate(q, *(aggs + [X.dim_names[1 - axis]])).toarray()
+    return sums[v], sums[vv] if squares else None
+
+
+def _complete(X):
+    # whether X has no empty or null cells
+    if X.sdbtype.nullable[0]:
+        return False
+    return X.nonempty() == int(np.prod(su.coerced_shape(X)))
+
+
+def _values(X, expr):
+    # X's first attribute as a double, with nulls replaced by 0.
+    # expr formats the value, given the attribute
+    att = X.att_names[0]
+    label = _disambiguate('_v', list(X.dim_names) + list(X.att_names))
+    return X.afl.papply(X, label, ('iif({0} is null, 0.0, %s)' % expr).format(att))
+
+
+def _local_moments(X, Y, axis, squares=True):
+    # the same sums, from gemm, as arrays that broadcast to the (p, q)
+    # result. Complete inputs need only one aggregate per input for
+    # their sums; otherwise each sum only includes the observations
+    # where both variables are present, counted with indicator arrays.
+    # The sums of squares are only computed if needed (for correlations)
+    XT = lambda A: A.T if axis == 0 else A
+    YY = lambda A: A if axis == 0 else A.T
+    sxy = _gemm(XT(X), YY(Y)).toarray()
+    sxx = syy = None
+
+    if _complete(X) and (Y is X or _complete(Y)):
+        n = float(su.coerced_shape(X)[axis])
+        sx, sxx = _column_sums(X, axis, squares)
+        if Y is X:
+            sy, syy = sx, sxx
+        else:
+            sy, syy = _column_sums(Y, axis, squares)
+        sx, sy = sx[:, np.newaxis], sy[np.newaxis, :]
+        if squares:
+            sxx, syy = sxx[:, np.newaxis], syy[np.newaxis, :]
+        return n, sx, sy, sxx, syy, sxy
+
+    ix = _values(X, '1.0')
+    iy = ix if Y is X else _values(Y, '1.0')
+    n = _gemm(XT(ix), YY(iy)).toarray()
+    sx = _gemm(XT(_values(X, 'double({0})')), YY(iy)).toarray()
+    sy = sx.T if Y is X else _gemm(XT(ix), YY(_values(Y, 'double({0})'))).toarray()
+    if squares:
+        square = 'double({0}) * double({0})'
+        sxx = _gemm(XT(_values(X, square)), YY(iy)).toarray()
+        syy = sxx.T if Y is X else _gemm(XT(ix), YY(_values(Y, square))).toarray()
+    return n, sx, sy, sxx, syy, sxy
+
+
+def cov(X, Y=None, rowvar=True, ddof=1, method=None):
+    """
+    Estimate the covariance between variables
+
+    Parameters
+    ----------
+    X : SciDBArray
+        A 2-dimensional array of variables and observations
+    Y : SciDBArray (optional)
+        A second array of variables, with the same observations.
+        If given, the result is the cross-covariance between each
+        variable in X and each variable in Y (unlike numpy.cov, which
+        stacks X and Y).
+    rowvar : bool (optional, default True)
+        If True (as in numpy.cov), each row is a variable and each
+        column an observation. Otherwise, each column is a variable.
+    ddof : int (optional, default 1)
+        The result is normalized by ``N - ddof``
+    method : None, 'join', or 'gemm' (optional)
+        How to compute the cross products. See :func:`gram`.
+
+    Returns
+    -------
+    C : SciDBArray
+        The covariance matrix. With 'join', this is an unevaluated array.
+
+    Notes
+    -----
+    The covariance is computed in a single pass, as
+    ``(sum(x y) - sum(x) sum(y) / N) / (N - ddof)``. This doesn't need
+    the means (or a centered copy of X) first, but loses precision when
+    the means are much larger than the standard deviations. With
+    'gemm', the sums take one more aggregate query per distinct input.
+    """
+    Y = _check_gram_args(X, Y, method)
+    axis = 1 if rowvar else 0
+    method = method or _plan_gram(X, Y, axis)
+
+    if method == 'gemm':
+        n, sx, sy, _, _, sxy = _local_moments(X, Y, axis, squares=False)
+        result = (sxy - sx * sy / n) / (n - ddof)
+        return X.interface.from_array(result)
+
+    moments, t, groups, dims = _moments(X, Y, axis)
+    expr = '({xy} - {x} * {y} / {n}) / ({n} - {ddof})'.format(ddof=ddof, **t)
+    label = _disambiguate('cov', groups)
+    return _restore_names(X.afl.papply(moments, label, expr), groups, dims)
+
+
+def corrcoef(X, Y=None, rowvar=True, method=None):
+    """
+    Compute Pearson correlation coefficients between variables
+
+    Parameters
+    ----------
+    X : SciDBArray
+        A 2-dimensional array of variables and observations
+    Y : SciDBArray (optional)
+        A second array of variables, with the same observations.
+        If given, the result is the correlation between each
+        variable in X and each variable in Y.
+    rowvar : bool (optional, default True)
+        If True (as in numpy.corrcoef), each row is a variable and each
+        column an observation. Otherwise, each column is a variable.
+    method : None, 'join', or 'gemm' (optional)
+        How to compute the cross products. See :func:`gram`.
+
+    Returns
+    -------
+    R : SciDBArray
+        The correlation matrix. With 'join', this is an unevaluated array.
+
+    Notes
+    -----
+    The sums, cross products and sums of squares are all computed in
+    one pass, as in :func:`cov`. No centered copy of the data, or
+    separate passes for means and standard deviations, are needed.
+    """
+    Y = _check_gram_args(X, Y, method)
+    axis = 1 if rowvar else 0
+    method = method or _plan_gram(X, Y, axis)
+
+    if method == 'gemm':
+        n, sx, sy, sxx, syy, sxy = _local_moments(X, Y, axis)
+        num = n * sxy - sx * sy
+        den = np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+        return X.interface.from_array(num / den)
+
+    moments, t, groups, dims = _moments(X, Y, axis)
+    expr = ('({n} * {xy} - {x} * {y}) / '
+            'sqrt(({n} * {xx} - {x} * {x}) * ({n} * {yy} - {y} * {y}))').format(**t)
+    label = _disambiguate('corr', groups)
+    return _restore_names(X.afl.papply(moments, label, expr), groups, dims)
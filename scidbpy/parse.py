@@ -18,9 +18,11 @@ the old code will be deleted
 
 from collections import defaultdict
 from itertools import groupby, cycle, product
+from struct import unpack_from
 
 import numpy as np
 from .utils import as_list
+from ._py3k_compat import string_type
 
 # byte format for binary scidb data
 typemap = {'bool': np.dtype('<b1'),
@@ -75,6 +77,28 @@ mapping['datetimetz'] = np.dtype('<M8[s]')
 mapping['string'] = object
 
 
+def _arrow_typemap():
+    """
+    Arrow datatype that each sdb datatype should be converted to
+    """
+    import pyarrow as pa
+    return {'bool': pa.bool_(),
+            'int8': pa.int8(),
+            'uint8': pa.uint8(),
+            'int16': pa.int16(),
+            'uint16': pa.uint16(),
+            'int32': pa.int32(),
+            'uint32': pa.uint32(),
+            'int64': pa.int64(),
+            'uint64': pa.uint64(),
+            'float': pa.float32(),
+            'double': pa.float64(),
+            'char': pa.binary(1),
+            'datetime': pa.timestamp('s'),
+            'datetimetz': pa.timestamp('s'),
+            'string': pa.large_string()}
+
+
 def _scidb_serialize(arr, chunk_size):
     """
     Serialize a multidimensional numpy array into a 1D array,
@@ -99,9 +123,9 @@ def _fmt(array):
     return array.sdbtype.bytes_fmt
 
 
-def _iter_strings(contents, nullable):
+def _string_cells(contents, nullable):
     """
-    Iterate over the strings in an all-string sciDB array
+    Locate each string in the output of an all-string SciDB array
 
     Parameters
     ----------
@@ -113,8 +137,9 @@ def _iter_strings(contents, nullable):
 
     Yields
     ------
-    A sequence of strings or None (for masked entries)
-    Iterates over attributes in a cell, then over cells
+    (valid, start, length) for each entry: whether it is non-null,
+    and the byte offset and length (excluding the null terminator)
+    of its string. Iterates over attributes in a cell, then over cells
 
     Notes
     -----
@@ -125,17 +150,152 @@ def _iter_strings(contents, nullable):
     nulls = cycle(nullable)
     while offset < len(contents):
         if next(nulls):
-            masked = contents[offset] != b'\xff'[0]
+            valid = contents[offset: offset + 1] == b'\xff'
             offset += 1
         else:
-            masked = False
+            valid = True
 
-        sz = np.fromstring(contents[offset: offset + 4], '<i')
+        sz = unpack_from('<i', contents, offset)[0]
         offset += 4
-        yield None if masked else contents[offset: offset + sz - 1].decode('utf-8')
+        yield valid, offset, sz - 1
         offset += sz  # skip null terminated string
 
 
+def _string_fields(contents, nullable):
+    """
+    Locate each string in the output of an all-string SciDB array,
+    without looping over cells in Python
+
+    Parameters
+    ----------
+    contents : str
+       The binary output of an all-string array
+
+    nullable : list of booleans
+       Whether each attribute in the array is nullable
+
+    Returns
+    -------
+    valid, starts, lengths : ndarrays
+       The entries that :func:`_string_cells` yields, one per string
+
+    Notes
+    -----
+    Each string starts after the end of the previous one, so the strings
+    can't be located independently. Instead, every byte offset that could
+    hold the size of a string (one that fits in the output, and ends with
+    a null terminator) is linked to the size at the start of the next cell.
+    Offsets that aren't sizes rarely pass the test, and those that do
+    nearly always lead to a dead end within a few cells. Once they are
+    dropped, the chain starting at the first cell is usually all that's
+    left. Otherwise, it is unrolled by pointer doubling, in log2(#cells)
+    vectorized passes.
+    """
+    raw = np.frombuffer(contents, dtype=np.uint8)
+    natt = len(nullable)
+    header = [int(n) for n in nullable]
+    if raw.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty.astype(bool), empty, empty
+
+    # the (unaligned) little-endian int32 at every byte offset
+    sizes = np.ndarray((max(raw.size - 3, 0),), dtype='<i4',
+                       buffer=contents, strides=(1,))
+
+    # offsets holding a plausible size. Sizes read inside
+    # strings are rarely small and non-negative
+    fits = np.flatnonzero((sizes >= 0) & (sizes <= raw.size))
+    sz = sizes[fits]
+    ends = fits + 4 + sz
+    ok = ends <= raw.size
+    ok &= (sz == 0) | (raw[np.minimum(ends, raw.size) - 1] == 0)
+    fits, ends, sz = fits[ok], ends[ok], sz[ok]
+
+    done, bad = fits.size, fits.size + 1
+    index = np.full(raw.size + 2, bad, dtype=np.intp)
+    index[fits] = np.arange(fits.size)
+
+    def step(node, att):
+        # the size following the string of attribute att at node
+        live = node < done
+        out = node.copy()
+        end = ends[node[live]]
+        out[live] = index[end + header[(att + 1) % natt]]
+        if att == natt - 1:
+            out[live] = np.where(end == raw.size, done, out[live])
+        return out
+
+    jump = np.arange(fits.size)
+    for att in range(natt):
+        jump = step(jump, att)
+    jump = np.append(jump, [done, bad])
+
+    start = index[header[0]] if raw.size >= header[0] + 4 else bad
+    if start == bad:
+        raise ValueError("Malformed string output")
+
+    # candidates that aren't sizes reach a dead end within a few
+    # cells, nearly always. Drop them, and the chain is usually all
+    # that's left, in order of offset
+    reach = jump
+    for _ in range(4):
+        reach = jump[reach]
+    keep = np.flatnonzero(reach[:done] != bad)
+    end, lost = keep.size, keep.size + 1
+    renumber = np.full(done + 2, lost, dtype=np.intp)
+    renumber[keep] = np.arange(keep.size)
+    renumber[done] = end
+    jump = np.append(renumber[jump[keep]], [end, lost])
+    first = renumber[start]
+
+    chain = np.arange(keep.size)
+    if first != 0 or (jump[:end] != chain + 1).any():
+        chain = np.array([first])
+        while chain[-1] < end:
+            chain = np.concatenate([chain, jump[chain]])
+            jump = jump[jump]
+        last = np.argmax(chain >= end)
+        if chain[last] == lost:
+            raise ValueError("Malformed string output")
+        chain = chain[:last]
+
+    # the strings of each cell, in order
+    nodes = [keep[chain]]
+    for att in range(natt - 1):
+        nodes.append(step(nodes[-1], att))
+    nodes = np.column_stack(nodes).ravel()
+    if (nodes >= done).any():
+        raise ValueError("Malformed string output")
+
+    pos = fits[nodes]
+    valid = np.ones(pos.size, dtype=bool)
+    for att in range(natt):
+        if header[att]:
+            valid[att::natt] = raw[pos[att::natt] - 1] == 0xff
+    return valid, pos + 4, sz[nodes].astype(np.int64) - 1
+
+
+def _iter_strings(contents, nullable):
+    """
+    Iterate over the strings in an all-string sciDB array
+
+    Parameters
+    ----------
+    contents : str
+       The binary output of an all-string array
+
+    nullable : list of booleans
+       Whether each attribute in the array is nullable
+
+    Yields
+    ------
+    A sequence of strings or None (for masked entries)
+    Iterates over attributes in a cell, then over cells
+    """
+    for valid, start, length in _string_cells(contents, nullable):
+        yield contents[start: start + length].decode('utf-8') if valid else None
+
+
 def _string_attribute_dict(array, **kwargs):
     """
     Convert an all-string SciDB array into an attribute dict of numpy arrays
@@ -159,6 +319,100 @@ def _string_attribute_dict(array, **kwargs):
                 for i, att in enumerate(array.att_names))
 
 
+def _string_arrow_dict(array, **kwargs):
+    """
+    Convert an all-string SciDB array into an attribute dict of Arrow arrays
+
+    The string payloads are gathered directly into Arrow offset
+    and data buffers, without creating intermediate Python strings.
+
+    Parameters
+    -----------
+    array : SciDBArray
+        An array with 1 or more string attributes
+
+    Returns
+    -------
+    dict : att name -> pyarrow.LargeStringArray
+    """
+    import pyarrow as pa
+
+    contents = array.interface._scan_array(array.name, fmt=_fmt(array), **kwargs)
+    nullable = [nullable for nm, typ, nullable in array.sdbtype.full_rep]
+    valid, starts, lengths = _string_fields(contents, nullable)
+    raw = np.frombuffer(contents, dtype=np.uint8)
+
+    natt = len(array.att_names)
+    result = {}
+    for i, att in enumerate(array.att_names):
+        ok = valid[i::natt]
+        lens = np.where(ok, lengths[i::natt], 0)
+        sz = lens.size
+
+        offsets = np.zeros(sz + 1, dtype=np.int64)
+        np.cumsum(lens, out=offsets[1:])
+
+        # byte positions of every character, in output order
+        pos = np.repeat(starts[i::natt] - offsets[:-1], lens)
+        pos += np.arange(offsets[-1], dtype=np.int64)
+        data = raw[pos]
+
+        null_count = int(sz - ok.sum())
+        bitmap = None
+        if null_count:
+            bitmap = pa.py_buffer(np.packbits(ok, bitorder='little'))
+
+        result[att] = pa.LargeStringArray.from_buffers(sz, pa.py_buffer(offsets),
+                                                       pa.py_buffer(data),
+                                                       bitmap, null_count)
+    return result
+
+
+def _nonstring_arrow_dict(array, **kwargs):
+    """
+    Convert a non-string SciDB array into an attribute dict of Arrow arrays
+
+    Validity bitmaps are built from the SciDB null byte of
+    each nullable attribute.
+
+    Parameters
+    -----------
+    array : SciDBArray
+       An array with 1 or more non-string attributes
+
+    compression : None, 1-9, or 'auto'
+       Whether to use compression in the transfer
+
+    Returns
+    -------
+    dict : att name -> pyarrow.Array
+    """
+    import pyarrow as pa
+
+    contents = array.interface._scan_array(array.name, fmt=_fmt(array), **kwargs)
+    dtype = [(str(nm), null_typemap[t, nullable])
+             for nm, t, nullable in array.sdbtype.full_rep]
+    data = np.frombuffer(contents, dtype=dtype)
+    types = _arrow_typemap()
+
+    result = {}
+    for nm, typ, nullable in array.sdbtype.full_rep:
+        att = data[nm]
+        mask = None
+
+        if nullable:
+            mask = att['mask'] != 255
+            att = att['data']
+
+        if typ == 'datetimetz':
+            att = att['time'] - att['tz']
+
+        result[nm] = pa.array(np.ascontiguousarray(att), type=types[typ],
+                              mask=mask)
+
+    return result
+
+
 def _nonstring_attribute_dict(array, **kwargs):
     """
     Convert a non-string SciDB array into an attribute dict of numpy arrays
@@ -198,9 +452,43 @@ def _nonstring_attribute_dict(array, **kwargs):
     return result
 
 
-def _attribute_dict(array, compression):
+def _estimate_nbytes(array, full_rep):
+    """
+    Estimate the size of an array's binary payload, without querying
+    the database.
+
+    Uses the cached cell count if available, and otherwise the
+    (bounded) shape of an already-known schema. full_rep gives the
+    attributes to download, which need not be array's own (e.g., the
+    attributes of array.unpack()). Returns None if no estimate is
+    possible.
+    """
+    ncell = array._cache.get(('nonempty', array.name))
+    if ncell is None and array._datashape is not None:
+        shape = array._datashape.shape
+        if shape is not None:
+            ncell = np.prod(shape, dtype=np.int64)
+    if ncell is None:
+        return None
+
+    width = 0
+    for nm, typ, nullable in full_rep:
+        if typ == 'string':
+            width += 4 + 16  # length prefix + a typical string
+        else:
+            width += typemap[typ].itemsize
+        width += nullable
+    return int(ncell) * width
+
+
+def _attribute_dict(array, compression, arrow=False, source=None):
     """
     Download+parse an array into a dict of numpy array attributes
+
+    If arrow=True, the attributes are decoded into pyarrow Arrays instead.
+    If array is the unpack()ed version of another array, pass that as
+    source: its cell count and shape are used to estimate the payload
+    size for adaptive compression, since the unpacked query has neither.
     """
 
     # for speed, evaluate a query if it contains strings and nonstrings
@@ -213,6 +501,10 @@ def _attribute_dict(array, compression):
 
     atts = {}
     for isstring, dt in groupby(array.sdbtype.full_rep, lambda r: r[1] == 'string'):
+        dt = list(dt)
+        nbytes = _estimate_nbytes(array if source is None else source, dt)
+        comp = array.interface._resolve_compression(compression, nbytes)
+
         # project if a subset of attributes
         subatts = [nm for (nm, _, _) in dt]
         if len(subatts) < array.natt:
@@ -221,9 +513,10 @@ def _attribute_dict(array, compression):
             subarray = array
 
         if isstring:
-            a = _string_attribute_dict(subarray, compression=compression)
+            parser = _string_arrow_dict if arrow else _string_attribute_dict
         else:
-            a = _nonstring_attribute_dict(subarray, compression=compression)
+            parser = _nonstring_arrow_dict if arrow else _nonstring_attribute_dict
+        a = parser(subarray, compression=comp)
         atts.update(**a)
 
     return atts
@@ -283,7 +576,7 @@ def toarray_sparse(array, compression='auto'):
     """
 
     unpacked = array.unpack()
-    atts = _attribute_dict(unpacked, compression)
+    atts = _attribute_dict(unpacked, compression, source=array)
 
     # shift nonzero origins
     inds = tuple(atts[d] - lo for
@@ -327,7 +620,7 @@ def tosparse_scipy(array, sparse_fmt, compression='auto'):
 
     shp = coerced_shape(array)
     unpacked = array.unpack()
-    atts = _attribute_dict(unpacked, compression)
+    atts = _attribute_dict(unpacked, compression, source=array)
 
     # shift nonzero origins
     inds = tuple(atts[d] - lo for
@@ -346,7 +639,104 @@ def tosparse_recarray(array, compression='auto'):
     return toarray_dense(unpacked, compression)
 
 
-def toarray(array, compression='auto', method='sparse'):
+def toarrow(array, compression='auto'):
+    """
+    Convert a SciDBArray to a pyarrow Table.
+
+    The table has one column for each dimension, followed
+    by one column for each attribute, with a row for each
+    nonempty cell. Null values are preserved as Arrow nulls.
+    """
+    import pyarrow as pa
+
+    unpacked = array.unpack()
+    atts = _attribute_dict(unpacked, compression, arrow=True, source=array)
+
+    names = list(array.dim_names) + list(array.att_names)
+    return pa.Table.from_arrays([atts[nm] for nm in names], names=names)
+
+
+def _result_dtype(array):
+    """
+    The numpy dtype that toarray() produces for an array
+    """
+    dtype = [(str(nm), NULL_PROMOTION[typ] if nullable else mapping[typ])
+             for nm, typ, nullable in array.sdbtype.full_rep]
+    if len(dtype) == 1:
+        return np.dtype(dtype[0][1])
+    return np.dtype(dtype)
+
+
+def _open_output(out, shape, dtype):
+    """
+    Prepare the destination of a download
+
+    Parameters
+    ----------
+    out : str or ndarray
+        A path to a new memory-mapped file, or a pre-allocated array
+        (e.g. a numpy.memmap). Paths ending in '.npy' are written in
+        NumPy's .npy format, and can be re-opened with
+        ``np.load(path, mmap_mode='r')``. Other paths are written as
+        raw C-ordered binary data.
+    shape : tuple of ints
+        The shape of the download
+    dtype : numpy dtype
+        The datatype of the download
+
+    Returns
+    -------
+    out : ndarray
+    """
+    if dtype.hasobject:
+        raise ValueError("Arrays with string attributes cannot be "
+                         "downloaded into a memory-mapped output")
+
+    if isinstance(out, string_type):
+        if out.endswith('.npy'):
+            return np.lib.format.open_memmap(out, mode='w+',
+                                             dtype=dtype, shape=shape)
+        return np.memmap(out, dtype=dtype, mode='w+', shape=shape)
+
+    if tuple(out.shape) != tuple(shape):
+        raise ValueError("Output has wrong shape: %s vs %s" % (out.shape, shape))
+    if out.dtype != dtype:
+        raise ValueError("Output has wrong dtype: %s vs %s" % (out.dtype, dtype))
+    return out
+
+
+def _toarray_blocked(array, out, func, compression='auto'):
+    """
+    Download an array into a pre-allocated output, one
+    row of chunks at a time.
+
+    Only a single slab of chunks (along the first dimension)
+    is held in memory at once, so the output can be larger than RAM
+    when it is memory-mapped.
+    """
+    from .schema_utils import coerced_shape
+
+    array = array.eval()  # don't re-run a query for each slab
+    shp = coerced_shape(array)
+    out = _open_output(out, shp, _result_dtype(array))
+
+    lo = list(array.datashape.dim_low)
+    hi = [l + s - 1 for l, s in zip(lo, shp)]
+    step = array.datashape.chunk_size[0]
+
+    for start in range(0, shp[0], step):
+        stop = min(start + step, shp[0])
+        limits = ([lo[0] + start] + lo[1:] +
+                  [lo[0] + stop - 1] + hi[1:])
+        slab = array.afl.subarray(array, *limits)
+        out[start:stop] = func(slab, compression=compression)
+
+    if hasattr(out, 'flush'):
+        out.flush()
+    return out
+
+
+def toarray(array, compression='auto', method='sparse', out=None):
     dispatch = dict(sparse=toarray_sparse, dense=toarray_dense)
     try:
         func = dispatch[method]
@@ -354,6 +744,8 @@ def toarray(array, compression='auto', method='sparse'):
         valid_keys = ','.join(sorted(dispatch.keys()))
         raise ValueError("method must be one of %s: %s" %
                          (valid_keys, method))
+    if out is not None:
+        return _toarray_blocked(array, out, func, compression=compression)
     return func(array, compression=compression)
 
 
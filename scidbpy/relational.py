@@ -20,6 +20,7 @@ def _prepare_categories(left, right, left_on, right_on):
     Returns new versions of inputs
     """
     f = left.afl
+    source = left
 
     new_left = list(left_on)
     new_right = list(right_on)
@@ -30,7 +31,9 @@ def _prepare_categories(left, right, left_on, right_on):
 
         # XXX handle case where only one is attribute
 
-        cats = f.sort(left[l]).uniq().eval()
+        # cached, so repeated merges on the same keys skip the sort
+        cats = source.interface.category_cache.get(
+            source, [l], lambda: f.sort(source[l]).uniq().eval())
         l_cat = _new_attribute_label('%s_cat' % l, left)
         r_cat = _new_attribute_label('%s_cat' % r, right)
 
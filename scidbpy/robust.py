@@ -12,11 +12,12 @@ start index. The merge() function performs this preprocessing as needed.
 # See LICENSE.txt for more information
 from __future__ import absolute_import, print_function, division, unicode_literals
 
-__all__ = ['join', 'merge', 'gemm', 'cumulate',
+__all__ = ['join', 'merge', 'gemm', 'spgemm', 'cumulate',
            'reshape', 'gesvd', 'thin', 'cross_join', 'uniq']
 
 from .utils import _new_attribute_label, interleave, new_alias_label
 from . import schema_utils as su
+from .chunking import plan_chunks
 
 
 def merge(a, b):
@@ -37,6 +38,7 @@ def merge(a, b):
     * Broadcast A and B to equal shapes
     * Match attribute names, if unambiguous
     * Align array origins
+    * Match chunk sizes and overlaps, redimensioning the smaller input
 
     Returns
     -------
@@ -71,7 +73,7 @@ def join(a, b):
 
     * Broadcast A and B to equal shapes
     * Align array origins
-    * Match chunk sizes and overlaps
+    * Match chunk sizes and overlaps, redimensioning the smaller input
 
     Returns
     -------
@@ -125,7 +127,10 @@ def gemm(a, b, c):
         if x.sdbtype.full_rep[0][1] != 'double':
             raise TypeError("Matrix multiply requires a type double for first attribute.")
 
-    chunk_size = min(max(a.datashape.chunk_size[0], 32), 1024)
+    # keep a's chunk size if gemm accepts it
+    chunk_size = a.datashape.chunk_size[0]
+    if not 32 <= chunk_size <= 1024:
+        chunk_size = plan_chunks(a.shape, operator='gemm')[0]
     a = su.rechunk(a, chunk_size=chunk_size, chunk_overlap=0)
     b = su.rechunk(b, chunk_size=chunk_size, chunk_overlap=0)
     c = su.rechunk(c, chunk_size=chunk_size, chunk_overlap=0)
@@ -135,6 +140,54 @@ def gemm(a, b, c):
     return a.afl.gemm(a, b, c)
 
 
+def spgemm(a, b):
+    """
+    Robust AFL spgemm operation
+
+    Computes the sparse matrix product a * b
+
+    Redimensions inputs if necessary
+
+    Parameters
+    ----------
+    a : SciDBArray
+        First array
+    b : SciDBArray
+        Second array
+
+    Returns
+    -------
+    result : SciDBArray
+        a * b
+
+    Notes
+    -----
+    Unlike gemm, spgemm only visits non-empty cells, and its
+    output is sparse. Both inputs are given the same square chunks,
+    planned from their shape and density, unless they already share them.
+    The ``linear_algebra`` plugin, which provides spgemm, is loaded
+    if needed.
+    """
+    for x in [a, b]:
+        if x.sdbtype.full_rep[0][1] != 'double':
+            raise TypeError("Matrix multiply requires a type double for first attribute.")
+
+    a = su.boundify(a)
+    b = su.boundify(b)
+
+    chunks = set(a.datashape.chunk_size) | set(b.datashape.chunk_size)
+    if len(chunks) == 1:
+        chunk_size = chunks.pop()
+    else:
+        density = [float(su.estimate_cells(x)) / max(x.size, 1) for x in [a, b]]
+        chunk_size = min(min(plan_chunks(x.shape, x.sdbtype, d))
+                         for x, d in zip([a, b], density))
+    a = su.rechunk(a, chunk_size=chunk_size, chunk_overlap=0)
+    b = su.rechunk(b, chunk_size=chunk_size, chunk_overlap=0)
+    a.interface._load_library('linear_algebra')
+    return a.afl.spgemm(a, b)
+
+
 def gesvd(array, *args):
     """
     Robust AFL svd call
@@ -148,7 +201,9 @@ def gesvd(array, *args):
     -----
     Rechunks array if needed by AFL
     """
-    array = su.rechunk(array, chunk_size=32, chunk_overlap=0)
+    chunk_size = plan_chunks(array.shape, operator='gesvd')[0]
+    array = su.rechunk(array, chunk_size=chunk_size, chunk_overlap=0)
+    array.interface._load_library('dense_linear_algebra')
     return array.afl.gesvd(array, *args)
 
 
@@ -225,7 +280,8 @@ def cross_join(a, b, *dims):
 
     Notes
     -----
-    Arrays will be rechunked as needed for the cross join to run
+    Arrays will be rechunked as needed for the cross join to run.
+    The smaller array is the one redimensioned.
     """
 
     adims = dims[::2]
@@ -2,9 +2,21 @@
 # See LICENSE.txt for more information
 from __future__ import absolute_import, print_function, division, unicode_literals
 
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import reduce
+
 import numpy as np
 
 from .utils import _new_attribute_label, new_alias_label
+from .chunking import plan_chunks
+
+# Which array kept its chunking when inputs were matched, and which were
+# redimensioned to conform to it. See trace_redimensions()
+Redimension = namedtuple('Redimension', ['operation', 'kept', 'moved', 'cells'])
+
+_traces = []
 
 
 def assert_single_attribute(array):
@@ -145,6 +157,92 @@ def match_attribute_names(*arrays):
     return tuple(result)
 
 
+def estimate_cells(array):
+    """
+    Estimate the number of non-empty cells in an array, without a query
+
+    Parameters
+    ----------
+    array : SciDBArray
+
+    Returns
+    -------
+    cells : int or None
+        The cached non-empty count if one is known (see
+        :meth:`SciDBArray.nonempty`), otherwise the number of cells in the
+        array's bounds. None if the array is unbounded and uncounted.
+    """
+    stats = array._stats()
+    if 'nonempty' in stats:
+        return int(stats['nonempty'])
+    shape = array.shape
+    if shape is None:
+        return None
+    return int(np.prod(shape))
+
+
+def _cost(arrays, cells):
+    # cost of redimensioning arrays: unknown sizes are assumed
+    # larger than any known size
+    unknown = sum(1 for a in arrays if cells[a.name] is None)
+    known = sum(cells[a.name] for a in arrays if cells[a.name] is not None)
+    return (unknown, known)
+
+
+def _record(operation, kept, moved, cells):
+    item = Redimension(operation, kept.name, tuple(a.name for a in moved),
+                       dict((a.name, cells[a.name]) for a in [kept] + moved))
+    logging.getLogger(__name__).debug(
+        "%s: redimensioning %s to match %s (cells: %s)",
+        operation, list(item.moved), item.kept, item.cells)
+    for trace in _traces:
+        trace.append(item)
+
+
+@contextmanager
+def trace_redimensions():
+    """
+    Record how arrays are rechunked to match each other
+
+    Yields a list, which collects one :class:`Redimension` record for
+    every call to :func:`match_chunks` and :func:`match_chunk_permuted`
+    (including the calls made by join, merge, cross_join, and
+    arithmetic). Each record has the fields
+
+    - operation : the name of the matching function
+    - kept : the name of the array whose chunking was kept
+    - moved : the names of the arrays that were redimensioned
+    - cells : the estimated cell count of each input (see
+      :func:`estimate_cells`)
+
+    The same information is logged at DEBUG level.
+
+    Examples
+    --------
+    >>> with trace_redimensions() as trace:
+    ...     sdb.join(big, small)
+    >>> trace[0].moved == (small.name,)
+    True
+    """
+    trace = []
+    _traces.append(trace)
+    try:
+        yield trace
+    finally:
+        _traces.remove(trace)
+
+
+def _conform_chunks(array, target):
+    # datashape of array, with chunks matching target (aligned from the
+    # last dimension)
+    ds = array.datashape
+    for i, j in zip(reversed(list(range(array.ndim))),
+                    reversed(list(range(target.ndim)))):
+        ds = change_axis_schema(ds, i, chunk=target.chunk_size[j],
+                                overlap=target.chunk_overlap[j])
+    return ds
+
+
 def match_chunks(*arrays):
     """
     Redimension arrays so they have identical chunk sizes and overlaps
@@ -160,7 +258,15 @@ def match_chunks(*arrays):
     Returns
     -------
     arrays : Tuple of SciDBArrays
-        The chunk sizes and overlaps will be matched to the first input.
+        The (possibly redimensioned) inputs, in the same order.
+
+    Notes
+    -----
+    Every array is matched to the chunking of one of the inputs. That
+    input is chosen to minimize the estimated number of cells that are
+    redimensioned (see :func:`estimate_cells`): usually, the smaller
+    arrays are moved to match the largest one. Ties go to the
+    first input. Use :func:`trace_redimensions` to see the choice.
 
     See Also
     --------
@@ -168,19 +274,48 @@ def match_chunks(*arrays):
         to match chunks along particular pairs of
         dimensions
     """
-    target = arrays[0].datashape
-    result = []
-    for a in arrays:
-        ds = a.datashape
-        for i, j in zip(reversed(list(range(a.ndim))),
-                        reversed(list(range(target.ndim)))):
-            ds = change_axis_schema(ds, i, chunk=target.chunk_size[j],
-                                    overlap=target.chunk_overlap[j])
-        if a.datashape.schema != ds.schema:
-            a = a.redimension(ds.schema)
-        result.append(a)
+    cells = dict((a.name, estimate_cells(a)) for a in arrays)
 
-    return tuple(result)
+    best = None
+    for target in arrays:
+        shapes = [_conform_chunks(a, target.datashape) for a in arrays]
+        moved = [a for a, ds in zip(arrays, shapes)
+                 if ds.schema != a.datashape.schema]
+        cost = _cost(moved, cells)
+        if best is None or cost < best[0]:
+            best = cost, target, moved, shapes
+
+    _, target, moved, shapes = best
+    if moved:
+        _record('match_chunks', target, moved, cells)
+
+    return tuple(_reschema(a, ds)
+                 if ds.schema != a.datashape.schema else a
+                 for a, ds in zip(arrays, shapes))
+
+
+def _reschema(array, ds):
+    """
+    Redimension an array to a new chunking or (wider) bounds
+
+    The cells are unchanged, so cached density statistics carry over
+    (see :meth:`SciDBArray._stats`). The array stays dense only if
+    its bounds are unchanged.
+    """
+    stats = array._stats()
+    if array.shape is None or array.shape != ds.shape or \
+            list(array.datashape.dim_low) != list(ds.dim_low):
+        stats.pop('dense', None)
+    result = array.redimension(ds.schema)
+    result._rename_stats(stats, result.name)
+    return result
+
+
+def _bounded_datashape(array):
+    ds = array.datashape.copy()
+    ds.dim_low = list(ds.dim_low)
+    ds.dim_high = list(ds.dim_high)
+    return ds
 
 
 def match_chunk_permuted(src, target, indices, match_bounds=False):
@@ -190,9 +325,9 @@ def match_chunk_permuted(src, target, indices, match_bounds=False):
     Parameters
     ----------
     src : SciDBArray
-        The array to modify
+        The first array
     target: SciDBArray
-        The array to match
+        The second array
     indices: A list of tuples
         Each tuple (i,j) indicates that
         dimension *j* of src should have the same chunk properties
@@ -204,35 +339,30 @@ def match_chunk_permuted(src, target, indices, match_bounds=False):
     -------
     new_src, new_target : tuple of SciDBArrays
         A (possibly redimensioned) version of the inputs
-    """
 
-    ds = src.datashape.copy()
-    ds.dim_low = list(ds.dim_low)
-    ds.dim_high = list(ds.dim_high)
-    ds_target = target.datashape.copy()
-    ds_target.dim_low = list(ds_target.dim_low)
-    ds_target.dim_high = list(ds_target.dim_high)
+    Notes
+    -----
+    The chunks of whichever array is estimated to be smaller (see
+    :func:`estimate_cells`) are changed to match the other. Ties,
+    and arrays of unknown size, leave target's chunks unchanged.
+    Use :func:`trace_redimensions` to see the choice.
+    """
+    indices = [(i if isinstance(i, int) else target.dim_names.index(i),
+                j if isinstance(j, int) else src.dim_names.index(j))
+               for i, j in indices]
 
-    hi1 = ds.dim_high
-    hi2 = ds_target.dim_high
+    ds = _bounded_datashape(src)
+    ds_target = _bounded_datashape(target)
 
-    # lookup array dounds if schema is unbound
     if match_bounds:
-        if any(l is None for l in hi1):
-            tops = src.unpack('_').max().toarray()
-            hi1 = [int(tops['%s_max' % l][0]) for l in src.dim_names]
-        if any(l is None for l in hi2):
-            tops = target.unpack('_').max().toarray()
-            hi2 = [int(tops['%s_max' % l][0]) for l in target.dim_names]
-
-    for i, j in indices:
-        if not isinstance(i, int):
-            i = target.dim_names.index(i)
-        if not isinstance(j, int):
-            j = src.dim_names.index(j)
-        ds.chunk_size[j] = target.datashape.chunk_size[i]
-        ds.chunk_overlap[j] = target.datashape.chunk_overlap[i]
-        if match_bounds:
+        # lookup array bounds if schema is unbound
+        unbound = [a for a in (src, target) if None in a.datashape.dim_high]
+        extents = dict(zip((a.name for a in unbound),
+                           coordinate_extents(*unbound)))
+        hi1 = extents[src.name][1] if src.name in extents else ds.dim_high
+        hi2 = extents[target.name][1] if target.name in extents else ds_target.dim_high
+
+        for i, j in indices:
             l = min(ds.dim_low[j], ds_target.dim_low[i])
             h = max(hi1[j], hi2[i])
 
@@ -241,10 +371,29 @@ def match_chunk_permuted(src, target, indices, match_bounds=False):
             ds_target.dim_low[i] = l
             ds_target.dim_high[i] = h
 
+    # move the smaller array's chunks. Otherwise, conform src to target
+    cells = {src.name: estimate_cells(src),
+             target.name: estimate_cells(target)}
+    move_target = _cost([target], cells) < _cost([src], cells)
+
+    for i, j in indices:
+        if move_target:
+            ds_target.chunk_size[i] = src.datashape.chunk_size[j]
+            ds_target.chunk_overlap[i] = src.datashape.chunk_overlap[j]
+        else:
+            ds.chunk_size[j] = target.datashape.chunk_size[i]
+            ds.chunk_overlap[j] = target.datashape.chunk_overlap[i]
+
+    moved = [a for a, d in [(src, ds), (target, ds_target)]
+             if d.schema != a.datashape.schema]
+    if moved:
+        kept = src if move_target else target
+        _record('match_chunk_permuted', kept, moved, cells)
+
     if ds.schema != src.datashape.schema:
-        src = src.redimension(ds.schema)
+        src = _reschema(src, ds)
     if ds_target.schema != target.datashape.schema:
-        target = target.redimension(ds_target.schema)
+        target = _reschema(target, ds_target)
 
     return src, target
 
@@ -283,10 +432,103 @@ def rechunk(array, chunk_size=None, chunk_overlap=None):
     ds.chunk_overlap = chunk_overlap
 
     if ds != array.datashape:
-        array = array.redimension(ds.schema)
+        array = _reschema(array, ds)
     return array
 
 
+def _coordinate(value, default):
+    # null (empty array) -> default
+    if np.ma.is_masked(value) or value != value:
+        return default
+    return int(value)
+
+
+def dimension_bounds(array):
+    """
+    Look up the current low and high coordinate of each dimension
+
+    Parameters
+    ----------
+    array : SciDBArray
+        The array to inspect
+
+    Returns
+    -------
+    low, high : tuples of ints
+
+    Notes
+    -----
+    This forces evaluation of lazy arrays, and queries SciDB's
+    ``dimensions`` operator. The result is cached on the SciDBArray
+    object, and discarded when the array is modified through it.
+    Updates through another object or a raw query (e.g.,
+    ``afl.store(..., x.name)``) aren't detected; use
+    :meth:`SciDBInterface.wrap_array` to get a fresh object.
+    """
+    array = array.eval()
+    key = ('bounds', array.name)
+    if key not in array._cache:
+        dims = array.dimensions().project('low', 'high').toarray()
+        array._cache[key] = (tuple(int(l) for l in dims['low']),
+                             tuple(int(h) for h in dims['high']))
+    return array._cache[key]
+
+
+def coordinate_extents(*arrays):
+    """
+    Scan arrays for the lowest and highest coordinate along each dimension
+
+    Parameters
+    ----------
+    *arrays
+        One or more SciDBArrays
+
+    Returns
+    -------
+    extents : list of (low, high) tuples
+        For each array, tuples of the minimum and maximum coordinates
+        of its non-empty cells. Empty arrays report their lower bounds.
+
+    Notes
+    -----
+    This performs a full scan of each array, but all arrays are
+    scanned by a single aggregate query. Results are cached on each
+    SciDBArray object, as in :func:`dimension_bounds`, and cached
+    arrays aren't rescanned.
+    """
+    todo = []
+    extents = {}
+    for a in arrays:
+        if ('extent', a.name) not in a._cache and \
+                a.name not in [t.name for t in todo]:
+            todo.append(a)
+
+    if todo:
+        afl = todo[0].afl
+        labels = [[_new_attribute_label('_c%i_%i' % (k, i), *todo)
+                   for i in range(a.ndim)]
+                  for k, a in enumerate(todo)]
+
+        # one aggregate per array, each with a single cell: join them
+        scans = []
+        for a, names in zip(todo, labels):
+            args = [x for item in zip(names, a.dim_names) for x in item]
+            aggs = ['%s(%s)' % (f, n) for n in names for f in ['min', 'max']]
+            scans.append(afl.aggregate(afl.apply(a, *args), *aggs))
+        result = reduce(afl.join, scans).toarray()
+
+        for a, names in zip(todo, labels):
+            lows = tuple(_coordinate(result['%s_min' % n][0], l)
+                         for n, l in zip(names, a.datashape.dim_low))
+            highs = tuple(_coordinate(result['%s_max' % n][0], l)
+                          for n, l in zip(names, lows))
+            extents[a.name] = (lows, highs)
+
+    for a in arrays:
+        a._cache.setdefault(('extent', a.name), extents.get(a.name))
+    return [a._cache[('extent', a.name)] for a in arrays]
+
+
 def boundify(array, trim=False):
     """
     Redimension an array as needed so that no dimension is unbound (ie ending with *)
@@ -303,7 +545,9 @@ def boundify(array, trim=False):
 
     Notes
     -----
-    This forces evaluation of lazy arrays
+    This forces evaluation of lazy arrays. The bounds are cached
+    (see :func:`dimension_bounds` and :func:`coordinate_extents`),
+    so bounding the same array again doesn't requery them.
     """
     if not any(d is None for d in array.datashape.dim_high):
         return array
@@ -312,12 +556,10 @@ def boundify(array, trim=False):
         return _boundify_trim(array)
 
     # use special scan syntax to get current bounds. eval() required
-    dims = array.eval().dimensions().project('low', 'high').toarray()
     ds = array.datashape.copy()
-    ds.dim_low = tuple(dims['low'])
-    ds.dim_high = tuple(dims['high'])
+    ds.dim_low, ds.dim_high = dimension_bounds(array)
 
-    array = array.redimension(ds.schema)
+    array = _reschema(array, ds)
 
     return array
 
@@ -341,25 +583,23 @@ def coerced_shape(array):
     if array.shape is not None:
         return array.shape
 
-    r = array.eval().dimensions().project('low', 'high').toarray()
-    shp = tuple(np.maximum(r['high'] - r['low'] + 1, 0))
-    return shp
+    low, high = dimension_bounds(array)
+    return tuple(max(h - l + 1, 0) for l, h in zip(low, high))
 
 
 def _boundify_trim(array):
     # actually scan the array to find boundaries
 
     ds = array.datashape.copy()
-    idx = _new_attribute_label('_', array)
-    bounds = array.unpack(idx).max().toarray()
+    _, high = coordinate_extents(array)[0]
     ds.dim_high = list(ds.dim_high)
     for i in range(array.ndim):
         if ds.dim_high[i] is not None:
             continue
-        ds.dim_high[i] = int(bounds['%s_max' % ds.dim_names[i]][0])
+        ds.dim_high[i] = high[i]
 
     if ds.schema != array.schema:
-        array = array.redimension(ds.schema)
+        array = _reschema(array, ds)
 
     return array
 
@@ -530,8 +770,8 @@ def _att_schema_item(rep):
     return result
 
 
-def _dim_schema_item(name, limit):
-    return '{0}={1}:{2},1000,0'.format(name, limit[0], limit[1])
+def _dim_schema_item(name, limit, chunk_size=1000):
+    return '{0}={1}:{2},{3},0'.format(name, limit[0], limit[1], chunk_size)
 
 
 def limits(array, names):
@@ -701,9 +941,19 @@ def redimension(array, dimensions, attributes, dim_boundaries=None):
         # don't do limits here, too expensive!
         # XXX this does wrong thing if attribute has negative values
         # for k, v in limits(array, to_promote).items():
+        bounds = dict((k, dim_boundaries.get(k, (0, '*'))) for k in to_promote)
+
+        # plan chunks for the new dimensions, given the extents
+        # of the dimensions that are kept
+        sizes = dict((n, None if h is None else h - l + 1)
+                     for n, l, h in zip(ds.dim_names, ds.dim_low, ds.dim_high))
+        for k, (lo, hi) in bounds.items():
+            sizes[k] = None if hi in ('*', None) else int(hi) - int(lo) + 1
+        chunks = plan_chunks([sizes[d] for d in dimensions], array.sdbtype)
+        chunks = dict(zip(dimensions, chunks))
+
         for k in to_promote:
-            v = dim_boundaries.get(k, (0, '*'))
-            new_dim[k] = _dim_schema_item(k, v)
+            new_dim[k] = _dim_schema_item(k, bounds[k], chunks[k])
 
     new_dim = ','.join(new_dim[d] for d in dimensions)
 
@@ -754,7 +1004,7 @@ def match_size(*arrays):
             ds.dim_low[i] = target.dim_low[i]
             ds.dim_high[i] = target.dim_high[i]
         if ds != a.datashape:
-            a = a.redimension(ds.schema)
+            a = _reschema(a, ds)
         result.append(a)
 
     return tuple(result)
@@ -787,7 +1037,7 @@ def expand(*arrays):
         ds.dim_low = dim_low
         ds.dim_high = dim_high
         if ds != a.datashape:
-            a = a.redimension(ds.schema)
+            a = _reschema(a, ds)
         result.append(a)
 
     return result
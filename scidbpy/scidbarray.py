@@ -19,10 +19,12 @@ from .errors import SciDBError, SciDBForbidden, SciDBQueryError
 from . import parse
 from .utils import (meshgrid, slice_syntax, _is_query,
                     _new_attribute_label, as_list)
-from ._py3k_compat import genfromstr, iteritems, csv_reader, string_type, dtype as _dtype
+from ._py3k_compat import (genfromstr, iteritems, csv_reader, string_type,
+                          stringio, dtype as _dtype)
 from .schema_utils import change_axis_schema, dimension_rename, new_alias_label
 from . import schema_utils as su
 from .robust import (join, cumulate, reshape, thin, cross_join)
+from .cache import cache_key
 
 __all__ = ["sdbtype", "SciDBArray", "SciDBDataShape"]
 
@@ -65,6 +67,19 @@ def _sdb_type(np_type):
 
 SDB_IND_TYPE = 'int64'
 
+# aggregate names accepted by SciDBArray.agg, mapped to SciDB aggregates
+AGGREGATES = {'min': 'min', 'max': 'max', 'sum': 'sum',
+              'mean': 'avg', 'avg': 'avg',
+              'std': 'stdev', 'stdev': 'stdev', 'var': 'var',
+              'count': 'count', 'approxdc': 'approxdc'}
+
+# cached statistics that only depend on which cells are non-empty,
+# and carry over to queries with the same cells (see SciDBArray._stats)
+DENSITY_STATS = ('dense', 'nonempty')
+
+# aggregates computed by SciDBArray.describe
+DESCRIBE = ('count', 'mean', 'std', 'min', 'max')
+
 
 def _parse_csv_builtin(txt, dtype):
     """
@@ -72,8 +87,6 @@ def _parse_csv_builtin(txt, dtype):
 
     Uses the builtin CSV module to handle string dtypes
     """
-    # TODO: optional pandas version, for speed
-
     if not any(np.issubdtype(t, np.character) for f, t in dtype.descr):
         return genfromstr(txt, skip_header=1, delimiter=',', dtype=dtype)
 
@@ -91,7 +104,90 @@ def _parse_csv_builtin(txt, dtype):
 
     return np.array(r, dtype=dtype)
 
-_parse_csv = _parse_csv_builtin
+def _parse_csv_pandas(txt, dtype):
+    """
+    Convert a SciDB-output csv document into a NumPy array
+
+    Uses the compiled CSV parser in Pandas, which parses all columns
+    in a single vectorized pass. Missing values are filled like
+    ``_parse_csv_builtin`` does (-1 for integers, nan for floats,
+    False for booleans).
+    """
+    from pandas import read_csv
+
+    dtype = _dtype(dtype)
+    descr = [(f or 'f%i' % i, _dtype(t)) for i, (f, t) in enumerate(dtype.descr)]
+    names = [f for f, t in descr]
+
+    # every column type is pinned, so that string attributes are never
+    # reinterpreted as numbers or booleans. Integer columns use the
+    # nullable pandas types, so that SciDB's null token can be parsed
+    col_dtype = {}
+    for f, t in descr:
+        if t.kind == 'i':
+            col_dtype[f] = 'Int%i' % (8 * t.itemsize)
+        elif t.kind == 'u':
+            col_dtype[f] = 'UInt%i' % (8 * t.itemsize)
+        elif t.kind == 'f':
+            col_dtype[f] = t
+        else:
+            col_dtype[f] = object
+    na_values = dict((f, ['null']) for f, t in descr if t.kind in 'iu')
+    na_values.update((f, ['nan', '-nan', 'null'])
+                     for f, t in descr if t.kind == 'f')
+
+    df = read_csv(stringio(txt), header=None, skiprows=1, names=names,
+                  dtype=col_dtype, engine='c', quotechar="'",
+                  escapechar='\\', keep_default_na=False,
+                  na_values=na_values, encoding='utf8')
+
+    columns = []
+    for f, t in descr:
+        col = df[f]
+        if t.kind in 'iu':
+            col = col.to_numpy(dtype=t, na_value=np.array(-1).astype(t)[()])
+        elif t.kind == 'b':
+            col = (col.values == 'true')
+        elif t.kind in 'SU':
+            col = col.values.astype('U') if len(col) else col.values.astype('U1')
+        else:
+            col = col.values.astype(t)
+        columns.append(col)
+
+    if dtype.names is None:
+        return columns[0]
+
+    result = np.empty(len(df), dtype=[(str(f), c.dtype)
+                                      for (f, t), c in zip(descr, columns)])
+    for (f, t), c in zip(descr, columns):
+        result[f] = c
+    return result
+
+
+def _parse_csv(txt, dtype):
+    """
+    Convert a SciDB-output csv document into a NumPy array
+
+    Uses the vectorized Pandas parser when available, and falls
+    back to the builtin CSV module otherwise.
+
+    Parameters
+    ----------
+    txt : str
+        The CSV text, including a header line
+    dtype : numpy dtype
+        The expected column types. String columns are resized to
+        fit the longest parsed string.
+
+    Returns
+    -------
+    array : ndarray
+    """
+    try:
+        import pandas
+    except ImportError:
+        return _parse_csv_builtin(txt, dtype)
+    return _parse_csv_pandas(txt, dtype)
 
 
 class sdbtype(object):
@@ -521,6 +617,56 @@ class SciDBArray(object):
         self.interface = interface
         self.name = name
         self.persistent = persistent
+        self._cache = {}
+        self._points = {}
+        # (array name, expression) if this is a lazy boolean
+        # comparison of another array, set by _boolean_compare
+        self._condition = None
+
+    def _invalidate(self):
+        """
+        Discard cached statistics (e.g., cell counts) about the array.
+
+        Called whenever the array's contents change.
+        """
+        self._cache = {}
+        self._points = {}
+        if self.interface is not None:
+            self.interface.category_cache.forget(self.name)
+
+    def _stats(self):
+        """
+        The cached density statistics (see ``DENSITY_STATS``) for
+        the array's current name
+        """
+        return dict((k[0], v) for k, v in self._cache.items()
+                    if k[1] == self.name and k[0] in DENSITY_STATS)
+
+    def _rename_stats(self, stats, name):
+        """
+        Record density statistics under a new array name.
+
+        Used when the array is re-pointed to a new query or stored
+        array that has the same cells (e.g., after eval or apply).
+        Other cached values (bounds, aggregates, ...) depend on
+        the attributes or dimensions, and are not carried over.
+        """
+        self._cache.update(((k, name), v) for k, v in stats.items()
+                           if k in DENSITY_STATS)
+
+    def _mark_dense(self):
+        """
+        Record that every cell in the (bounded) array is non-empty.
+
+        Arrays created by build() and arithmetic on dense arrays are
+        marked this way, so that issparse() doesn't need a count query.
+
+        Returns
+        -------
+        self
+        """
+        self._cache[('dense', self.name)] = True
+        return self
 
     @property
     def persistent(self):
@@ -764,6 +910,7 @@ class SciDBArray(object):
             return
 
         if (self.datashape is not None):
+            self.interface.category_cache.forget(self.name)
             self.interface.query("remove({0})", self.name)
             self.name = '__DELETED__'
             self.interface = None
@@ -790,9 +937,12 @@ class SciDBArray(object):
         --------
         nonnull()
         """
-        query = self.afl.count(self)
-        response = query.eval(response=True, fmt='(int64)', store=False)
-        return np.fromstring(response, dtype='int64')[0]
+        key = ('nonempty', self.name)
+        if key not in self._cache:
+            query = self.afl.count(self)
+            response = query.eval(response=True, fmt='(int64)', store=False)
+            self._cache[key] = np.frombuffer(response, dtype='int64')[0]
+        return self._cache[key]
 
     def nonnull(self, attr=0):
         """
@@ -847,7 +997,14 @@ class SciDBArray(object):
             return False
 
     def issparse(self):
-        """Check whether array is sparse."""
+        """Check whether array is sparse.
+
+        This requires a count query, unless the array is known to be
+        dense (e.g., it was created by :meth:`SciDBInterface.zeros`), or
+        its number of non-empty cells is already cached.
+        """
+        if self._cache.get(('dense', self.name)):
+            return False
         return (self.nonempty() < self.size)
 
     def _download_data(self, transfer_bytes=True, output='auto'):
@@ -961,11 +1118,13 @@ class SciDBArray(object):
 
         Parameters
         ----------
-        compression : None, 'auto' or 1-9
+        compression : None, 'auto', 'adaptive' or 1-9
            Whether to use compression. None disables compression.
            'auto' uses the `default_compression` attribute on
            the SciDB interface object. 1-9 uses gzip compression
-           at the specified level (1=fast, 9=best)
+           at the specified level (1=fast, 9=best). 'adaptive'
+           chooses a level based on the payload size and measured
+           transfer throughput.
 
         method : 'sparse' or 'dense' (optional, default sparse)
             Whether the array to download is sparse or dense.
@@ -978,13 +1137,29 @@ class SciDBArray(object):
             with no empty cells. It is faster, since it
             doesn't compute or transfer indices.
 
+        cache : None, True or False (optional, default None)
+            Whether to use the interface's local result cache
+            (see :meth:`~scidbpy.interface.SciDBInterface.enable_cache`).
+            None caches stored arrays only. True also caches unevaluated
+            queries, keyed by their query text (only appropriate for
+            deterministic queries). False bypasses the cache.
+
+        out : str or ndarray (optional)
+            Where to write the result. A string is the path of a new
+            memory-mapped file (a '.npy' file if the path ends in .npy,
+            raw binary otherwise). An ndarray (e.g. a ``numpy.memmap``)
+            must have the shape and dtype of the result.
+            The array is downloaded one row of chunks at a time,
+            so the output can be larger than the available memory.
+
         transfer_bytes : DEPRECATED
            Unused
 
         Returns
         -------
         arr : np.ndarray
-            The dense array containing the data.
+            The dense array containing the data. This is `out`,
+            if provided.
 
         Notes
         -----
@@ -996,7 +1171,20 @@ class SciDBArray(object):
                                              "and will be removed in a future version"))
             kwargs.pop('transfer_bytes')
 
-        return parse.toarray(self, **kwargs)
+        cache = kwargs.pop('cache', None)
+        result_cache = self.interface.result_cache
+        if result_cache is None or cache is False or 'out' in kwargs:
+            return parse.toarray(self, **kwargs)
+
+        key, version = cache_key(self, include_queries=bool(cache))
+        if key is None:
+            return parse.toarray(self, **kwargs)
+
+        result = result_cache.get(key, version)
+        if result is None:
+            result = parse.toarray(self, **kwargs)
+            result_cache.put(key, version, result)
+        return result
 
     def eval(self, out=None, store=True, **kwargs):
         """
@@ -1028,17 +1216,25 @@ class SciDBArray(object):
 
         query = 'store({q}, {name})'.format(q=self.name, name=name)
         self.interface._execute_query(query, **kwargs)
+        if out is not None:
+            out._invalidate()
 
+        # statistics of the query carry over to the stored array
+        stats = self._stats()
         self.name = name
+        result._rename_stats(stats, name)
         return result
 
-    def todataframe(self, **kwargs):
+    def todataframe(self, engine='numpy', **kwargs):
         """Transfer array from database and store in a local Pandas dataframe
 
         The array dimensions are assigned to the index of the output.
 
         Parameters
         ----------
+        engine : 'numpy' or 'arrow' (optional, default 'numpy')
+           How to decode the transfer. 'arrow' decodes into
+           Arrow buffers (see :meth:`toarrow`), and requires pyarrow.
         compression : 'auto', None, or [1-9]
            Whether and how to compress the transfer.
 
@@ -1049,10 +1245,38 @@ class SciDBArray(object):
         """
         from pandas import DataFrame
 
+        if engine == 'arrow':
+            df = self.toarrow(**kwargs).to_pandas()
+            return df.set_index(self.dim_names)
+        if engine != 'numpy':
+            raise ValueError("engine must be 'numpy' or 'arrow': %s" % engine)
+
         idx = _new_attribute_label('row', self)
         a = self.afl.unpack(self, idx).toarray(**kwargs)
         return DataFrame(a, columns=self.dim_names + self.att_names).set_index(self.dim_names)
 
+    def toarrow(self, **kwargs):
+        """Transfer array from database and store in a pyarrow Table
+
+        SciDB's binary output is decoded directly into Arrow buffers.
+        Null values become Arrow nulls (no type promotion is needed),
+        and strings are gathered into Arrow offset/data buffers.
+        The result can be handed to pandas, Parquet writers, etc.
+        without further conversion.
+
+        Parameters
+        ----------
+        compression : 'auto', None, or [1-9]
+           Whether and how to compress the transfer.
+
+        Returns
+        -------
+        table : pyarrow.Table
+            A table with one column for each dimension, followed by
+            one column for each attribute. Each row is a nonempty cell.
+        """
+        return parse.toarrow(self, **kwargs)
+
     def tosparse(self, sparse_fmt='recarray', **kwargs):
         """Transfer array from database and store in a local sparse array.
 
@@ -1114,51 +1338,106 @@ class SciDBArray(object):
 
         return result
 
-    def _integer_index(self, idx):
+    def _integer_index(self, indices):
+        """
+        Index using integer arrays, following NumPy's rules
+
+        Parameters
+        ----------
+        indices : tuple
+            Slices, integers, and integer index arrays (lists,
+            ndarrays, or SciDBArrays), one per dimension
+
+        See Also
+        --------
+        indexing.fancy_index
         """
-        Index using an integer array
+        from .indexing import fancy_index
+        return fancy_index(self, indices)
+
+    def lookup(self, coords):
         """
-        from .schema_utils import disambiguate, redimension
+        Fetch the values at many cells, with a single query
 
-        if self.ndim != 1 or idx.ndim != 1:
-            raise NotImplementedError("Slicing with integers requires 1D arrays")
+        The coordinates are uploaded in one batch, and matched
+        against the array with a single server-side join. This
+        is much faster than reading cells one at a time.
 
-        if not isinstance(idx, SciDBArray):
-            idx = self.interface.from_array(idx)
+        Parameters
+        ----------
+        coords : array-like
+            The coordinates of each cell to read: a list of tuples,
+            or an (npoints, ndim) integer array. Like ``x[i, j]``,
+            coordinates are absolute dimension values.
 
-        if idx.natt != 1:
-            raise ValueError("Can only index with single-attribute arrays")
+        Returns
+        -------
+        values : ndarray
+            A 1D array with one value (or record) per coordinate
 
-        # example array: [0, 10, 20]
-        #         idx  : [0, 2, 0]
+        Examples
+        --------
+        >>> x = sdb.arange(12).reshape((3, 4))
+        >>> x.lookup([(0, 1), (2, 3), (0, 1)])
+        array([ 1, 11,  1])
 
-        # relabel idx to avoid name collisions
-        self, idx = disambiguate(self, idx)
+        See Also
+        --------
+        take(), prefetch()
+        """
+        from .indexing import lookup
+        return lookup(self, coords)
+
+    def take(self, indices, axis=None):
+        """
+        Take elements from the array, like numpy.take
+
+        Parameters
+        ----------
+        indices : array-like of ints
+            The positions to take
+        axis : int (optional)
+            The axis to take positions along. By default,
+            positions refer to the flattened array.
+
+        Returns
+        -------
+        values : ndarray or SciDBArray
+            With ``axis=None``, the downloaded values, with the same
+            shape as ``indices``. Otherwise an unevaluated SciDBArray,
+            equivalent to indexing with ``indices`` along ``axis``.
+
+        See Also
+        --------
+        lookup()
+        """
+        from .indexing import take
+        return take(self, indices, axis=axis)
 
-        idx_att = idx.att_names[0]
-        orig_atts = self.att_names
+    def prefetch(self, coords):
+        """
+        Download many cells at once, to speed up later element access
 
-        # turn into 2D array, 2nd dim = idx
-        # idx: [(0, 0), (2, 1), (0, 2)]
-        pos = _new_attribute_label('pos', self, idx)
-        idx = idx.apply(pos, idx.dim_names[0])
-        # idx: [[(0), (), ()],
-        #       [(), (), (1)],
-        #       [(2), (), ()]]
-        idx = redimension(idx, idx.dim_names + idx.att_names[0:1], [pos])
+        Subsequent scalar lookups like ``x[i, j]`` of any of the
+        prefetched cells are answered locally, rather than with
+        one query per element. Prefetched values are discarded
+        when the array is modified.
 
-        #    (value, idx)
-        # x: [[(0,0), (),    (0,2)],
-        #     [(),    (),    ()],
-        #     [(),    (20,1),()]]
-        x = cross_join(self, idx, self.dim_names[0], idx_att)
+        Parameters
+        ----------
+        coords : array-like
+            The coordinates to fetch, as in :meth:`lookup`
 
-        # for some reason, SciDB needs to eval() the query for
-        # multiattribute arrays
-        if len(orig_atts) > 1:
-            x = x.eval()
-        x = redimension(x, [pos], orig_atts)
-        return x
+        Examples
+        --------
+        >>> x.prefetch([(i, i) for i in range(1000)])
+        >>> trace = sum(x[i, i] for i in range(1000))  # no further queries
+        """
+        from .indexing import _as_coordinates
+        coords = _as_coordinates(coords, self.ndim)
+        values = self.lookup(coords)
+        points = self._points.setdefault(self.name, {})
+        points.update(zip(map(tuple, coords.tolist()), values))
 
     def isel(self, **kwargs):
         """
@@ -1188,7 +1467,7 @@ class SciDBArray(object):
                 raise KeyError("Invalid dimension name: %s" % k)
             idx = self.dim_names.index(k)
             slices[idx] = v
-        return self[slices]
+        return self[tuple(slices)]
 
     def __getitem__(self, indices):
         # The goal of getitem is to make a numpy-style interface perform
@@ -1204,6 +1483,7 @@ class SciDBArray(object):
         #  [reshape: This applies if a slice argument is newaxis.]
 
         # TODO: allow newaxis to be passed
+        from .indexing import is_index_array
 
         # slice can be either a tuple/iterable or a single integer/slice
 
@@ -1224,16 +1504,22 @@ class SciDBArray(object):
             return self._boolean_filter(indices)
 
         if _integer_scidbarray(indices):
-            return self._integer_index(indices)
+            return self._integer_index((indices,))
 
         # passing a boolean mask
-        if isinstance(indices, np.ndarray) and indices.dtype == np.bool:
-            indices = self.interface.from_array(indices)
+        if isinstance(indices, np.ndarray) and indices.dtype.kind == 'b':
             return self._boolean_filter(indices)
 
         if isinstance(indices, string_type):
             indices = (indices,)
 
+        # a single index array (a list is only an index array if it
+        # holds integers, rather than slices or attribute names)
+        if isinstance(indices, np.ndarray) or \
+                (isinstance(indices, list) and indices and
+                 all(isinstance(i, (int, np.integer)) for i in indices)):
+            indices = (np.asarray(indices),)
+
         try:
             indices = tuple(indices)
         except TypeError:
@@ -1257,8 +1543,16 @@ class SciDBArray(object):
         if all(isinstance(i, SciDBArray) for i in indices):
             return _subarray(self, *indices)
 
+        # numpy-style "fancy" indexing with integer arrays
+        if any(is_index_array(i) for i in indices):
+            return self._integer_index(indices)
+
         # special case: accessing a single element (no slices)
         if all(not isinstance(i, slice) for i in indices):
+            points = self._points.get(self.name, {})
+            key = tuple(map(int, indices))
+            if key in points:
+                return points[key]
             limits = list(map(int, indices + indices))
             q = self.afl.subarray(self, *limits)
             return q.toarray().flat[0]
@@ -1303,9 +1597,13 @@ class SciDBArray(object):
             raise ValueError("Number of expressions does not match number "
                              "of new attributes")
         args = chain(*zip(key, value))
+        # apply doesn't change which cells are non-empty
+        stats = self._stats()
         result = self.afl.apply(self, *args)
         self.name = result.name
         self._datashape = None  # refresh schema
+        self._invalidate()
+        self._rename_stats(stats, self.name)
 
     @slice_syntax
     def sdbslice(self, slices):
@@ -1484,7 +1782,9 @@ class SciDBArray(object):
                                            other=other,
                                            op=operator)
         att = _new_attribute_label('condition', self)
-        return f.papply(self, att, expr)
+        result = f.papply(self, att, expr)
+        result._condition = (self.name, expr)
+        return result
 
     def _boolean_compare_array(self, operator, other):
         """
@@ -1511,25 +1811,40 @@ class SciDBArray(object):
 
     def _boolean_filter(self, mask):
         """
-        Extract flattened array of elements in self where mask is true.
+        Extract elements in self where mask is true.
 
-        Equivalent to numpy mask filtering: x[mask]
+        Cells where mask is false are left empty; see extract() for
+        a flattened result.
         """
-        from .schema_utils import disambiguate
+        from .indexing import mask_index
+        return mask_index(self, mask)
 
-        if mask.shape and self.shape and mask.shape != self.shape:
-            raise ValueError("Shape of mask does not match array: %s vs %s" %
-                             (mask.shape, self.shape))
+    def extract(self, mask):
+        """
+        Return the elements where a boolean mask is true, as a 1D array
 
-        if len(mask.att_names) != 1:
-            raise TypeError("Boolean mask must have a single attribute")
+        This matches NumPy's mask indexing ``ndarray[mask]``, whereas
+        ``x[mask]`` preserves the location of the selected cells.
 
-        f = self.afl
-        self, mask = disambiguate(self, mask)
-        joined = join(self, mask)
-        expr = '%s=TRUE' % mask.att_names[0]
-        result = f.project(f.filter(joined, expr), *self.att_names)
-        return result
+        Parameters
+        ----------
+        mask : SciDBArray or ndarray
+            A single-attribute boolean array with the same shape as this array
+
+        Returns
+        -------
+        result : SciDBArray
+            A dense 1D array of the selected cells, in C order. It is
+            unevaluated, unless ``mask`` is a NumPy array
+
+        Examples
+        --------
+        >>> x = sdb.arange(12).reshape((3, 4))
+        >>> x.extract(x > 8).toarray()
+        array([ 9, 10, 11])
+        """
+        from .indexing import mask_index
+        return mask_index(self, mask, flatten=True)
 
     def collapse(self):
         """
@@ -1573,7 +1888,11 @@ class SciDBArray(object):
 
         newatt = _new_attribute_label('condition', self)
         att = self.att_names[0]
-        return self.afl.papply(self, newatt, "not(%s)" % att)
+        result = self.afl.papply(self, newatt, "not(%s)" % att)
+        if self._condition is not None:
+            name, expr = self._condition
+            result._condition = (name, "not(%s)" % expr)
+        return result
 
     def transpose(self, *axes):
         """Permute the dimensions of an array.
@@ -1616,17 +1935,15 @@ class SciDBArray(object):
             if (len(axes) != self.ndim or len(set(axes)) != self.ndim):
                 raise ValueError("axes don't match array")
 
-            # set up the new array
-            shape = [self.shape[a] for a in axes]
-            chunk_size = [self.chunk_size[a] for a in axes]
-            chunk_overlap = [self.chunk_overlap[a] for a in axes]
-            dim_names = [self.dim_names[a] for a in axes]
-            arr = self.interface.new_array(shape=shape,
-                                           dtype=self.sdbtype,
-                                           chunk_size=chunk_size,
-                                           chunk_overlap=chunk_overlap,
-                                           dim_names=dim_names)
-            self.afl.redimension_store(self, arr).eval(store=False)
+            # permuting dimensions is a lazy redimension
+            ds = self.datashape
+            schema = SciDBDataShape(None, self.sdbtype,
+                                    dim_names=[ds.dim_names[a] for a in axes],
+                                    chunk_size=[ds.chunk_size[a] for a in axes],
+                                    chunk_overlap=[ds.chunk_overlap[a] for a in axes],
+                                    dim_low=[ds.dim_low[a] for a in axes],
+                                    dim_high=[ds.dim_high[a] for a in axes]).schema
+            arr = self.redimension(schema)
         return arr
 
     # This allows the transpose of A to be computed via A.T
@@ -1786,6 +2103,23 @@ class SciDBArray(object):
         to Python users, but keep a flag which allows SciDB-like behavior.
         """
         # TODO: add optional ``out`` argument, as in numpy
+        agg = ["{agg}({att})".format(agg=agg, att=a)
+               for a in self.att_names]
+
+        args = agg + self._aggregate_dims(index, scidb_syntax)
+        return self.afl.aggregate(self, *args)
+
+    def _aggregate_dims(self, index=None, scidb_syntax=False):
+        """
+        The dimensions an aggregate over `index` groups by
+
+        See :meth:`_aggregate_operation` for the meaning of the parameters.
+
+        Returns
+        -------
+        dims : list of strings
+            The dimension names to pass to ``aggregate``
+        """
         idx_args = []
         if index is not None:
             try:
@@ -1798,7 +2132,7 @@ class SciDBArray(object):
                    for i in map(int, ind)]
 
             # check that indices are in range
-            if any(i < 0 or i > self.ndim for i in ind):
+            if any(i < 0 or i >= self.ndim for i in ind):
                 raise ValueError("index out of range")
 
             # check for duplicates
@@ -1813,11 +2147,7 @@ class SciDBArray(object):
             if len(ind) > 0:
                 idx_args = [self.dim_names[i] for i in ind]
 
-        agg = ["{agg}({att})".format(agg=agg, att=a)
-               for a in self.att_names]
-
-        args = agg + idx_args
-        return self.afl.aggregate(self, *args)
+        return idx_args
 
     def min(self, index=None, scidb_syntax=False):
         """
@@ -2032,6 +2362,112 @@ class SciDBArray(object):
         """
         return self._aggregate_operation('approxdc', index, scidb_syntax)
 
+    def agg(self, funcs, index=None, scidb_syntax=False, atts=None):
+        """
+        Compute several aggregates of every attribute in a single query.
+
+        Parameters
+        ----------
+        funcs : string or list of strings
+            The aggregates to compute: any of 'min', 'max', 'sum',
+            'mean' (or 'avg'), 'std' (or 'stdev'), 'var', 'count'
+            and 'approxdc'.
+        index : int, optional
+            Axis along which to operate. By default, flattened input is used.
+        scidb_syntax : bool, optional (default=False)
+            If False, index follows the numpy convention
+            (i.e., the array is collapsed over the index'th axis).
+            If True, index follows the SciDB convention
+            (i.e., the array is collapsed over all axes *except* index)
+        atts : string or list of strings, optional
+            The attributes to aggregate. Defaults to all attributes.
+
+        Returns
+        -------
+        result : numpy record or structured ndarray
+            One field per attribute and aggregate, named
+            ``<attribute>_<aggregate>`` (e.g., ``f0_mean``). Aggregating
+            the whole array gives a single record; aggregating along an
+            axis gives an array over the remaining dimensions.
+
+        Notes
+        -----
+        Unlike :meth:`min`, :meth:`max`, etc., which each scan the array,
+        all the aggregates are computed by one ``aggregate`` query.
+        Results are cached on the array until its contents change, so
+        repeating the call (or asking for a subset of the aggregates
+        of the whole array) doesn't scan it again.
+
+        Examples
+        --------
+        >>> x = sdb.from_array(np.arange(10.))
+        >>> stats = x.agg(['min', 'max', 'mean'])
+        >>> stats['f0_max']
+        9.0
+        """
+        funcs = as_list(funcs)
+        bad = [f for f in funcs if f not in AGGREGATES]
+        if bad:
+            raise ValueError("Unknown aggregate(s) %s. Must be one of %s" %
+                             (bad, sorted(AGGREGATES)))
+        funcs = [f for i, f in enumerate(funcs) if f not in funcs[:i]]
+
+        dims = self._aggregate_dims(index, scidb_syntax)
+        atts = self.att_names if atts is None else as_list(atts)
+        bad = [a for a in atts if a not in self.att_names]
+        if bad:
+            raise ValueError("Not attributes of the array: %s" % bad)
+
+        fields = [(att, f) for att in atts for f in funcs]
+        names = ['%s_%s' % field for field in fields]
+
+        def aggregate(fields, names):
+            args = ['%s(%s) as %s' % (AGGREGATES[f], att, name)
+                    for (att, f), name in zip(fields, names)]
+            return self.afl.aggregate(self, *(args + dims)).toarray()
+
+        if dims:
+            key = (('agg', tuple(names), tuple(dims)), self.name)
+            if key not in self._cache:
+                self._cache[key] = aggregate(fields, names)
+            return self._cache[key]
+
+        # whole-array aggregates are cached one value at a time,
+        # so that later calls can reuse any subset of them
+        def key(field):
+            att, f = field
+            return (('agg', AGGREGATES[f], att), self.name)
+
+        missing = [(field, name) for field, name in zip(fields, names)
+                   if key(field) not in self._cache]
+        if missing:
+            mfields, mnames = zip(*missing)
+            result = aggregate(mfields, mnames)
+            for field, name in missing:
+                self._cache[key(field)] = result[name][0]
+
+        values = tuple(self._cache[key(field)] for field in fields)
+        dtype = _dtype([(name, np.asarray(value).dtype)
+                        for name, value in zip(names, values)])
+        return np.array(values, dtype=dtype)[()]
+
+    def describe(self, index=None, scidb_syntax=False):
+        """
+        Summarize every attribute of the array in a single query.
+
+        Computes the count, mean, standard deviation, minimum and
+        maximum. See :meth:`agg` for the parameters and the result.
+
+        Examples
+        --------
+        >>> x = sdb.from_array(np.arange(10.))
+        >>> x.describe()
+        (10, 4.5, 3.0276503540974917, 0.0, 9.0)
+        >>> x.describe().dtype.names
+        ('f0_count', 'f0_mean', 'f0_std', 'f0_min', 'f0_max')
+        """
+        return self.agg(DESCRIBE, index, scidb_syntax)
+
     def regrid(self, size, aggregate="avg"):
         """Regrid the array using the specified aggregate
 
@@ -2163,53 +2599,61 @@ class SciDBArray(object):
         ----------
         array : SciDBArray
             The array to filter
-        mask : SciDBArray
+        mask : SciDBArray or ndarray
             A 1-dimensional SciDBArray, whose non-null values indicate
-            the entries to retain
+            the entries to retain, or a 1-dimensional boolean ndarray
         axis : int
             The axis of array along which to apply the mask. The shape
             of array along this axis must be the length of mask
+
+        Returns
+        -------
+        result : SciDBArray
+            A bounded array. It is unevaluated if mask is a SciDBArray
+            (whose retained entries are counted by one query), and
+            stored if mask is an ndarray (see :meth:`subset`).
+
+        See Also
+        --------
+        subset()
         """
-        f = self.afl
+        from .indexing import orthogonal_select
 
-        if mask.sdbtype.full_rep[0][1] == 'bool':
-            mask = f.filter(mask, "%s=TRUE" % mask.att_names[0])
-
-        dim = self.dim_names[axis]
-        chunk = self.datashape.chunk_size[axis]
-        overlap = self.datashape.chunk_overlap[axis]
-        sz = self.shape[axis]
-        ct = int(f.aggregate(mask, 'count(*)').eval()[0])
-        if ct == 0:
-            raise ValueError("Cannot discard all elements of array")
-
-        new_att = _new_attribute_label(dim, mask)
-        idx_att = _new_attribute_label(new_att + '_0', mask)
-
-        # copy the dimension to a new attribute, sort moves nulls to end
-        q = f.papply(mask, new_att, mask.dim_names[0])
-        q = f.sort(q, '%s asc' % new_att)
-
-        # rename attributes, and swap sorted new_att to a dimension
-        # after this step, idx_att contains the final location for
-        # each original location
-        q = f.cast(q, '<%s:int64>[%s=0:*,1000,0]' % (new_att, idx_att))
-        q = f.redimension(q, '<{idx_att}:int64>[{new_att}=0:{stop},{chunk},{overlap}]'
-                          .format(new_att=new_att, stop=sz - 1,
-                                  chunk=chunk, overlap=overlap,
-                                  idx_att=idx_att))
-
-        # tack on new location for each element
-        q = f.cross_join(f.as_(self, 'xj1'),
-                         f.as_(q, 'xj2'),
-                         'xj1.%s' % dim, 'xj2.%s' % new_att)
-
-        # promote idx_att to a dimension, which rearranges + truncates
-        schema = self.sdbtype.schema
-        schema += change_axis_schema(self.datashape,
-                                     axis, name=idx_att, stop=ct - 1).dim_schema
-        q = f.redimension(q, schema)
-        return q
+        if axis < 0:
+            axis += self.ndim
+        masks = [None] * axis + [mask]
+        return orthogonal_select(self, masks)
+
+    def subset(self, *masks):
+        """
+        Select a subset of positions along several axes at once
+
+        Equivalent to ``ndarray[np.ix_(*masks)]`` with boolean masks, or
+        to a chain of compress() calls, but computed in a single pass.
+
+        Parameters
+        ----------
+        *masks : 1D SciDBArrays, 1D boolean ndarrays, or None
+            One mask per leading axis. None keeps the whole axis.
+            As with compress(), SciDBArray masks retain their true
+            (or, for non-boolean arrays, non-empty) cells.
+
+        Returns
+        -------
+        result : SciDBArray
+            A bounded array. It is unevaluated if every mask is a
+            SciDBArray or None. NumPy masks are uploaded as remapping
+            tables, so the result is stored and the tables removed.
+
+        Examples
+        --------
+        >>> x = sdb.random((1000, 50))
+        >>> rows = x.mean(1) > 0.5
+        >>> cols = np.arange(50) % 2 == 0
+        >>> x.subset(rows, cols)  # same as x.compress(rows, 0).compress(cols, 1)
+        """
+        from .indexing import orthogonal_select
+        return orthogonal_select(self, masks)
 
     def any(self):
         """
@@ -2258,10 +2702,5 @@ def _subarray(array, *masks):
     out : SciDBArray
        The filtered subarray
     """
-
-    # XXX perform shape checking here
-
-    result = array
-    for i, mask in enumerate(masks):
-        result = result.compress(result, mask, i).eval()
-    return result
+    from .indexing import orthogonal_select
+    return orthogonal_select(array, masks)
@@ -13,6 +13,7 @@ RTOL = 1e-6
 
 MISSING_PD = False
 MISSING_SP = False
+MISSING_PA = False
 try:
     import pandas as pd
 except ImportError:
@@ -23,9 +24,15 @@ try:
 except ImportError:
     sparse = None
     MISSING_SP = True
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+    MISSING_PA = True
 
 needs_pandas = pytest.mark.skipif(MISSING_PD, reason='Test requires Pandas')
 needs_scipy = pytest.mark.skipif(MISSING_SP, reason='Test requires SciPy')
+needs_pyarrow = pytest.mark.skipif(MISSING_PA, reason='Test requires pyarrow')
 
 
 sdb = connect()
@@ -6,7 +6,7 @@ import pytest
 from numpy.testing import assert_allclose, assert_array_equal
 import numpy as np
 
-from .. import histogram
+from .. import aggregation, histogram, histogram2d, quantile
 from . import sdb, TestBase, teardown_function
 
 
@@ -77,6 +77,97 @@ class TestHistogram(TestBase):
         self.check_multi(x, 'a')
         self.check_multi(x, 'b')
 
+    def test_bin_edges(self):
+        x = np.random.random(50)
+        self.check(x, bins=[0, 0.1, 0.5, 0.7, 1])
+        self.check(x, bins=[0.2, 0.3, 0.6])
+
+    def test_bad_bins(self):
+        s = sdb.random(5)
+        with pytest.raises(ValueError):
+            histogram(s, bins=0)
+        with pytest.raises(ValueError):
+            histogram(s, bins=[0, 1, 0.5])
+
+    def test_attribute_list(self):
+        x = np.zeros((3, 4),
+                     dtype=[(str('a'), int), (str('b'), float)])
+        x['a'] = np.random.randint(0, 5, (3, 4))
+        x['b'] = np.random.random((3, 4))
+        s = sdb.from_array(x)
+
+        counts, bins = histogram(s, att=['a', 'b'], bins=[4, [0, 0.5, 1]])
+        for c, b, att, nb in zip(counts, bins, 'ab', [4, [0, 0.5, 1]]):
+            excounts, exbins = np.histogram(x[att], bins=nb)
+            np.testing.assert_array_almost_equal(b, exbins)
+            np.testing.assert_array_equal(c, excounts)
+
+    def test_histogram2d(self):
+        x = np.zeros(50, dtype=[(str('a'), float), (str('b'), float)])
+        x['a'] = np.random.random(50)
+        x['b'] = np.random.random(50) * 3
+        s = sdb.from_array(x)
+
+        for kwargs in [{}, dict(bins=[3, 5]),
+                       dict(bins=[[0, 0.5, 1], 4], range=[[0, 1], [1, 2]])]:
+            counts, xedges, yedges = histogram2d(s, **kwargs)
+            ex, exx, exy = np.histogram2d(x['a'], x['b'], **kwargs)
+            np.testing.assert_array_almost_equal(xedges, exx)
+            np.testing.assert_array_almost_equal(yedges, exy)
+            np.testing.assert_array_equal(counts, ex)
+
+    def test_reuses_limits(self):
+        s = sdb.from_array(np.random.random(50))
+        s.agg(['min', 'max', 'mean'])
+        n = len(sdb._query_log)
+
+        histogram(s)
+        assert not any('min(' in q for q in sdb._query_log[n:])
+
+
+class TestQuantile(TestBase):
+
+    def setup_method(self, method):
+        np.random.seed(42)
+
+    def check(self, x, q):
+        s = sdb.from_array(x)
+        assert_allclose(quantile(s, q), np.percentile(x, np.multiply(q, 100)))
+
+    def test_exact(self):
+        self.check(np.random.random(100), [0, 0.1, 0.5, 0.999, 1])
+        self.check(np.random.randint(0, 5, 100), [0.25, 0.5, 0.75])
+
+    def test_narrowed(self, monkeypatch):
+        monkeypatch.setattr(aggregation, 'QUANTILE_BINS', 4)
+        monkeypatch.setattr(aggregation, 'EXACT_SLICE', 3)
+        self.check(np.random.random(100), [0, 0.1, 0.5, 0.999, 1])
+        self.check(np.random.randint(0, 5, 100), [0.25, 0.5, 0.75])
+        self.check(np.random.standard_normal(100) ** 3, [0.01, 0.5])
+
+    def test_approximate(self):
+        x = np.random.random(1000)
+        s = sdb.from_array(x)
+        q = np.array([0.01, 0.3, 0.5, 0.9])
+        result = quantile(s, q, error=0.01)
+
+        # the ranks of the results are within the error bound
+        ranks = np.searchsorted(np.sort(x), result) / x.size
+        assert np.all(np.abs(ranks - q) <= 0.011)
+
+    def test_attribute(self):
+        x = sdb.arange(5)
+        y = sdb.arange(5) * 2
+        z = sdb.join(x, y)
+        assert_allclose(quantile(z, 0.5, att=z.att_names[1]), 4)
+
+    def test_bad_input(self):
+        s = sdb.random(5)
+        with pytest.raises(ValueError):
+            quantile(s, 1.5)
+        with pytest.raises(ValueError):
+            quantile(s, 0.5, error=2)
+
 
 class TestGroupBy(TestBase):
 
@@ -141,3 +232,47 @@ class TestGroupBy(TestBase):
                                         'min', 'sum', 'stdev', 'var'))
     def test_aggregation_method_calls(self, method):
         getattr(self.c.groupby('val'), method)().toarray()
+
+    def test_group_on_several_strings(self):
+        f = sdb.afl.build('<other:string>[i=0:5,10,0,j=0:3,10,0]',
+                          "iif(j % 2 = 0, 'x', 'yy')")
+        x = sdb.join(self.e, f).groupby(['name', 'other'])
+        x = x.aggregate('count(*)').toarray()
+        x = x[np.lexsort((x['other'], x['name']))]
+        assert_array_equal(x['name'], ['a', 'a', 'b', 'b'])
+        assert_array_equal(x['other'], ['x', 'yy', 'x', 'yy'])
+        assert_allclose(x['count'], [6, 6, 6, 6])
+
+    def test_categories_cached(self):
+        n = len(sdb._query_log)
+        self.e.groupby('name').aggregate('count(*)').toarray()
+        sorts = [q for q in sdb._query_log[n:] if 'sort(' in q]
+
+        self.e.groupby('name').aggregate('sum(k)').toarray()
+        assert [q for q in sdb._query_log[n:] if 'sort(' in q] == sorts
+
+    def test_query_categories_after_reap(self):
+        q = self.e.filter('k >= 0')
+        expected = q.groupby('name').aggregate('count(*)').toarray()
+        sdb.reap()
+        result = q.groupby('name').aggregate('count(*)').toarray()
+        assert_array_equal(result['count'], expected['count'])
+
+    def test_agg_skips_strings(self):
+        x = self.e.groupby('k').agg('sum').toarray()
+        assert 'name_sum' not in x.dtype.names
+        assert 'val_sum' in x.dtype.names
+
+    def test_agg(self):
+        x = self.e.groupby('name').agg({'k': ['sum', 'max'],
+                                        'val': 'mean'}).toarray()
+        assert_array_equal(x['name'], ['a', 'b'])
+        assert_allclose(x['k_sum'], [12, 12])
+        assert_allclose(x['k_max'], [1, 1])
+        assert_allclose(x['val_mean'], [2, 2])
+
+        x = self.c.groupby('val').agg('sum').toarray()
+        assert_allclose(x['k_sum'], [24])
+
+        with pytest.raises(ValueError):
+            self.c.groupby('val').agg('median')
@@ -5,10 +5,13 @@
 from __future__ import absolute_import, print_function, division, unicode_literals
 from operator import add, sub, mul, truediv, mod, pow
 
+import pytest
+import numpy as np
 from numpy.testing import assert_allclose
 
 from . import sdb, teardown_function, TestBase, RTOL
 from .test_basic import needs_scipy
+from ..schema_utils import rechunk
 
 ARITHMETIC_OPERATORS = (add, sub, mul, truediv, mod, pow)
 
@@ -174,3 +177,128 @@ def test_array_broadcast():
                    ((1, 5, 1), 4), (4, (1, 5, 1)),
                    ((5, 1, 3), (4, 1)), ((4, 1), (5, 1, 3))]:
         yield check_array_broadcast, shapes[0], shapes[1]
+
+
+def test_broadcast_dimension_order():
+    # cross_join operand order gives numpy's dimension order directly
+    def check(shape1, shape2):
+        A = sdb.random(shape1)
+        B = sdb.random(shape2)
+        C = A - B
+        expected = A.toarray() - B.toarray()
+        assert not C.name.startswith('redimension')
+        assert C.ndim == expected.ndim
+        assert_allclose(C.toarray(), expected)
+
+    for shapes in [((5, 4), 4), ((1, 4), (5, 1)), ((5, 1), (5, 4)),
+                   (4, (5, 4)), ((5, 1), (1, 4)),
+                   (4, (1, 5, 1)), (4, (1, 4))]:
+        yield check, shapes[0], shapes[1]
+
+
+def test_broadcast_size_one():
+    A = sdb.random((5, 4))
+    B = sdb.from_array(np.array([[3.0]]))
+    C = A * B
+    assert 'cross_join' not in C.name
+    assert_allclose(C.toarray(), A.toarray() * 3)
+
+
+def test_broadcast_lazy_operand():
+    X = sdb.random((6, 3))
+    C = X - X.mean(0)
+    expected = X.toarray() - X.toarray().mean(0)
+    assert_allclose(C.toarray(), expected, rtol=RTOL)
+
+
+class TestFused(TestBase):
+
+    def test_expression(self):
+        A, B, C, D = [sdb.random((5, 4)) for _ in range(4)]
+        a, b, c, d = sdb.elementwise(A, B, C, D)
+        expected = (A.toarray() * B.toarray() + C.toarray()) / D.toarray()
+
+        result = ((a * b + c) / d).compile()
+        assert result.name.count('join(') == 3
+        assert_allclose(result.toarray(), expected, rtol=RTOL)
+
+    def test_evaluate(self):
+        A = sdb.random((5, 4))
+        B = sdb.random((5, 4), chunk_size=2)
+        a, b = A.toarray(), B.toarray()
+
+        result = sdb.evaluate('sqrt(a) * 2 - a ** b + 1', a=A, b=B)
+        assert_allclose(result.toarray(), np.sqrt(a) * 2 - a ** b + 1, rtol=RTOL)
+
+    def test_evaluate_rejects_python(self):
+        A = sdb.random(10)
+        for expr in ['__import__("os")', 'a.__class__', 'a if a else 1',
+                     '[a]', 'open(a)', 'sqrt(x=a)']:
+            with pytest.raises(ValueError):
+                sdb.evaluate(expr, a=A)
+
+    def test_origin_mismatch(self):
+        A = sdb.afl.build('<a:double>[i=0:4,10,0]', 'i')
+        B = sdb.afl.build('<b:double>[i=5:9,10,0]', 'i')
+        with pytest.raises(ValueError):
+            sdb.evaluate('a + b', a=A, b=B)
+
+    def test_mixed_operands(self):
+        A = sdb.random(10)
+        B = sdb.random(10)
+        a = sdb.elementwise(A)
+
+        result = (B - sdb.exp(a) * 3).compile()
+        assert_allclose(result.toarray(), B.toarray() - np.exp(A.toarray()) * 3,
+                        rtol=RTOL)
+
+    def test_shape_mismatch(self):
+        a, b = sdb.elementwise(sdb.random(10), sdb.random(5))
+        with pytest.raises(ValueError):
+            (a + b).compile()
+
+
+class TestDensity(TestBase):
+
+    def test_dense_operands_build_one_query(self):
+        x = sdb.random((5, 4))
+        y = sdb.random((5, 4))
+        n = len(sdb._query_log)
+
+        z = (x + y) * 2
+        # schema lookups (show) are fine, but no evals or count probes
+        probes = [q for q in sdb._query_log[n:]
+                  if 'store(' in q or 'count(' in q]
+        assert probes == []
+        assert not z.issparse()
+        assert_allclose(z.toarray(), (x.toarray() + y.toarray()) * 2, rtol=RTOL)
+
+    def test_density_survives_rechunk(self):
+        x = sdb.random((5, 4))
+        y = rechunk(x, chunk_size=3)
+        assert y.name != x.name
+        assert not y.issparse()
+        n = len(sdb._query_log)
+        y.eval()
+        assert not y.issparse()
+        assert not any('count(' in q for q in sdb._query_log[n:])
+
+    def test_density_hint(self):
+        x = sdb.random(10)
+        y = sdb.afl.build('<a:double>[i=0:9,1000,0]', 'i')
+        expected = x.toarray() + np.arange(10)
+
+        for hint in ['auto', 'dense', 'sparse']:
+            sdb.density_hint = hint
+            try:
+                assert_allclose((x + y).toarray(), expected, rtol=RTOL)
+            finally:
+                sdb.density_hint = 'auto'
+
+        with pytest.raises(ValueError):
+            sdb.density_hint = 'maybe'
+
+    def test_sparse_lazy_operand(self):
+        x = sdb.afl.build('<a:double>[i=0:9,1000,0]', 'i')
+        y = sdb.afl.build('<b:double>[i=0:9,1000,0]', 2).filter('i < 5')
+        assert_allclose((x + y).toarray(), np.arange(10) + [2] * 5 + [0] * 5)
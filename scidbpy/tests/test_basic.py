@@ -4,6 +4,7 @@
 # See LICENSE.txt for more information
 from __future__ import absolute_import, print_function, division
 from operator import lt, le, eq, gt, ge, ne
+import re
 
 import pytest
 import numpy as np
@@ -14,8 +15,9 @@ from numpy.testing import assert_allclose, assert_array_equal
 from scidbpy import SciDBArray, SciDBShimInterface, connect, SciDBDataShape
 from scidbpy.schema_utils import disambiguate, rechunk
 from scidbpy.robust import join
+from scidbpy.chunking import plan_chunks
 
-from . import (sdb, TestBase, teardown_function,
+from . import (sdb, TestBase, teardown_function, unfuzzed,
                randarray, needs_pandas, needs_scipy, pd, sparse)
 RTOL = 1E-6
 
@@ -404,6 +406,87 @@ def test_numpy_aggregates():
             yield check_op, op, ind
 
 
+class TestAgg(TestBase):
+
+    def test_whole_array(self):
+        x = np.random.random((5, 4))
+        X = sdb.from_array(x)
+        result = X.agg(['min', 'max', 'mean', 'std'])
+
+        assert result.dtype.names == ('f0_min', 'f0_max', 'f0_mean', 'f0_std')
+        assert_allclose(result['f0_min'], x.min())
+        assert_allclose(result['f0_max'], x.max())
+        assert_allclose(result['f0_mean'], x.mean())
+        assert_allclose(result['f0_std'], x.std(ddof=1))
+
+    def test_along_axis(self):
+        x = np.random.random((5, 4))
+        X = sdb.from_array(x)
+        result = X.agg(['sum', 'max'], 0)
+
+        assert_allclose(result['f0_sum'], x.sum(0))
+        assert_allclose(result['f0_max'], x.max(0))
+
+    def test_multiattribute(self):
+        x = sdb.random(5)
+        y = sdb.random(5)
+        z = sdb.join(x, y).eval()
+        result = z.describe()
+        for att, expected in zip(z.att_names, [x.toarray(), y.toarray()]):
+            assert result[att + '_count'] == 5
+            assert_allclose(result[att + '_min'], expected.min())
+            assert_allclose(result[att + '_max'], expected.max())
+
+    def test_single_query(self):
+        X = sdb.random(5)
+        n = len(sdb._query_log)
+
+        def aggregates():
+            # distinct aggregate() calls, however many queries each needed
+            pattern = r'aggregate\(%s,(?:[^()]|\([^()]*\))*\)' % X.name
+            calls = re.findall(pattern, ' '.join(sdb._query_log[n:]))
+            return sorted(set(calls), key=calls.index)
+
+        X.agg(['min', 'max'])
+        assert len(aggregates()) == 1
+
+        # cached
+        X.agg('min')
+        X.agg(['max', 'min'])
+        assert len(aggregates()) == 1
+
+        # only the missing aggregates are computed
+        X.describe()
+        assert len(aggregates()) == 2
+        assert 'min(' not in aggregates()[-1]
+
+    def test_invalidated_on_write(self):
+        X = sdb.zeros(5)
+        assert X.agg('max')['f0_max'] == 0
+
+        # overwrite the stored array in place, then drop cached stats
+        sdb.query("store(build({0}, iif({1} = 2, 3, 0)), {0})",
+                  X, X.dim_names[0])
+        X._invalidate()
+        assert X.agg('max')['f0_max'] == 3
+
+    def test_invalidated_on_apply(self):
+        X = sdb.zeros(5)
+        assert X.agg('max')['f0_max'] == 0
+        X['g'] = 'f0 + 3'
+        assert X.agg('max')['g_max'] == 3
+
+    def test_interface(self):
+        x = np.random.random((5, 4))
+        X = sdb.from_array(x)
+        assert_allclose(sdb.describe(X, 1)['f0_mean'], x.mean(1))
+        assert_allclose(sdb.agg(X, 'min')['f0_min'], x.min())
+
+    def test_bad_aggregate(self):
+        with pytest.raises(ValueError):
+            sdb.random(5).agg('median')
+
+
 def test_transpose():
     A = sdb.random((5, 4, 3))
 
@@ -446,6 +529,18 @@ def test_random_persistent():
     x.reap()
 
 
+def test_factories_plan_chunks():
+    # the unfuzzed factories, so the planned chunks aren't replaced
+    zeros, random, randint = (unfuzzed[f] for f in ('zeros', 'random', 'randint'))
+
+    expected = plan_chunks((2, 3000))
+    assert zeros((2, 3000)).chunk_size == expected
+    assert random((2, 3000)).chunk_size == expected
+    assert randint((2, 3000), dtype='int64').chunk_size == expected
+
+    assert zeros((2, 3000), chunk_size=10).chunk_size == [10, 10]
+
+
 def test_reap():
 
     A = sdb.random((8, 4))
@@ -863,6 +958,12 @@ def test_percentile_attribute_check():
     assert_allclose(expected, actual)
 
 
+def test_percentile_approximate():
+    x = np.random.random(1000)
+    actual = sdb.percentile(sdb.from_array(x), [10, 50], error=0.01)
+    assert_allclose(actual, np.percentile(x, [10, 50]), atol=0.05)
+
+
 def test_index_lookup():
 
     x = sdb.from_array(np.array([5, 5, 5, 3, 5, 3, 2]))
@@ -0,0 +1,48 @@
+# License: Simplified BSD, 2014
+# See LICENSE.txt for more information
+from __future__ import absolute_import, print_function, division, unicode_literals
+
+import numpy as np
+import pytest
+
+from scidbpy.chunking import plan_chunks, cell_bytes
+
+
+def test_cell_bytes():
+    assert cell_bytes('double') == 8
+    assert cell_bytes('<a:int8,b:double>') == 9
+    assert cell_bytes(np.dtype('int32')) == 4
+
+
+def test_small_arrays_use_default():
+    assert plan_chunks(10) == [1000]
+    assert plan_chunks((3, 4)) == [1000, 1000]
+
+
+def test_large_arrays_near_target():
+    assert plan_chunks(10 ** 8) == [10 ** 6]
+    assert plan_chunks((5000, 5000)) == [1000, 1000]
+    assert plan_chunks((1000, 1000, 1000)) == [100, 100, 100]
+
+
+def test_short_dimensions_give_budget_to_long():
+    assert plan_chunks((10, 10 ** 7)) == [1000, 10 ** 5]
+
+
+def test_narrow_cells_get_more_cells():
+    assert plan_chunks(10 ** 8, 'int8') == [8 * 10 ** 6]
+
+
+def test_sparse():
+    assert plan_chunks((10 ** 6, 10 ** 6), density=1e-4) == [10 ** 5, 10 ** 5]
+
+
+def test_unbounded():
+    assert plan_chunks((None, 5)) == [200000, 1000]
+
+
+def test_operators():
+    assert plan_chunks((5000, 5000), operator='gemm') == [1000, 1000]
+    assert plan_chunks((5000, 5000), operator='gesvd') == [32, 32]
+    with pytest.raises(ValueError):
+        plan_chunks((5, 5), operator='foo')
@@ -137,6 +137,49 @@ class TestBooleanIndexing(TestBase):
         assert_array_equal(result.unpack('_').toarray()[att], [4])
 
 
+    def test_fused_comparison(self):
+        x = sdb.arange(12).reshape((3, 4))
+        result = x[x > 6]
+        assert 'join' not in result.query
+        assert_array_equal(result.toarray(),
+                           np.where(np.arange(12) > 6, np.arange(12), 0).reshape(3, 4))
+
+    def test_fused_inverted_comparison(self):
+        x = sdb.arange(5)
+        assert_array_equal(x[~(x > 2)].toarray(), [0, 1, 2, 0, 0])
+
+    def test_sparse_numpy_mask(self):
+        x = sdb.arange(1000).reshape((100, 10))
+        mask = np.zeros((100, 10), dtype=bool)
+        mask[[3, 50], [2, 7]] = True
+        result = x[mask]
+        assert result.shape == (100, 10)
+        assert_array_equal(result.collapse().toarray(), [32, 507])
+
+    def test_numpy_mask_reaps_upload(self):
+        x = sdb.from_array(np.arange(1000).reshape((100, 10)))
+        sparse = np.zeros((100, 10), dtype=bool)
+        sparse[3, 2] = True
+        dense = np.arange(1000).reshape((100, 10)) % 2 == 0
+
+        for mask, flatten in [(sparse, False), (dense, False), (sparse, True)]:
+            before = set(sdb.list_arrays())
+            result = x.extract(mask) if flatten else x[mask]
+            assert set(sdb.list_arrays()) - before == set([result.name])
+
+    def test_extract(self):
+        x = sdb.arange(12).reshape((3, 4))
+        xnp = x.toarray()
+        mask = xnp % 5 == 0
+        assert_array_equal(x.extract(mask).toarray(), xnp[mask])
+        assert_array_equal(x.extract(x > 6).toarray(), xnp[xnp > 6])
+
+    def test_extract_c_order(self):
+        x = sdb.from_array(np.arange(24).reshape((4, 6)), chunk_size=2)
+        xnp = x.toarray()
+        assert_array_equal(x.extract(x > 4).toarray(), xnp[xnp > 4])
+
+
 class TestIndexIntegerArrays(TestBase):
 
     def test_1d(self):
@@ -152,3 +195,128 @@ class TestIndexIntegerArrays(TestBase):
         idx = sdb.from_array(np.array([0, 0, 1, 1, 1]))
 
         assert_array_equal(z[idx].toarray(), z.toarray()[idx.toarray()])
+
+    def test_2d_rows(self):
+        x = sdb.arange(20).reshape((5, 4))
+        idx = np.array([3, 0, 3, -1])
+        assert_array_equal(x[idx].toarray(), x.toarray()[idx])
+
+    def test_2d_columns(self):
+        x = sdb.arange(20).reshape((5, 4))
+        assert_array_equal(x[:, [2, 0]].toarray(), x.toarray()[:, [2, 0]])
+
+    def test_2d_scidbarray_rows(self):
+        x = sdb.arange(20).reshape((5, 4))
+        idx = sdb.from_array(np.array([4, 1]))
+        assert_array_equal(x[idx].toarray(), x.toarray()[[4, 1]])
+
+    def test_scidbarray_coordinates(self):
+        # SciDBArray index values are coordinates, not positions
+        x = sdb.afl.build('<a:int64>[i=10:14,10,0]', 'i * 2')
+        idx = sdb.from_array(np.array([12, 10]))
+        assert_array_equal(x[idx].toarray(), [24, 20])
+
+    def test_combined(self):
+        x = sdb.arange(20).reshape((5, 4))
+        rows = np.array([[0, 1], [4, 4]])
+        cols = np.array([3, 0])
+        assert_array_equal(x[rows, cols].toarray(), x.toarray()[rows, cols])
+
+    def test_with_slice(self):
+        x = sdb.arange(60).reshape((5, 4, 3))
+        xnp = x.toarray()
+        assert_array_equal(x[1:4, [0, 3]].toarray(), xnp[1:4, [0, 3]])
+        assert_array_equal(x[[0, 2], :, [1, 2]].toarray(),
+                           xnp[[0, 2], :, [1, 2]])
+
+    def test_take_axis(self):
+        x = sdb.arange(20).reshape((5, 4))
+        assert_array_equal(x.take([1, 1], axis=1).toarray(),
+                           x.toarray().take([1, 1], axis=1))
+
+    def test_out_of_bounds(self):
+        x = sdb.arange(20).reshape((5, 4))
+        with pytest.raises(IndexError):
+            x[[5]]
+
+
+class TestLookup(TestBase):
+
+    def test_lookup_2d(self):
+        x = sdb.arange(12).reshape((3, 4))
+        coords = [(0, 1), (2, 3), (0, 1), (1, 0)]
+        assert_array_equal(x.lookup(coords), [1, 11, 1, 4])
+
+    def test_lookup_1d(self):
+        x = sdb.arange(10) * 2
+        assert_array_equal(x.lookup([3, 1, 3]), [6, 2, 6])
+
+    def test_lookup_multiattribute(self):
+        x = sdb.arange(5)
+        x = sdb.afl.apply(x, 'y', 'f0+1')
+        result = x.lookup([4, 0])
+        assert_array_equal(result['y'], [5, 1])
+
+    def test_lookup_out_of_bounds(self):
+        x = sdb.arange(5)
+        with pytest.raises(IndexError):
+            x.lookup([5])
+
+    def test_take(self):
+        x = sdb.arange(12).reshape((3, 4))
+        idx = np.array([[0, -1], [5, 5]])
+        assert_array_equal(x.take(idx), np.arange(12).take(idx))
+
+    def test_prefetch(self):
+        x = sdb.arange(12).reshape((3, 4))
+        x.prefetch([(i, i) for i in range(3)])
+        x.interface = None  # further queries would fail
+        assert [x[i, i] for i in range(3)] == [0, 5, 10]
+
+
+class TestSubset(TestBase):
+
+    def test_compress_numpy_mask(self):
+        xnp = np.arange(20).reshape((5, 4))
+        x = sdb.from_array(xnp)
+        mask = np.array([True, False, False, True])
+        assert_array_equal(x.compress(mask, axis=1).toarray(),
+                           xnp.compress(mask, axis=1))
+
+    def test_compress_scidb_mask_is_bounded(self):
+        xnp = np.arange(20).reshape((5, 4))
+        x = sdb.from_array(xnp)
+        result = x.compress(x.sum(1) > 20, axis=0)
+        assert result.shape == (3, 4)
+        assert_array_equal((result + result).toarray(),
+                           2 * xnp[xnp.sum(1) > 20])
+
+    def test_compress_numpy_mask_reaps_table(self):
+        x = sdb.from_array(np.arange(20).reshape((5, 4)))
+        before = set(sdb.list_arrays())
+        result = x.compress(np.array([True, False, False, True]), axis=1)
+        assert set(sdb.list_arrays()) - before == set([result.name])
+
+    def test_subset(self):
+        xnp = np.arange(20).reshape((5, 4))
+        x = sdb.from_array(xnp)
+        rows = x.sum(1) > 20
+        cols = np.array([True, False, True, True])
+        expected = xnp[np.ix_(xnp.sum(1) > 20, cols)]
+
+        result = x.subset(rows, cols)
+        assert result.dim_names == x.dim_names
+        assert_array_equal(result.toarray(), expected)
+
+    def test_getitem_masks(self):
+        xnp = np.arange(20).reshape((5, 4))
+        x = sdb.from_array(xnp)
+        rows = sdb.from_array(np.array([True, False, True, False, True]))
+        cols = sdb.from_array(np.array([False, True, True, False]))
+        expected = xnp[np.ix_(rows.toarray(), cols.toarray())]
+        assert_array_equal(x[rows, cols].toarray(), expected)
+
+    def test_discard_all(self):
+        x = sdb.arange(5)
+        with pytest.raises(ValueError):
+            x.compress(np.zeros(5, dtype=bool))
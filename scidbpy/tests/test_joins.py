@@ -223,6 +223,113 @@ class TestMerge(TestBase):
 
 
 @needs_pandas
+class TestCategoryCache(TestBase):
+
+    def setup_method(self, method):
+        x = np.zeros(6, dtype=[(str('x'), float), (str('y'), float)])
+        x['x'] = [1, 2, 3, 1, 2, 3]
+        x['y'] = np.arange(6)
+        self.a = sdb.from_array(x)
+        self.b = sdb.from_array(x[:3])
+
+    def teardown_method(self, method):
+        sdb.category_cache.clear()
+        sdb.category_cache.max_entries = 64
+        sdb.reap()
+
+    def sorts(self, n):
+        return [q for q in sdb._query_log[n:] if 'sort(' in q]
+
+    def test_merges_reuse_categories(self):
+        n = len(sdb._query_log)
+        expected = merge(self.a, self.b, on='x').toarray()
+        assert len(self.sorts(n)) == 1
+
+        actual = merge(self.a, self.b, on='x').toarray()
+        assert len(self.sorts(n)) == 1
+        assert_allclose(np.sort(actual['y_x']), np.sort(expected['y_x']))
+
+        # and so do groupbys on the same attribute
+        self.a.groupby('x').aggregate('sum(y)').toarray()
+        assert len(self.sorts(n)) == 1
+
+    def test_categories_survive_reap(self):
+        merge(self.a, self.b, on='x').toarray()
+        cats = list(sdb.category_cache._entries.values())[0]
+        sdb.reap()
+        assert cats.name in sdb.list_arrays()
+
+    def test_new_version(self):
+        merge(self.a, self.b, on='x').toarray()
+        cats = list(sdb.category_cache._entries.values())[0]
+
+        # store a new version of the array
+        sdb.query('store(filter({A}, x > 1), {A})', A=self.a)
+        self.a._invalidate()
+        n = len(sdb._query_log)
+        merge(self.a, self.b, on='x').toarray()
+        assert len(self.sorts(n)) == 1
+        assert cats.name not in sdb.list_arrays()
+
+    def test_recreated_array(self):
+        # an array the session didn't create, so its version is checked
+        name = 'scidbpy_test_categories'
+        store = ("store(apply(build(<x:double>[i0=0:5,10,0], i0 + {0}), "
+                 "y, double(i0)), %s)" % name)
+        sdb.query(store.format(0))
+        try:
+            sdb.wrap_array(name).groupby('x').aggregate('sum(y)').toarray()
+
+            # remove and re-store the array under the same name,
+            # without going through the interface
+            sdb.query("remove(%s)" % name)
+            sdb.query(store.format(10))
+            a = sdb.wrap_array(name)
+
+            result = a.groupby('x').aggregate('sum(y)').toarray()
+            assert_allclose(np.sort(result['x']), np.arange(10, 16))
+            assert_allclose(np.sort(result['y_sum']), np.arange(6))
+        finally:
+            sdb.category_cache.clear()
+            sdb.query("remove(%s)" % name)
+
+    def test_session_arrays_skip_version_check(self):
+        self.a.groupby('x').aggregate('sum(y)').toarray()
+        n = len(sdb._query_log)
+        self.a.groupby('x').aggregate('sum(y)').toarray()
+        assert not any('versions(' in q for q in sdb._query_log[n:])
+
+    def test_raw_store_into_session_array(self):
+        self.a.groupby('x').aggregate('sum(y)').toarray()
+
+        shifted = sdb.afl.apply(self.a, 'z', 'x + 10')
+        shifted = sdb.afl.attribute_rename(sdb.afl.project(shifted, 'z', 'y'),
+                                           'z', 'x')
+        sdb.query('store({0}, {1})', shifted, self.a)
+        self.a._invalidate()
+        assert len(sdb.category_cache) == 0
+
+        result = self.a.groupby('x').aggregate('sum(y)').toarray()
+        assert_allclose(np.sort(result['x']), [11, 12, 13])
+        assert_allclose(result['y_sum'][np.argsort(result['x'])], [3, 5, 7])
+
+    def test_reap_forgets_categories(self):
+        merge(self.a, self.b, on='x').toarray()
+        cats = list(sdb.category_cache._entries.values())[0]
+        self.a.reap()
+        assert len(sdb.category_cache) == 0
+        assert cats.name not in sdb.list_arrays()
+
+    def test_eviction(self):
+        sdb.category_cache.max_entries = 1
+        merge(self.a, self.b, on='x').toarray()
+        cats = list(sdb.category_cache._entries.values())[0]
+
+        merge(self.b, self.a, on='x').toarray()
+        assert len(sdb.category_cache) == 1
+        assert cats.name not in sdb.list_arrays()
+
+
 class TestBadMerges(TestBase):
 
     def test_not_implemented_ifnot_inner(self):
@@ -0,0 +1,330 @@
+# License: Simplified BSD, 2014
+# See LICENSE.txt for more information
+from __future__ import absolute_import, print_function, division, unicode_literals
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from . import sdb, TestBase, teardown_function, needs_scipy, unfuzzed
+from .. import linalg
+
+RTOL = 1e-6
+
+
+class TestDot(TestBase):
+
+    @pytest.mark.parametrize(('ashape', 'bshape'),
+                             [((4, 5), (5,)), ((5,), (5, 6)),
+                              ((5,), (5,)), ((4, 5), (5, 1)),
+                              ((1, 5), (5, 6)), ((1, 5), (5, 1)),
+                              ((4, 5), (5, 6))])
+    def test_join(self, ashape, bshape):
+        A = sdb.random(ashape)
+        B = sdb.random(bshape)
+        C = linalg.dot(A, B, method='join')
+        # single-row and single-column matrices act like vectors
+        a, b = A.toarray(), B.toarray()
+        if a.ndim == 2 and a.shape[0] == 1:
+            a = a[0]
+        if b.ndim == 2 and b.shape[1] == 1:
+            b = b[:, 0]
+        expected = np.dot(a, b)
+
+        if isinstance(C, np.generic):
+            assert_allclose(C, expected, rtol=RTOL)
+        else:
+            assert_allclose(C.toarray(), expected, rtol=RTOL)
+
+    def test_join_same_dim_names(self):
+        A = sdb.random((4, 4))
+        C = linalg.dot(A, A, method='join')
+        assert C.dim_names == A.dim_names
+        assert_allclose(C.toarray(), np.dot(A.toarray(), A.toarray()),
+                        rtol=RTOL)
+
+    def test_join_chunks(self):
+        A = sdb.random((4, 5), chunk_size=3)
+        x = sdb.random(5, chunk_size=2)
+        C = linalg.dot(A, x, method='join')
+        assert_allclose(C.toarray(), np.dot(A.toarray(), x.toarray()),
+                        rtol=RTOL)
+
+    @pytest.mark.parametrize('method', ['join', 'gemm'])
+    def test_offset_origins(self, method):
+        A = sdb.afl.build('<a:double>[i=0:3,10,0, j=2:6,10,0]', 'i + j')
+        x = sdb.afl.build('<b:double>[k=5:9,10,0]', 'k')
+        C = linalg.dot(A, x, method=method)
+        expected = np.dot(A.toarray(), x.toarray())
+        assert C.shape == (4,)
+        assert_allclose(C.toarray(), expected, rtol=RTOL)
+
+    def test_join_is_lazy(self):
+        A = sdb.random((4, 5))
+        x = sdb.random(5)
+        assert linalg.dot(A, x).name.startswith('aggregate(')
+
+    @pytest.mark.parametrize('method', ['join', 'gemm', 'spgemm'])
+    def test_shape_mismatch(self, method):
+        A = sdb.random((3, 4))
+        with pytest.raises(ValueError):
+            linalg.dot(A, sdb.random(5), method=method)
+        with pytest.raises(ValueError):
+            linalg.dot(sdb.random(5), A, method=method)
+
+    def test_bad_method(self):
+        A = sdb.random((4, 5))
+        with pytest.raises(ValueError):
+            linalg.dot(A, A, method='foo')
+
+
+class TestPlanProduct(TestBase):
+
+    def test_vectors(self):
+        A = sdb.random((4, 5))
+        x = sdb.random(5)
+        assert linalg.plan_product(A, x) == 'join'
+        assert linalg.plan_product(x, A.T) == 'join'
+        assert linalg.plan_product(x, x) == 'join'
+
+    def test_matrices(self):
+        A = sdb.random((4, 5))
+        B = sdb.random((5, 6))
+        assert linalg.plan_product(A, B) == 'gemm'
+
+    def test_sparse(self):
+        A = sdb.random((4, 500))
+        B = sdb.afl.filter(sdb.random((500, 600)), 'f0 < 0.001').eval()
+        B.nonempty()
+        assert linalg.density(B) < linalg.SPARSE_DENSITY
+        assert linalg.plan_product(A, B) == 'spgemm'
+
+    def test_density_hint(self):
+        A = sdb.afl.filter(sdb.random((4, 5)), 'f0 < 2')
+        B = sdb.random((5, 6))
+        B._invalidate()
+        assert linalg.plan_product(A, B) == 'gemm'
+
+        sdb.density_hint = 'sparse'
+        try:
+            assert linalg.plan_product(A, B) == 'spgemm'
+        finally:
+            sdb.density_hint = 'auto'
+
+
+class TestSparseDot(TestBase):
+
+    @needs_scipy
+    def test_from_sparse(self):
+        from scipy.sparse import rand
+        A = rand(40, 50, density=0.005)
+        B = rand(50, 30, density=0.005)
+        As, Bs = sdb.from_sparse(A), sdb.from_sparse(B)
+
+        assert linalg.density(As) == A.nnz / 2000.
+        assert linalg.plan_product(As, Bs) == 'spgemm'
+        C = sdb.dot(As, Bs).toarray()
+        assert_allclose(C, (A * B).toarray())
+
+    def test_spgemm(self):
+        A = sdb.random((4, 5), chunk_size=3)
+        B = sdb.random((5, 6), chunk_size=2)
+        C = linalg.dot(A, B, method='spgemm')
+        assert_allclose(C.toarray(), np.dot(A.toarray(), B.toarray()),
+                        rtol=RTOL)
+
+        x = sdb.random(5)
+        C = linalg.dot(A, x, method='spgemm')
+        assert_allclose(C.toarray(), np.dot(A.toarray(), x.toarray()),
+                        rtol=RTOL)
+
+
+class TestSVD(TestBase):
+
+    def test_full(self):
+        A = sdb.random((6, 10), chunk_size=100)
+        U, S, VT = linalg.svd(A)
+        U2, S2, VT2 = np.linalg.svd(A.toarray(), full_matrices=False)
+
+        assert U.chunk_size == [32, 32]
+        assert_allclose(S.toarray(), S2, rtol=RTOL)
+        assert_allclose(np.abs(U.toarray()), np.abs(U2), rtol=RTOL, atol=1e-10)
+        assert_allclose(np.abs(VT.toarray()), np.abs(VT2), rtol=RTOL, atol=1e-10)
+
+    def test_select_factors(self):
+        A = sdb.random((6, 10), chunk_size=32)
+        result = sdb.svd(A, return_U=False, return_VT=False)
+        assert len(result) == 1
+        assert_allclose(result[0].toarray(),
+                        np.linalg.svd(A.toarray(), compute_uv=False), rtol=RTOL)
+
+    def test_randomized(self):
+        rng = np.random.RandomState(0)
+        x = np.dot(rng.randn(200, 3), rng.randn(3, 8))
+        A = sdb.from_array(x)
+
+        U, S, VT = linalg.svd(A, k=3, seed=0)
+        assert U.shape == (200, 3)
+        assert S.shape == (3,)
+        assert VT.shape == (3, 8)
+
+        S2 = np.linalg.svd(x, compute_uv=False)[:3]
+        assert_allclose(S.toarray(), S2, rtol=1e-6)
+        rebuilt = np.dot(U.toarray() * S.toarray(), VT.toarray())
+        assert_allclose(rebuilt, x, atol=1e-6)
+
+    def test_bad_input(self):
+        with pytest.raises(ValueError):
+            linalg.svd(sdb.random(5))
+        with pytest.raises(ValueError):
+            linalg.svd(sdb.random((5, 5)), k=0)
+
+
+class TestFactorizations(TestBase):
+
+    def setup_method(self, method):
+        rng = np.random.RandomState(0)
+        self.x = rng.randn(300, 5)
+        self.y = rng.randn(300)
+        self.X = sdb.from_array(self.x)
+        self.Y = sdb.from_array(self.y)
+
+    def test_qr(self):
+        Q, R = sdb.qr(self.X)
+        q, r = Q.toarray(), R.toarray()
+
+        assert q.shape == (300, 5)
+        assert_allclose(np.triu(r), r, atol=1e-12)
+        assert_allclose(np.dot(q.T, q), np.identity(5), atol=1e-10)
+        assert_allclose(np.dot(q, r), self.x, atol=1e-10)
+
+    def test_qr_wide(self):
+        with pytest.raises(ValueError):
+            sdb.qr(sdb.random((3, 5)))
+
+    def test_lstsq(self):
+        beta = sdb.lstsq(self.X, self.Y).toarray()
+        expected = np.linalg.lstsq(self.x, self.y, rcond=None)[0]
+        assert_allclose(beta, expected, rtol=1e-8)
+
+    def test_lstsq_columns(self):
+        y = np.column_stack([self.y, 2 * self.y])
+        beta = sdb.lstsq(self.X, sdb.from_array(y)).toarray()
+        expected = np.linalg.lstsq(self.x, y, rcond=None)[0]
+        assert_allclose(beta, expected, rtol=1e-8)
+
+    def test_cholesky(self):
+        g = np.dot(self.x.T, self.x)
+        L = sdb.cholesky(sdb.from_array(g)).toarray()
+        assert_allclose(np.dot(L, L.T), g, rtol=1e-10)
+
+    def test_cholesky_blocked(self):
+        # three gemm blocks: 32, 32 and 6 rows
+        x = np.random.RandomState(1).randn(100, 70)
+        g = np.dot(x.T, x)
+        A = unfuzzed['from_array'](g, chunk_size=32)
+        L = sdb.cholesky(A).toarray()
+        assert_allclose(L, np.linalg.cholesky(g), rtol=1e-8, atol=1e-10)
+
+    def test_solve_columns(self):
+        a = np.dot(self.x.T, self.x)
+        b = self.x[:5].T
+        x = sdb.solve(sdb.from_array(a), sdb.from_array(b)).toarray()
+        assert_allclose(x, np.linalg.solve(a, b), rtol=1e-8)
+
+    def test_solve_singular(self):
+        a = np.ones((4, 4))
+        with pytest.raises(np.linalg.LinAlgError):
+            sdb.solve(sdb.from_array(a), sdb.from_array(np.ones(4)))
+
+    def test_solve(self):
+        a = np.dot(self.x.T, self.x)
+        b = self.x[0]
+        x = sdb.solve(sdb.from_array(a), sdb.from_array(b)).toarray()
+        assert_allclose(x, np.linalg.solve(a, b), rtol=1e-10)
+
+    def test_not_square(self):
+        with pytest.raises(ValueError):
+            sdb.cholesky(self.X)
+
+
+class TestGram(TestBase):
+
+    def setup_method(self, method):
+        rng = np.random.RandomState(0)
+        self.x = rng.rand(100, 4)
+        self.y = rng.rand(100, 3) + 5
+        self.X = sdb.from_array(self.x)
+        self.Y = sdb.from_array(self.y)
+
+    @pytest.mark.parametrize('method', ['join', 'gemm'])
+    def test_gram(self, method):
+        G = sdb.gram(self.X, method=method)
+        assert_allclose(G.toarray(), np.dot(self.x.T, self.x), rtol=RTOL)
+
+        G = sdb.gram(self.X, self.Y, method=method)
+        assert_allclose(G.toarray(), np.dot(self.x.T, self.y), rtol=RTOL)
+
+    def test_gram_is_one_query(self):
+        assert sdb.gram(self.X).name.startswith('aggregate(')
+
+    @pytest.mark.parametrize('method', ['join', 'gemm'])
+    def test_cov(self, method):
+        C = sdb.cov(self.X, rowvar=False, method=method)
+        assert_allclose(C.toarray(), np.cov(self.x, rowvar=False), rtol=RTOL)
+
+        C = sdb.cov(self.X.T, ddof=0, method=method)
+        assert_allclose(C.toarray(), np.cov(self.x.T, ddof=0), rtol=RTOL)
+
+    @pytest.mark.parametrize('method', ['join', 'gemm'])
+    def test_corrcoef(self, method):
+        R = sdb.corrcoef(self.X, rowvar=False, method=method)
+        assert_allclose(R.toarray(), np.corrcoef(self.x, rowvar=False),
+                        rtol=RTOL)
+
+    @pytest.mark.parametrize('method', ['join', 'gemm'])
+    def test_cross(self, method):
+        expected = np.corrcoef(self.x, self.y, rowvar=False)[:4, 4:]
+        R = sdb.corrcoef(self.X, self.Y, rowvar=False, method=method)
+        assert_allclose(R.toarray(), expected, rtol=RTOL)
+
+    @staticmethod
+    def _pairwise(x, func):
+        # func of each pair of columns, over the rows where both aren't NaN
+        p = x.shape[1]
+        result = np.empty((p, p))
+        for i in range(p):
+            for j in range(p):
+                ok = ~np.isnan(x[:, i]) & ~np.isnan(x[:, j])
+                result[i, j] = func(x[ok, i], x[ok, j])
+        return result
+
+    @pytest.mark.parametrize('method', ['join', 'gemm'])
+    def test_nulls(self, method):
+        X = sdb.afl.build('<v:double NULL>[i=0:19,10,0, j=0:2,10,0]',
+                          'iif(i % (j + 3) = 1, null, sin(i * 7 + j))')
+        x = X.toarray()
+        assert np.isnan(x).any()
+
+        expected = self._pairwise(x, lambda a, b: np.cov(a, b)[0, 1])
+        C = sdb.cov(X, rowvar=False, method=method)
+        assert_allclose(C.toarray(), expected, rtol=RTOL)
+
+        expected = self._pairwise(x, lambda a, b: np.corrcoef(a, b)[0, 1])
+        R = sdb.corrcoef(X, rowvar=False, method=method)
+        assert_allclose(R.toarray(), expected, rtol=RTOL)
+
+    @pytest.mark.parametrize('method', ['join', 'gemm'])
+    def test_sparse(self, method):
+        X = sdb.afl.filter(self.X, 'f0 > 0.2')
+        x = np.where(self.x > 0.2, self.x, np.nan)
+
+        expected = self._pairwise(x, lambda a, b: np.cov(a, b)[0, 1])
+        C = sdb.cov(X, rowvar=False, method=method)
+        assert_allclose(C.toarray(), expected, rtol=RTOL)
+
+    def test_bad_input(self):
+        with pytest.raises(ValueError):
+            sdb.gram(sdb.random(5))
+        with pytest.raises(ValueError):
+            sdb.cov(self.X, method='foo')
@@ -4,11 +4,13 @@
 from __future__ import absolute_import, print_function, division, unicode_literals
 
 
+import pytest
 import numpy as np
 from numpy.testing import assert_allclose, assert_array_equal
 
-from ..parse import toarray, NULLS
-from . import sdb, TestBase, teardown_function
+from ..parse import toarray, toarrow, NULLS, _string_cells, _string_fields
+from . import (sdb, TestBase, teardown_function,
+               needs_pyarrow, needs_pandas)
 
 
 class TestScalar(TestBase):
@@ -187,12 +189,108 @@ def test_auto_compression_options():
     sdb.default_compression = None
 
 
+def test_adaptive_compression():
+    x = sdb.afl.build('<a:double>[i=0:199999,100000,0]', 'i')
+    sdb.default_compression = 'adaptive'
+    try:
+        # each call may use a different level
+        for _ in range(4):
+            assert_array_equal(toarray(x), np.arange(200000))
+    finally:
+        sdb.default_compression = None
+
+    assert len(sdb._transfer_stats) > 0
+    assert sdb._resolve_compression('adaptive', nbytes=10) is None
+
+
+def test_small_transfers_advance_probes():
+    stats, count = dict(sdb._transfer_stats), sdb._transfer_count
+    sdb._record_transfer(None, 10, 0.01)
+    assert sdb._transfer_count == count + 1
+    assert sdb._transfer_stats == stats
+
+
 def test_dense():
     x = sdb.afl.build('<a:int8>[i=0:100,7,3, j=0:100,10,2]', 'i+j')
 
     assert_array_equal(x.toarray(method='sparse'), x.toarray(method='dense'))
 
 
+def test_toarray_memmap(tmpdir):
+    x = sdb.afl.build('<a:int32>[i=0:20,7,0, j=0:5,3,0]', 'i*j')
+    expected = toarray(x)
+
+    path = str(tmpdir.join('x.npy'))
+    result = x.toarray(out=path)
+    assert_array_equal(result, expected)
+    assert_array_equal(np.load(path, mmap_mode='r'), expected)
+
+
+def test_toarray_preallocated():
+    x = sdb.afl.build('<a:double>[i=1:20,7,0]', 'i')
+    out = np.zeros(20, dtype=float)
+    result = toarray(x, method='dense', out=out)
+    assert result is out
+    assert_array_equal(out, np.arange(1, 21))
+
+    with pytest.raises(ValueError):
+        toarray(x, out=np.zeros(20, dtype=np.int32))
+
+
+def test_toarray_cache(tmpdir):
+    schema = '<y:int64>[i=0:9,1000,0]'
+    x = sdb.afl.build(schema, 'i').eval()
+    sdb.enable_cache(str(tmpdir))
+    try:
+        assert_array_equal(x.toarray(), np.arange(10))
+        assert len(sdb.result_cache) == 1
+        assert_array_equal(x.toarray(), np.arange(10))
+
+        # storing a new version invalidates the cached entry
+        sdb.afl.store(sdb.afl.build(schema, 'i+1'), x.name).eval()
+        assert_array_equal(x.toarray(), np.arange(10) + 1)
+
+        # so does re-creating the array under the same name, even
+        # though the new array starts again from version 1
+        name = x.name
+        sdb.query("remove({0})", name)
+        sdb.afl.store(sdb.afl.build(schema, 'i+2'), name).eval()
+        assert_array_equal(x.toarray(), np.arange(10) + 2)
+        sdb.afl.store(sdb.afl.build(schema, 'i+3'), name).eval()
+        assert_array_equal(x.toarray(), np.arange(10) + 3)
+        sdb.query("remove({0})", name)
+        sdb.afl.store(sdb.afl.build(schema, 'i+4'), name).eval()
+        sdb.afl.store(sdb.afl.build(schema, 'i+5'), name).eval()
+        assert_array_equal(x.toarray(), np.arange(10) + 5)
+
+        # queries are only cached on request
+        q = sdb.afl.build(schema, 'i')
+        assert_array_equal(q.toarray(), np.arange(10))
+        assert len(sdb.result_cache) == 1
+        q.toarray(cache=True)
+        assert len(sdb.result_cache) == 2
+    finally:
+        sdb.result_cache.clear()
+        sdb.result_cache = None
+
+
+def test_result_cache_shared(tmpdir):
+    from ..cache import ResultCache
+    a = ResultCache(str(tmpdir))
+    b = ResultCache(str(tmpdir))
+
+    a.put('x', '1', np.arange(3))
+    b.put('y', '1', np.arange(4))
+    assert len(b) == 2
+    assert_array_equal(b.get('x', '1'), np.arange(3))
+    assert_array_equal(a.get('y', '1'), np.arange(4))
+
+    # a stale version is dropped for every session
+    assert a.get('x', '2') is None
+    assert 'x' not in ResultCache(str(tmpdir))
+    assert len(tmpdir.listdir(lambda p: p.ext == '.npy')) == 1
+
+
 def test_fromarray_chunksize():
     from . import unfuzzed
     from_array = unfuzzed['from_array']
@@ -205,3 +303,69 @@ def test_fromarray_chunksize():
 
     for chunk in [(2, 3, 4), (1, 2, 2), (1, 1, 1), (5, 5, 5), (5, 1, 5)]:
         yield check, chunk
+
+
+def test_string_fields():
+    from struct import pack
+
+    def field(value, nullable):
+        data = (value or '').encode('utf-8') + b'\x00'
+        flag = (b'\x00' if value is None else b'\xff') if nullable else b''
+        return flag + pack('<i', len(data)) + data
+
+    # strings that look like sizes shouldn't confuse the scan
+    values = ['', 'abc', '\x01\x00\x00\x00', None, '\x05\x00\x00\x00xyzw', 'å∫']
+    nullable = [False, True]
+    contents = b''.join(field(v, nullable[1]) if i % 2 else field(v or 'q', False)
+                        for i, v in enumerate(values * 50))
+
+    expected = np.array(list(_string_cells(contents, nullable)), dtype=np.int64)
+    valid, starts, lengths = _string_fields(contents, nullable)
+    assert_array_equal(valid, expected[:, 0].astype(bool))
+    assert_array_equal(starts, expected[:, 1])
+    assert_array_equal(lengths, expected[:, 2])
+
+    with pytest.raises(ValueError):
+        _string_fields(contents[:-1], nullable)
+
+
+class TestArrow(TestBase):
+
+    @needs_pyarrow
+    def test_numbers_with_nulls(self):
+        x = sdb.afl.join(sdb.afl.build('<x:int32 NULL>[i=0:3,10,0]', 'iif(i>0, i, null)'),
+                         sdb.afl.build('<y:double>[i=0:3,10,0]', '2*i'))
+        t = toarrow(x)
+
+        assert t.column_names == ['i', 'x', 'y']
+        assert t.column('x').to_pylist() == [None, 1, 2, 3]
+        assert t.column('y').to_pylist() == [0, 2, 4, 6]
+        assert t.column('i').to_pylist() == [0, 1, 2, 3]
+
+    @needs_pyarrow
+    def test_strings(self):
+        import pyarrow as pa
+        x = sdb.afl.join(sdb.afl.build('<x:string>[i=0:3,10,0]', "'aaa'"),
+                         sdb.afl.build('<y:string NULL>[i=0:3,10,0]', "iif(i>0, 'å∫', null)"))
+        t = toarrow(x)
+        assert t.schema.field('x').type == pa.large_string()
+        assert t.column('x').to_pylist() == ['aaa'] * 4
+        assert t.column('y').to_pylist() == [None, 'å∫', 'å∫', 'å∫']
+
+    @needs_pyarrow
+    def test_sparse(self):
+        x = sdb.afl.build('<a:int8>[i=0:1,10,0]', 10)
+        x = x.redimension('<a:int8>[i=0:2,10,0]')
+        t = x.toarrow()
+        assert t.column('i').to_pylist() == [0, 1]
+        assert t.column('a').to_pylist() == [10, 10]
+
+    @needs_pyarrow
+    @needs_pandas
+    def test_dataframe_engine(self):
+        x = sdb.afl.build('<a:float>[i=0:2,10,0, j=0:1,10,0]', 'i+j')
+        expected = x.todataframe()
+        actual = x.todataframe(engine='arrow')
+
+        assert_array_equal(actual.index.names, expected.index.names)
+        assert_allclose(actual['a'], expected['a'])
@@ -2,8 +2,9 @@
 # See LICENSE.txt for more information
 from __future__ import absolute_import, print_function, division, unicode_literals
 
-from . import sdb, TestBase, teardown_function
+from . import sdb, TestBase, teardown_function, unfuzzed
 from .. import schema_utils as su
+from ..chunking import plan_chunks
 
 import numpy as np
 from numpy.testing import assert_allclose, assert_array_equal
@@ -21,6 +22,95 @@ class TestRedimension(TestBase):
         y = su.redimension(x, ['f0'], ['i0'])
         assert_array_equal(y.toarray(), [1, 0])
 
+    def test_promoted_chunks_use_extents(self):
+        x = sdb.afl.build('<a:int64>[i=0:99999,10,0]', 'i % 5')
+        x = x.apply('b', 'a * 2')
+        y = su.redimension(x, ['i', 'a'], ['b'])
+
+        expected = plan_chunks((100000, None), x.sdbtype)
+        assert y.chunk_size == [10, expected[1]]
+
+
+class TestBounds(TestBase):
+
+    def test_dimension_bounds(self):
+        x = sdb.zeros(5).redimension('<f0:double>[i0=0:*,1000,0]')
+        bounds = su.dimension_bounds(x)
+
+        assert bounds == ((0,), (4,))
+        assert x._stats()['bounds'] == bounds
+        assert su.coerced_shape(x) == (5,)
+        assert su.boundify(x).shape == (5,)
+
+    def test_coordinate_extents(self):
+        x = su.redimension(sdb.arange(5) * 2, ['x'], ['i0'])
+        y = sdb.arange(3)
+
+        result = su.coordinate_extents(x, y, x)
+        assert result == [((0,), (8,)), ((0,), (2,)), ((0,), (8,))]
+        assert x._stats()['extent'] == ((0,), (8,))
+        assert su.boundify(x, trim=True).shape == (9,)
+
+    def test_invalidated(self):
+        x = sdb.arange(3)
+        su.coordinate_extents(x)
+        x._invalidate()
+        assert 'extent' not in x._stats()
+
+
+# factories that keep the requested chunk sizes
+zeros, arange = unfuzzed['zeros'], unfuzzed['arange']
+
+
+class TestMatchChunks(TestBase):
+
+    def test_moves_smaller(self):
+        big = zeros(100, chunk_size=50)
+        small = zeros(10, chunk_size=5)
+
+        with su.trace_redimensions() as trace:
+            a, b = su.match_chunks(small, big)
+
+        assert a.chunk_size == big.chunk_size
+        assert b.name == big.name
+        assert trace[0].kept == big.name
+        assert trace[0].moved == (small.name,)
+        assert trace[0].cells == {big.name: 100, small.name: 10}
+
+    def test_uses_cached_counts(self):
+        big = zeros(100, chunk_size=50)
+        sparse = sdb.afl.filter(arange(1000, chunk_size=100), 'f0 < 3').eval()
+
+        a, b = su.match_chunks(sparse, big)
+        assert a.name == sparse.name
+        assert b.chunk_size == [100]
+
+        sparse.nonempty()
+        a, b = su.match_chunks(sparse, big)
+        assert a.chunk_size == [50]
+        assert b.name == big.name
+
+    def test_noop(self):
+        x = sdb.zeros(10)
+        with su.trace_redimensions() as trace:
+            a, b = su.match_chunks(x, x)
+        assert a is x and b is x
+        assert trace == []
+
+    def test_permuted_moves_smaller(self):
+        big = zeros((100, 100), chunk_size=50)
+        small = zeros(100, chunk_size=20)
+
+        with su.trace_redimensions() as trace:
+            s, t = su.match_chunk_permuted(small, big, [(1, 0)])
+        assert s.chunk_size == [50]
+        assert t.name == big.name
+        assert trace[0].moved == (small.name,)
+
+        s, t = su.match_chunk_permuted(big, small, [(0, 1)])
+        assert s.name == big.name
+        assert t.chunk_size == [50]
+
 
 def test_new_alias_label():
     x = sdb.zeros(1)
@@ -2,6 +2,7 @@
 # See LICENSE.txt for more information
 from __future__ import absolute_import, print_function, division, unicode_literals
 
+import pytest
 import numpy as np
 from scidbpy.scidbarray import SDB_NP_TYPE_MAP, sdbtype
 
@@ -14,3 +15,43 @@ def test_sdbtype_dtype_mapping():
                  for j in range(i, min(len(type_list), i + 3))]
         dtype_start = np.dtype(dtype)
         assert(dtype_start == sdbtype(dtype_start).dtype)
+
+
+def test_parse_csv():
+    from scidbpy.scidbarray import _parse_csv, _parse_csv_builtin
+    txt = ("i,x,s\n"
+           "0,1.5,'ab'\n"
+           "1,nan,'it\\'s, ok'\n"
+           "2,-inf,''\n")
+    dtype = np.dtype([(str('i'), '<i8'), (str('x'), '<f8'), (str('s'), 'U')])
+
+    for parse in [_parse_csv, _parse_csv_builtin]:
+        result = parse(txt, dtype)
+        np.testing.assert_array_equal(result['i'], [0, 1, 2])
+        np.testing.assert_array_equal(result['x'], [1.5, np.nan, -np.inf])
+        np.testing.assert_array_equal(result['s'], ['ab', "it's, ok", ''])
+
+
+def test_parse_csv_single_column():
+    from scidbpy.scidbarray import _parse_csv
+    result = _parse_csv("x\n1\n2\n", np.dtype('<f4'))
+    assert result.dtype == np.dtype('<f4')
+    np.testing.assert_array_equal(result, [1, 2])
+
+    result = _parse_csv("b\ntrue\nfalse\n", np.dtype('?'))
+    np.testing.assert_array_equal(result, [True, False])
+
+
+def test_parse_csv_numeric_strings():
+    pytest.importorskip('pandas')
+    from scidbpy.scidbarray import _parse_csv_pandas
+    txt = ("i,b,s\n"
+           "0,true,'01'\n"
+           "null,false,'1e3'\n"
+           "2,true,'true'\n")
+    dtype = np.dtype([(str('i'), '<i4'), (str('b'), '?'), (str('s'), 'U')])
+
+    result = _parse_csv_pandas(txt, dtype)
+    np.testing.assert_array_equal(result['i'], [0, -1, 2])
+    np.testing.assert_array_equal(result['b'], [True, False, True])
+    np.testing.assert_array_equal(result['s'], ['01', '1e3', 'true'])